@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Pipeline benchmark
+Times each filtering stage separately on generated oteldemo-style datasets
+(see log_generator.py) and writes machine-readable JSON. Every dataset size
+runs in its own process so peak RSS is per size; --compare prints per-stage
+ratios against the results of an earlier commit.
+
+    python benchmark.py --sizes 10k,1m --output bench.json
+    python benchmark.py --sizes 10k,1m --compare bench.json
+"""
+
+import argparse
+import asyncio
+import gc
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict
+from itertools import islice
+from pathlib import Path
+from typing import List, Dict, Any, Iterator, Optional
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+try:
+    import numpy as np
+except ImportError:  # columnar stages are skipped without NumPy
+    np = None
+
+from log_generator import GeneratorConfig, OtelDemoLogGenerator, parse_count
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = 1
+
+DEFAULT_QUERIES = [
+    "cart service errors and timeouts",
+    "why is checkout failing with 503",
+    "POST /api/checkout 500 errors",
+    "payment charge failures in the last 5 minutes",
+]
+
+# Slower than this ratio against the baseline is flagged by --compare
+REGRESSION_THRESHOLD = 1.10
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+class StageTimer:
+    """Wall time, throughput and memory per named stage"""
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.stages: Dict[str, Dict[str, Any]] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[Dict[str, Any]]:
+        """Time the block; set info['items'] inside it to report per-item cost"""
+        info: Dict[str, Any] = {}
+        gc.collect()
+        if self.trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        yield info
+        elapsed = time.perf_counter() - start
+
+        result = {'seconds': round(elapsed, 6)}
+        items = info.pop('items', None)
+        if items:
+            result['items'] = items
+            result['us_per_item'] = round(elapsed / items * 1e6, 3)
+        if self.trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            result['traced_peak_mb'] = round(peak / (1 << 20), 1)
+        result['peak_rss_mb'] = peak_rss_mb()
+        result.update(info)
+        self.stages[name] = result
+        logger.info(f"{name}: {elapsed:.3f}s")
+
+
+def dataset_path(config: GeneratorConfig, data_dir: Path) -> Path:
+    """Generated files are cached by their parameters"""
+    digest = hashlib.sha256(json.dumps(asdict(config), sort_keys=True).encode()).hexdigest()[:12]
+    return data_dir / f'oteldemo-{config.lines}-{digest}.ndjson'
+
+
+def ensure_dataset(config: GeneratorConfig, data_dir: Path) -> Path:
+    data_dir.mkdir(parents=True, exist_ok=True)
+    path = dataset_path(config, data_dir)
+    if not path.exists():
+        staging = path.with_suffix('.tmp')
+        OtelDemoLogGenerator(config).write(str(staging))
+        os.replace(staging, path)
+    return path
+
+
+def window_payload(window, logs_per_window: int = 3) -> Dict[str, Any]:
+    """LLM-ready window dict, shaped like main._filter_logs output"""
+    important_logs = sorted(window.logs, key=lambda x: (x.severity_number or 0), reverse=True)[:logs_per_window]
+    return {
+        'summary': window.summary,
+        'trace_id': window.trace_id,
+        'importance_score': window.importance_score,
+        'prompt_match_score': window.prompt_match_score,
+        'logs': [{
+            'service': log.service_name,
+            'severity': log.severity_text or 'UNKNOWN',
+            'message': log.body[:500],
+            'status': log.status,
+            'route': log.route,
+            'method': log.method,
+            'timestamp': log.timestamp_raw,
+            'trace_id': log.trace_id,
+            'template': log.template_hash
+        } for log in important_logs]
+    }
+
+
+def run_size(config: GeneratorConfig, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Benchmark every stage on one dataset size; runs in a fresh process"""
+    # Imported here so module import cost is not charged to the parent
+    from enhanced_log_filter import EnhancedLogFilter, HOT_FEATURES
+    from columnar_store import ColumnarLogStore
+    from parallel_ingest import ParallelLogLoader
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logger.setLevel(logging.INFO)
+
+    data_dir = Path(options['data_dir'])
+    timer = StageTimer(options['trace_memory'])
+    queries = options['queries']
+    skipped: Dict[str, str] = {}
+    counts: Dict[str, Any] = {}
+
+    generate_start = time.perf_counter()
+    path = ensure_dataset(config, data_dir)
+    generate_seconds = time.perf_counter() - generate_start
+
+    # normalize_log_entry on pre-parsed records, so JSON decoding is not included
+    filter_system = EnhancedLogFilter()
+    with open(path) as f:
+        records = [json.loads(line) for line in islice(f, options['normalize_sample'])]
+    filter_system.infer_schema(records[:1000])
+    with timer.stage('normalize_log_entry') as info:
+        for record in records:
+            filter_system.normalize_log_entry(record)
+        info['items'] = len(records)
+    del records
+
+    # Object pipeline, as filter_logs_enhanced runs it
+    windows = []
+    if config.lines <= options['object_limit']:
+        object_filter = EnhancedLogFilter()
+        with timer.stage('load_logs') as info:
+            logs = object_filter.load_logs(str(path))
+            info['items'] = len(logs)
+
+        with timer.stage('hot_prefilter') as info:
+            _, hot_logs, fallback_logs = object_filter._partition_hot_events(logs)
+            info['items'] = len(logs)
+        candidates = hot_logs or fallback_logs
+        counts['hot_logs'] = len(hot_logs)
+
+        stats: Dict[str, Any] = {}
+        with timer.stage('create_trace_windows') as info:
+            windows = object_filter.create_trace_windows(candidates, stats=stats)
+            info['items'] = len(candidates)
+        counts['windows'] = len(windows)
+        counts['windowing'] = stats.get('windowing')
+
+        criteria = object_filter.parse_query_advanced(queries[0])
+        with timer.stage('deduplicate_templates') as info:
+            windows = [object_filter.deduplicate_templates(window) for window in windows]
+            info['items'] = len(windows)
+        with timer.stage('calculate_importance_score') as info:
+            for window in windows:
+                window.importance_score = object_filter.calculate_importance_score(window)
+            info['items'] = len(windows)
+        with timer.stage('calculate_prompt_match_score') as info:
+            for window in windows:
+                window.prompt_match_score = object_filter.calculate_prompt_match_score(window, criteria)
+            info['items'] = len(windows)
+
+        windows.sort(key=lambda w: w.importance_score + w.prompt_match_score, reverse=True)
+        windows = windows[:10]
+        with timer.stage('generate_window_summary') as info:
+            for window in windows:
+                window.summary = object_filter.generate_window_summary(window)
+            info['items'] = len(windows)
+        del logs, hot_logs, fallback_logs, candidates
+    else:
+        skipped['load_logs'] = f"lines > --object-limit ({options['object_limit']})"
+
+    # Columnar pipeline, as the API runs it
+    columnar_filter = EnhancedLogFilter()
+    loader = ParallelLogLoader(columnar_filter, workers=options['workers'])
+    with timer.stage('ingest_columnar') as info:
+        store = ColumnarLogStore.from_entries(loader.iter_logs(str(path)))
+        info['items'] = len(store)
+    loader.shutdown()
+
+    if store.vectorized:
+        miner = columnar_filter.template_miner
+        template_texts = []
+        for template_hash in store.templates.values:
+            cluster = miner.get(int(template_hash)) if template_hash and template_hash.isdigit() else None
+            template_texts.append(cluster.template if cluster else None)
+        with tempfile.TemporaryDirectory(dir=data_dir) as index_dir:
+            index_path = Path(index_dir) / 'index'
+            with timer.stage('store_save') as info:
+                store.save(index_path, template_texts=template_texts)
+                info['items'] = len(store)
+            with timer.stage('store_load') as info:
+                loaded = ColumnarLogStore.load(index_path)
+                info['items'] = len(loaded)
+            del loaded
+
+        with timer.stage('hot_prefilter_columnar') as info:
+            hot_rows = np.flatnonzero(store.columns['features'] & HOT_FEATURES)
+            info['items'] = len(store)
+
+        criteria = columnar_filter.parse_query_advanced(queries[0])
+        with timer.stage('index_match_rows') as info:
+            matches = store.index.match_rows(store, criteria)
+            info['items'] = len(matches)
+
+        with timer.stage('create_trace_windows_columnar') as info:
+            members, offsets, _ = columnar_filter.create_trace_windows_columnar(store, hot_rows)
+            info['items'] = len(hot_rows)
+
+        with timer.stage('score_windows_columnar') as info:
+            if len(offsets) > 1:
+                columnar_filter._score_windows_columnar(store, members, offsets, criteria, matches)
+            info['items'] = len(offsets) - 1
+    else:
+        skipped['store_save'] = 'NumPy not installed'
+
+    with timer.stage('filter_store') as info:
+        for query in queries:
+            query_windows = columnar_filter.filter_store(store, query, max_windows=10)
+        info['items'] = len(queries)
+    if not windows:
+        windows = query_windows
+
+    # Context packing; the client is never called, so a placeholder key is enough
+    os.environ.setdefault('OPENAI_API_KEY', 'benchmark-placeholder')
+    from llm_cache import LLMResponseCache
+    from llm_service import LLMService
+
+    payloads = [window_payload(window) for window in windows]
+    summary = f"Filtered {len(store)} logs down to {sum(len(p['logs']) for p in payloads)} most relevant logs across {len(payloads)} windows"
+    with tempfile.TemporaryDirectory(dir=data_dir) as cache_dir:
+        llm = LLMService(cache=LLMResponseCache(db_path=os.path.join(cache_dir, 'cache.sqlite')))
+        repeats = options['context_repeats']
+        with timer.stage('_prepare_log_context') as info:
+            for _ in range(repeats):
+                llm._prepare_log_context(payloads, summary)
+            info['items'] = repeats
+        # A budget too small for everything exercises shortening and selection
+        with timer.stage('_prepare_log_context_tight') as info:
+            for _ in range(repeats):
+                llm._prepare_log_context(payloads, summary, token_budget=600)
+            info['items'] = repeats
+        asyncio.run(llm.close())
+
+    return {
+        'lines': config.lines,
+        'bytes': path.stat().st_size,
+        'generate_seconds': round(generate_seconds, 3),
+        'stages': timer.stages,
+        'skipped': skipped,
+        'counts': counts,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def _run_size_worker(config: GeneratorConfig, options: Dict[str, Any], results):
+    logging.basicConfig(level=logging.WARNING, format='%(levelname)s: %(message)s')
+    results.put(run_size(config, options))
+
+
+def run_isolated(config: GeneratorConfig, options: Dict[str, Any]) -> Dict[str, Any]:
+    """run_size in a spawned process, so each size reports its own peak memory"""
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    process = context.Process(target=_run_size_worker, args=(config, options, results))
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__ if np is not None else None,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Per-stage seconds ratio (current / baseline) for sizes present in both runs"""
+    lines = [f"Comparing {current['environment'].get('commit')} against {baseline['environment'].get('commit')}"]
+    baseline_sizes = {result['lines']: result for result in baseline['results']}
+    for result in current['results']:
+        base = baseline_sizes.get(result['lines'])
+        if base is None:
+            continue
+        lines.append(f"\n{result['lines']} lines")
+        lines.append(f"  {'stage':<32}{'baseline s':>12}{'current s':>12}{'ratio':>8}")
+        for name, stage in result['stages'].items():
+            base_stage = base['stages'].get(name)
+            if base_stage is None:
+                continue
+            ratio = stage['seconds'] / base_stage['seconds'] if base_stage['seconds'] else float('inf')
+            flag = '  slower' if ratio > REGRESSION_THRESHOLD else ''
+            lines.append(f"  {name:<32}{base_stage['seconds']:>12.4f}{stage['seconds']:>12.4f}{ratio:>8.2f}{flag}")
+        if result.get('peak_rss_mb') and base.get('peak_rss_mb'):
+            lines.append(f"  {'peak RSS MB':<32}{base['peak_rss_mb']:>12.1f}{result['peak_rss_mb']:>12.1f}"
+                         f"{result['peak_rss_mb'] / base['peak_rss_mb']:>8.2f}")
+    return lines
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    parser = argparse.ArgumentParser(description='Benchmark the log filtering pipeline stage by stage')
+    parser.add_argument('--sizes', default='10k', help='comma-separated line counts, e.g. 10k,1m,10m')
+    parser.add_argument('--output', help='write results JSON here (default: stdout)')
+    parser.add_argument('--compare', help='results JSON from an earlier run to compare against')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'log_benchmarks'),
+                        help='where generated datasets are cached')
+    parser.add_argument('--query', action='append', dest='queries', help='query to filter with (repeatable)')
+    parser.add_argument('--object-limit', default='1m', help='skip the object pipeline above this many lines')
+    parser.add_argument('--normalize-sample', default='100k', help='records timed through normalize_log_entry')
+    parser.add_argument('--context-repeats', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=None, help='ingest processes (default: CPU count)')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='also report tracemalloc peaks per stage (slows every stage down)')
+    parser.add_argument('--in-process', action='store_true', help='run sizes in this process (shared peak RSS)')
+    defaults = GeneratorConfig()
+    for name, value in asdict(defaults).items():
+        if name not in ('lines', 'start_ns'):
+            parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+
+    generator_options = {name: getattr(args, name) for name in asdict(defaults) if name not in ('lines', 'start_ns')}
+    options = {
+        'data_dir': args.data_dir,
+        'queries': args.queries or DEFAULT_QUERIES,
+        'object_limit': parse_count(args.object_limit),
+        'normalize_sample': parse_count(args.normalize_sample),
+        'context_repeats': args.context_repeats,
+        'workers': args.workers,
+        'trace_memory': args.trace_memory
+    }
+
+    results = []
+    for size in args.sizes.split(','):
+        config = GeneratorConfig(lines=parse_count(size), **generator_options)
+        logger.info(f"Benchmarking {config.lines} lines")
+        results.append(run_size(config, options) if args.in_process else run_isolated(config, options))
+
+    report = {
+        'schema_version': SCHEMA_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'environment': environment(),
+        'generator': generator_options,
+        'options': {key: value for key, value in options.items() if key != 'data_dir'},
+        'results': results
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + '\n')
+        logger.info(f"Wrote results to {args.output}")
+    else:
+        print(text)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        print('\n'.join(compare(report, baseline)))
+
+
+if __name__ == "__main__":
+    main()
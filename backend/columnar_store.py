@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Columnar log store
+Array-backed, dictionary-encoded storage for normalized logs so filtering stages
+can run as vectorized operations instead of looping over LogEntry objects
+"""
+
+import json
+import logging
+import mmap
+import os
+import shutil
+import uuid
+from array import array
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple, Union
+
+from enhanced_log_filter import LogEntry, HOT_FEATURES
+from log_index import InvertedLogIndex
+from template_spikes import TemplateSpikes, spikes_from_store
+from timestamp_parser import MISSING_TIMESTAMP
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; columns stay as array.array
+    np = None
+
+logger = logging.getLogger(__name__)
+
+MISSING_ID = -1
+MISSING_SEVERITY = -1
+MISSING_STATUS = 0
+
+# On-disk layout version for ColumnarLogStore.save()/load()
+STORE_FORMAT_VERSION = 5
+
+# column name -> (array typecode, numpy dtype)
+COLUMN_TYPES = {
+    'timestamp_ns': ('q', 'int64'),
+    'severity': ('h', 'int16'),
+    'status': ('h', 'int16'),
+    'severity_text_id': ('b', 'int8'),
+    'service_id': ('i', 'int32'),
+    'route_id': ('i', 'int32'),
+    'method_id': ('b', 'int8'),
+    'template_id': ('i', 'int32'),
+    'trace_id': ('i', 'int32'),
+    'span_id': ('i', 'int32'),
+    'features': ('B', 'uint8'),
+    'token_count': ('i', 'int32'),   # body length in index tokens (BM25 document length)
+}
+
+
+# Dictionary-encoded string attributes of ColumnarLogStore
+DICTIONARY_NAMES = ('severity_texts', 'services', 'routes', 'methods', 'templates', 'traces', 'spans')
+
+
+class StringDictionary:
+    """Dictionary encoding: each distinct string gets a dense integer id"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self._ids: Dict[str, int] = {}
+
+    def encode(self, value: Optional[str]) -> int:
+        if value is None:
+            return MISSING_ID
+        value_id = self._ids.get(value)
+        if value_id is None:
+            value_id = len(self.values)
+            self._ids[value] = value_id
+            self.values.append(value)
+        return value_id
+
+    def decode(self, value_id: int) -> Optional[str]:
+        if value_id < 0:
+            return None
+        return self.values[value_id]
+
+    def lookup(self, value: str) -> int:
+        """Id of an already-encoded value, or MISSING_ID"""
+        return self._ids.get(value, MISSING_ID)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def to_pool(self) -> "StringPool":
+        pool = StringPool()
+        for value in self.values:
+            pool.append(value)
+        return pool
+
+
+class PooledStringDictionary(StringDictionary):
+    """Read-only dictionary backed by a (memory-mapped) StringPool
+
+    decode() reads straight from the pool; the value list and reverse map are
+    only built if values/lookup() are used, so loading stays cheap for large
+    dictionaries such as trace ids.
+    """
+
+    def __init__(self, pool: "StringPool"):
+        self.pool = pool
+        self._values: Optional[List[str]] = None
+        self._ids: Optional[Dict[str, int]] = None
+
+    @property
+    def values(self) -> List[str]:
+        if self._values is None:
+            self._values = [self.pool.get(i) for i in range(len(self.pool))]
+        return self._values
+
+    def encode(self, value: Optional[str]) -> int:
+        raise ValueError("Cannot encode into a loaded dictionary")
+
+    def decode(self, value_id: int) -> Optional[str]:
+        if value_id < 0:
+            return None
+        return self.pool.get(value_id)
+
+    def lookup(self, value: str) -> int:
+        if self._ids is None:
+            self._ids = {v: i for i, v in enumerate(self.values)}
+        return self._ids.get(value, MISSING_ID)
+
+    def __len__(self) -> int:
+        return len(self.pool)
+
+    def to_pool(self) -> "StringPool":
+        return self.pool
+
+
+class StringPool:
+    """Append-only UTF-8 string pool: one contiguous buffer plus an offsets array"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array('q', [0])
+
+    def append(self, value: str):
+        self.data += value.encode('utf-8', 'surrogatepass')
+        self.offsets.append(len(self.data))
+
+    def get(self, index: int) -> str:
+        return self.data[self.offsets[index]:self.offsets[index + 1]].decode('utf-8', 'surrogatepass')
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def nbytes(self) -> int:
+        return len(self.data) + self.offsets.itemsize * len(self.offsets)
+
+    def save(self, directory: Path, name: str):
+        """Write as <name>.bin (UTF-8 data) and <name>.offsets.npy"""
+        with open(directory / f'{name}.bin', 'wb') as f:
+            f.write(self.data)
+        np.save(directory / f'{name}.offsets.npy', np.frombuffer(self.offsets, dtype=np.int64) if isinstance(self.offsets, array) else self.offsets)
+
+    @classmethod
+    def load(cls, directory: Path, name: str) -> "StringPool":
+        """Memory-map a pool written by save()"""
+        pool = cls()
+        path = directory / f'{name}.bin'
+        if os.path.getsize(path):
+            with open(path, 'rb') as f:
+                pool.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            pool.data = b''
+        pool.offsets = np.load(directory / f'{name}.offsets.npy', mmap_mode='r')
+        return pool
+
+
+def saved_format_version(directory: Path) -> Optional[int]:
+    """format_version of a store written by ColumnarLogStore.save(), or None if unreadable"""
+    try:
+        return json.loads((directory / 'meta.json').read_text()).get('format_version')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class ColumnarLogStore:
+    """
+    Column-oriented storage for normalized logs
+
+    Fixed-width fields live in typed columns (int64 timestamps, int16 severity
+    and status, int32 dictionary ids, a uint8 feature bitmask); bodies live in a string pool. The raw
+    JSON dict is not kept. Columns are array.array while building and become
+    NumPy arrays on freeze() when NumPy is installed. An inverted index over
+    bodies and exact-match fields is built alongside.
+    """
+
+    def __init__(self):
+        self.columns: Dict[str, Any] = {name: array(code) for name, (code, _) in COLUMN_TYPES.items()}
+        self.severity_texts = StringDictionary()
+        self.services = StringDictionary()
+        self.routes = StringDictionary()
+        self.methods = StringDictionary()
+        self.templates = StringDictionary()
+        self.traces = StringDictionary()
+        self.spans = StringDictionary()
+        self.bodies = StringPool()
+        self.timestamps_raw = StringPool()
+        self.index = InvertedLogIndex()
+        self.template_texts: Optional[List[str]] = None
+        # (template_id, template_hash) per template from this process's miner (EnhancedLogFilter.store_template_ids)
+        self.template_remap: Optional[List[Tuple[Optional[int], Optional[str]]]] = None
+        self._time_order = None
+        self._sorted_timestamps = None
+        self._template_spikes = None
+        # Query term document frequencies counted by the object pipeline (stores without NumPy)
+        self.term_frequencies: Dict[Any, Tuple[int, int]] = {}
+        self.frozen = False
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[LogEntry]) -> "ColumnarLogStore":
+        """Build a frozen store from normalized entries (e.g. EnhancedLogFilter.iter_logs())"""
+        store = cls()
+        for entry in entries:
+            store.append(entry)
+        store.freeze()
+        logger.info(
+            f"Columnar store built: {len(store)} logs, {store.nbytes() / 1024 / 1024:.1f} MB, "
+            f"index {store.index.vocabulary_size} tokens / {store.index.nbytes() / 1024 / 1024:.1f} MB"
+        )
+        return store
+
+    @property
+    def vectorized(self) -> bool:
+        """True when columns are NumPy arrays and vectorized stages can run"""
+        return self.frozen and np is not None
+
+    def append(self, entry: LogEntry):
+        """Append one normalized entry; the raw dict is dropped"""
+        if self.frozen:
+            raise ValueError("Cannot append to a frozen ColumnarLogStore")
+
+        columns = self.columns
+        columns['timestamp_ns'].append(entry.timestamp_ns)
+        columns['severity'].append(
+            MISSING_SEVERITY if entry.severity_number is None else max(min(entry.severity_number, 32767), -32767)
+        )
+        columns['status'].append(entry.status or MISSING_STATUS)
+        columns['severity_text_id'].append(self.severity_texts.encode(entry.severity_text))
+        columns['service_id'].append(self.services.encode(entry.service_name))
+        columns['route_id'].append(self.routes.encode(entry.route))
+        columns['method_id'].append(self.methods.encode(entry.method))
+        columns['template_id'].append(self.templates.encode(entry.template_hash))
+        columns['trace_id'].append(self.traces.encode(entry.trace_id))
+        columns['span_id'].append(self.spans.encode(entry.span_id))
+        columns['features'].append(entry.features)
+        columns['token_count'].append(self.index.add(len(self.bodies), entry.body))
+        self.bodies.append(entry.body)
+        self.timestamps_raw.append(entry.timestamp_raw or '')
+
+    def freeze(self):
+        """Finish building; expose columns as NumPy arrays when available"""
+        if self.frozen:
+            return
+        if np is not None:
+            self.columns = {
+                name: np.frombuffer(column, dtype=COLUMN_TYPES[name][1]) if len(column) else np.zeros(0, dtype=COLUMN_TYPES[name][1])
+                for name, column in self.columns.items()
+            }
+        self.index.freeze(self.columns)
+        self.frozen = True
+
+    def __len__(self) -> int:
+        return len(self.bodies)
+
+    def time_order(self) -> 'np.ndarray':
+        """Row ids sorted by timestamp (stable; missing timestamps first)"""
+        if self._time_order is None:
+            self._time_order = np.argsort(self.columns['timestamp_ns'], kind='stable')
+        return self._time_order
+
+    def sorted_timestamps(self) -> 'np.ndarray':
+        """timestamp_ns in time_order(), for binary search"""
+        if self._sorted_timestamps is None:
+            self._sorted_timestamps = np.asarray(self.columns['timestamp_ns'])[self.time_order()]
+        return self._sorted_timestamps
+
+    def template_spikes(self) -> TemplateSpikes:
+        """Template-frequency spikes over all rows (see template_spikes.py)"""
+        if self._template_spikes is None:
+            self._template_spikes = spikes_from_store(self)
+            logger.info(f"Template spike detection: {len(self._template_spikes)} spiking buckets")
+        return self._template_spikes
+
+    def time_bounds(self) -> Optional[Tuple[int, int]]:
+        """(earliest, latest) timestamp_ns, or None if no log has a timestamp"""
+        timestamps = self.sorted_timestamps()
+        first = int(np.searchsorted(timestamps, MISSING_TIMESTAMP, side='right'))
+        if first == len(timestamps):
+            return None
+        return int(timestamps[first]), int(timestamps[-1])
+
+    def rows_between(self, start_ns: int, end_ns: int) -> 'np.ndarray':
+        """Row ids (ascending) with start_ns <= timestamp_ns <= end_ns, by binary search"""
+        timestamps = self.sorted_timestamps()
+        start_ns = max(start_ns, MISSING_TIMESTAMP + 1)
+        lo = np.searchsorted(timestamps, start_ns, side='left')
+        hi = np.searchsorted(timestamps, end_ns, side='right')
+        return np.sort(self.time_order()[lo:hi]).astype(np.int64)
+
+    def save(self, directory: Union[str, Path], template_texts: Optional[List[str]] = None):
+        """
+        Persist a frozen, vectorized store for later load()
+
+        Layout: one .npy per column, string pools for bodies, raw timestamps and
+        dictionaries, the timestamp-sorted row order, the inverted index and a
+        meta.json. Written to a temp directory and renamed into place; an
+        existing index at the target is left as is unless it has an older format.
+        """
+        if not self.vectorized:
+            raise ValueError("Only frozen stores with NumPy columns can be saved")
+
+        directory = Path(directory)
+        if directory.exists():
+            if saved_format_version(directory) == STORE_FORMAT_VERSION:
+                return
+            stale = directory.with_name(f'{directory.name}.stale-{uuid.uuid4().hex[:8]}')
+            try:
+                os.replace(directory, stale)
+                shutil.rmtree(stale, ignore_errors=True)
+                logger.info(f"Replacing older-format columnar store at {directory}")
+            except OSError:
+                pass  # another writer is replacing it
+        staging = directory.with_name(f'{directory.name}.tmp-{uuid.uuid4().hex[:8]}')
+        staging.mkdir(parents=True)
+        try:
+            for name, column in self.columns.items():
+                np.save(staging / f'column.{name}.npy', column)
+            for name in DICTIONARY_NAMES:
+                getattr(self, name).to_pool().save(staging, f'dictionary.{name}')
+            self.bodies.save(staging, 'bodies')
+            self.timestamps_raw.save(staging, 'timestamps_raw')
+            np.save(staging / 'time_order.npy', self.time_order())
+            self.index.save(staging)
+
+            meta = {
+                'format_version': STORE_FORMAT_VERSION,
+                'rows': len(self),
+                'template_texts': template_texts if template_texts is not None else self.template_texts
+            }
+            (staging / 'meta.json').write_text(json.dumps(meta))
+            os.replace(staging, directory)
+            logger.info(f"Saved columnar store ({len(self)} logs) to {directory}")
+        except OSError:
+            if directory.exists():
+                # Another writer finished first; keep theirs
+                shutil.rmtree(staging, ignore_errors=True)
+                return
+            raise
+        finally:
+            if staging.exists():
+                shutil.rmtree(staging, ignore_errors=True)
+
+    @classmethod
+    def load(cls, directory: Union[str, Path]) -> "ColumnarLogStore":
+        """Memory-map a store written by save(); no JSON is parsed and nothing is copied up front"""
+        if np is None:
+            raise ValueError("Loading a saved store requires NumPy")
+
+        directory = Path(directory)
+        meta = json.loads((directory / 'meta.json').read_text())
+        if meta.get('format_version') != STORE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported store format version {meta.get('format_version')}")
+
+        store = cls()
+        store.columns = {name: np.load(directory / f'column.{name}.npy', mmap_mode='r') for name in COLUMN_TYPES}
+        for name in DICTIONARY_NAMES:
+            setattr(store, name, PooledStringDictionary(StringPool.load(directory, f'dictionary.{name}')))
+        store.bodies = StringPool.load(directory, 'bodies')
+        store.timestamps_raw = StringPool.load(directory, 'timestamps_raw')
+        store._time_order = np.load(directory / 'time_order.npy', mmap_mode='r')
+        store.index = InvertedLogIndex.load(directory)
+        store.template_texts = meta.get('template_texts')
+        store.frozen = True
+        logger.info(f"Loaded columnar store ({len(store)} logs) from {directory}")
+        return store
+
+    def nbytes(self) -> int:
+        """Approximate resident size of columns and string pools"""
+        total = self.bodies.nbytes() + self.timestamps_raw.nbytes()
+        for column in self.columns.values():
+            total += column.nbytes if np is not None and isinstance(column, np.ndarray) else column.itemsize * len(column)
+        return total
+
+    def body(self, row: int) -> str:
+        return self.bodies.get(row)
+
+    def entry(self, row: int) -> LogEntry:
+        """Materialize one row as a LogEntry (raw is empty; it is not stored)"""
+        columns = self.columns
+        severity = int(columns['severity'][row])
+        features = int(columns['features'][row])
+        timestamp_raw = self.timestamps_raw.get(row)
+        return LogEntry(
+            raw={},
+            timestamp_ns=int(columns['timestamp_ns'][row]),
+            timestamp_raw=timestamp_raw or None,
+            severity_text=self.severity_texts.decode(int(columns['severity_text_id'][row])),
+            severity_number=None if severity == MISSING_SEVERITY else severity,
+            trace_id=self.traces.decode(int(columns['trace_id'][row])),
+            span_id=self.spans.decode(int(columns['span_id'][row])),
+            status=int(columns['status'][row]) or None,
+            route=self.routes.decode(int(columns['route_id'][row])),
+            method=self.methods.decode(int(columns['method_id'][row])),
+            body=self.bodies.get(row),
+            service_name=self.services.decode(int(columns['service_id'][row])),
+            is_hot=bool(features & HOT_FEATURES),
+            template_hash=self.templates.decode(int(columns['template_id'][row])),
+            features=features
+        )
+
+    def iter_entries(self) -> Iterator[LogEntry]:
+        for row in range(len(self)):
+            yield self.entry(row)
+
+    def __iter__(self) -> Iterator[LogEntry]:
+        return self.iter_entries()
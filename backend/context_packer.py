@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Token-budget context packer
+Chooses which filtered logs go into the LLM prompt so a fixed token budget holds
+the most evidence: logs are taken greedily by score per token, repeated
+templates are worth less each time, and long ids are shortened before any log
+is dropped
+"""
+
+import heapq
+import logging
+import re
+from typing import List, Dict, Any, Optional, Tuple, Callable
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; token counts fall back to an estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Rough BPE estimate: words cost ~1 token per 4 characters, punctuation 1 each
+_ESTIMATE_PATTERN = re.compile(r'\w+|[^\w\s]')
+
+# Long hex ids (container ids, trace/span ids, hashes) and UUIDs
+_LONG_ID_PATTERN = re.compile(
+    r'\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b|\b[0-9a-fA-F]{16,}\b'
+)
+
+SEVERITY_WEIGHTS = {'FATAL': 1.0, 'ERROR': 1.0, 'WARN': 0.7}
+
+
+def estimate_tokens(text: str) -> int:
+    """Tokenizer-free token estimate"""
+    return sum((len(token) + 3) // 4 if token[0].isalnum() or token[0] == '_' else 1
+               for token in _ESTIMATE_PATTERN.findall(text))
+
+
+def default_token_counter(model: str) -> Tuple[Callable[[str], int], str]:
+    """(count function, tokenizer name): tiktoken when installed, else the estimate"""
+    if tiktoken is not None:
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding('o200k_base')
+        return (lambda text: len(encoding.encode(text, disallowed_special=()))), 'tiktoken'
+    return estimate_tokens, 'estimate'
+
+
+class ContextPacker:
+    def __init__(self, model: str = "gpt-4o-mini", count_tokens: Optional[Callable[[str], int]] = None):
+        if count_tokens:
+            self.count_tokens, self.tokenizer = count_tokens, 'custom'
+        else:
+            self.count_tokens, self.tokenizer = default_token_counter(model)
+
+    def pack(self, windows: List[Dict[str, Any]], processing_summary: str, token_budget: int,
+             first_window: int = 1) -> Tuple[str, Dict[str, Any]]:
+        """
+        Render windows into prompt context within token_budget
+
+        Windows carry 'summary', 'logs' and optionally 'importance_score',
+        'prompt_match_score' and 'trace_id'; logs may carry 'template'. If every
+        log fits it is rendered in full; otherwise ids are shortened everywhere
+        and logs are chosen greedily by value per token.
+
+        Returns (context text, budget report)
+        """
+        header = f"**Processing Summary:** {processing_summary}\n"
+        used = self.count_tokens(header)
+        candidates = [(w, l) for w in range(len(windows)) for l in range(len(windows[w]['logs']))]
+
+        window_headers = [self._window_header(window, first_window + w, shorten=False) for w, window in enumerate(windows)]
+        header_tokens = [self.count_tokens(text) for text in window_headers]
+
+        shortened = False
+        rendered = {(w, l): self._render_log(windows[w]['logs'][l], windows[w], shorten=False) for w, l in candidates}
+        costs = {key: self.count_tokens(text) for key, text in rendered.items()}
+        full_total = used + sum(costs.values()) + sum(header_tokens[w] for w in {w for w, _ in candidates})
+
+        if full_total <= token_budget:
+            selected = set(candidates)
+            used = full_total
+        else:
+            # Shorten ids and messages everywhere before dropping any log
+            shortened = True
+            window_headers = [self._window_header(window, first_window + w, shorten=True) for w, window in enumerate(windows)]
+            header_tokens = [self.count_tokens(text) for text in window_headers]
+            rendered = {(w, l): self._render_log(windows[w]['logs'][l], windows[w], shorten=True) for w, l in candidates}
+            costs = {key: self.count_tokens(text) for key, text in rendered.items()}
+            selected, used = self._select(windows, candidates, costs, header_tokens, token_budget, used)
+
+        text = self._assemble(header, windows, window_headers, rendered, selected)
+        report = {
+            'token_budget': token_budget,
+            'tokens_used': used,
+            'utilization': round(used / token_budget, 3) if token_budget else 0.0,
+            'logs_available': len(candidates),
+            'logs_packed': len(selected),
+            'windows_packed': len({w for w, _ in selected}),
+            'shortened': shortened,
+            'tokenizer': self.tokenizer
+        }
+        logger.info(
+            f"Context packed: {report['logs_packed']}/{report['logs_available']} logs, "
+            f"{used}/{token_budget} tokens{' (shortened)' if shortened else ''}"
+        )
+        return text, report
+
+    def _select(self, windows: List[Dict[str, Any]], candidates: List[Tuple[int, int]],
+                costs: Dict[Tuple[int, int], int], header_tokens: List[int],
+                token_budget: int, used: int) -> Tuple[set, int]:
+        """Lazy greedy selection by value per token; value decays with template repetition"""
+        window_weights = [
+            max(window.get('importance_score', 0.0) + window.get('prompt_match_score', 0.0), 0.1)
+            for window in windows
+        ]
+        template_counts: Dict[Any, int] = {}
+        opened = set()
+        selected = set()
+
+        def value(key: Tuple[int, int]) -> float:
+            log = windows[key[0]]['logs'][key[1]]
+            novelty = 1.0 / (1 + template_counts.get(self._template_key(log), 0))
+            return window_weights[key[0]] * SEVERITY_WEIGHTS.get(log.get('severity'), 0.4) * novelty
+
+        def cost(key: Tuple[int, int]) -> int:
+            return costs[key] + (0 if key[0] in opened else header_tokens[key[0]])
+
+        heap = [(-value(key) / max(cost(key), 1), key) for key in candidates]
+        heapq.heapify(heap)
+
+        while heap:
+            stale_ratio, key = heapq.heappop(heap)
+            ratio = -value(key) / max(cost(key), 1)
+            if heap and ratio > heap[0][0] + 1e-12:
+                # Worth less than when pushed (template already used): re-queue
+                heapq.heappush(heap, (ratio, key))
+                continue
+
+            key_cost = cost(key)
+            if used + key_cost > token_budget:
+                continue  # a cheaper log may still fit
+
+            used += key_cost
+            selected.add(key)
+            log = windows[key[0]]['logs'][key[1]]
+            template_key = self._template_key(log)
+            template_counts[template_key] = template_counts.get(template_key, 0) + 1
+
+            if key[0] not in opened:
+                opened.add(key[0])
+                # The header is paid for now, so this window's other logs got cheaper
+                heap = [
+                    (-value(k) / max(cost(k), 1), k) if k[0] == key[0] else (r, k)
+                    for r, k in heap
+                ]
+                heapq.heapify(heap)
+
+        return selected, used
+
+    def _assemble(self, header: str, windows: List[Dict[str, Any]], window_headers: List[str],
+                  rendered: Dict[Tuple[int, int], str], selected: set) -> str:
+        """Selected logs grouped by window, in the original window and log order"""
+        context_parts = [header]
+        for w, window in enumerate(windows):
+            rows = [l for l in range(len(window['logs'])) if (w, l) in selected]
+            if not rows:
+                continue
+            context_parts.append(window_headers[w])
+            for j, l in enumerate(rows, 1):
+                context_parts.append(rendered[(w, l)].replace('Log #', f'Log {j}', 1))
+        return "\n".join(context_parts)
+
+    def _window_header(self, window: Dict[str, Any], number: int, shorten: bool) -> str:
+        if shorten and window.get('trace_id'):
+            # Shortened logs omit the window's own trace id, so state it once here
+            return f"**Window {number}: {window['summary']}** (trace {window['trace_id'][:8]})"
+        return f"**Window {number}: {window['summary']}**"
+
+    def _render_log(self, log: Dict[str, Any], window: Dict[str, Any], shorten: bool) -> str:
+        """One log as a header line and message line ('Log #' is numbered on assembly)"""
+        log_info = []
+
+        if log.get('service') and log['service'] != 'unknown':
+            log_info.append(f"Service: {log['service']}")
+
+        if log.get('severity'):
+            log_info.append(f"Severity: {log['severity']}")
+
+        if log.get('method') and log.get('route'):
+            log_info.append(f"HTTP: {log['method']} {log['route']}")
+        elif log.get('route'):
+            log_info.append(f"Route: {log['route']}")
+
+        if log.get('status'):
+            log_info.append(f"Status: {log['status']}")
+
+        if log.get('trace_id'):
+            if not shorten:
+                log_info.append(f"Trace: {log['trace_id'][:16]}...")
+            elif log['trace_id'] != window.get('trace_id'):
+                # Logs on the window's own trace need no per-log trace id
+                log_info.append(f"Trace: {log['trace_id'][:8]}")
+
+        message = log['message']
+        if shorten:
+            message = _LONG_ID_PATTERN.sub(lambda m: m.group(0)[:8] + '…', message)
+            limit = 160
+        else:
+            limit = 200
+        if len(message) > limit:
+            message = message[:limit] + '...'
+
+        log_header = f"  Log #: {' | '.join(log_info)}" if log_info else "  Log #:"
+        return f"{log_header}\n    Message: {message}\n"
+
+    def _template_key(self, log: Dict[str, Any]) -> Any:
+        template = log.get('template')
+        return template if template is not None else log['message'][:60]
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Content-addressed dataset registry
+Stores each uploaded log file once under its SHA-256 so follow-ups reference it by id
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Optional, BinaryIO, Tuple
+
+logger = logging.getLogger(__name__)
+
+DATASET_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+@dataclass
+class DatasetInfo:
+    """Metadata for a stored dataset"""
+    dataset_id: str
+    filename: str
+    size_bytes: int
+    created_at: float
+    # Set for datasets registered by extend(): the dataset whose bytes this one starts with
+    parent_id: Optional[str] = None
+
+
+class DatasetRegistry:
+    def __init__(self, storage_dir: Optional[str] = None, chunk_size: int = 1 << 20):
+        self.storage_dir = Path(
+            storage_dir or os.getenv('DATASET_DIR') or Path(tempfile.gettempdir()) / 'log_datasets'
+        )
+        self.storage_dir.mkdir(parents=True, exist_ok=True)
+        self.chunk_size = chunk_size
+
+    def add_file(self, fileobj: BinaryIO, filename: str) -> Tuple[DatasetInfo, bool]:
+        """
+        Store an uploaded file under its content hash
+
+        Streams the file to a staging path while hashing, so the upload is
+        never held in memory. Returns (info, created); identical bytes that
+        are already registered are discarded and created is False.
+        """
+        return self._store(fileobj, filename)
+
+    def extend(self, parent: DatasetInfo, fileobj: BinaryIO, filename: str) -> Tuple[DatasetInfo, bool]:
+        """
+        Store a re-export that is a superset of parent (its bytes start with all of parent's)
+
+        The prefix is checked against the parent's hash while streaming, so
+        nothing is read twice. Raises ValueError if the upload does not extend
+        parent. Uploading the parent's exact bytes returns the parent.
+        """
+        return self._store(fileobj, filename, parent)
+
+    def _store(self, fileobj: BinaryIO, filename: str,
+               parent: Optional[DatasetInfo] = None) -> Tuple[DatasetInfo, bool]:
+        hasher = hashlib.sha256()
+        size = 0
+        prefix_digest = None
+
+        fd, staging_path = tempfile.mkstemp(dir=self.storage_dir, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as staging:
+                while True:
+                    chunk = fileobj.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    if parent is not None and prefix_digest is None and size + len(chunk) >= parent.size_bytes:
+                        # Snapshot the hash exactly at the end of the parent's bytes
+                        cut = parent.size_bytes - size
+                        hasher.update(chunk[:cut])
+                        prefix_digest = hasher.copy().hexdigest()
+                        hasher.update(chunk[cut:])
+                    else:
+                        hasher.update(chunk)
+                    staging.write(chunk)
+                    size += len(chunk)
+
+            if parent is not None:
+                if prefix_digest is None and parent.size_bytes == 0:
+                    prefix_digest = hashlib.sha256().hexdigest()
+                if prefix_digest != parent.dataset_id:
+                    raise ValueError(f"Upload does not start with the contents of dataset {parent.dataset_id[:12]}")
+
+            dataset_id = hasher.hexdigest()
+            existing = self.get(dataset_id)
+            if existing:
+                logger.info(f"Dataset {dataset_id[:12]} already registered, skipping store")
+                return existing, False
+
+            dataset_dir = self._dataset_dir(dataset_id)
+            dataset_dir.mkdir(parents=True, exist_ok=True)
+            os.replace(staging_path, self.logs_path(dataset_id))
+
+            info = DatasetInfo(
+                dataset_id=dataset_id,
+                filename=filename,
+                size_bytes=size,
+                created_at=time.time(),
+                parent_id=parent.dataset_id if parent is not None else None
+            )
+            # Metadata is written last so a dataset only becomes visible once complete
+            # (unique temp name: concurrent uploads of the same bytes race to this point)
+            meta_fd, meta_tmp = tempfile.mkstemp(dir=dataset_dir, suffix='.meta.tmp')
+            try:
+                with os.fdopen(meta_fd, 'w') as meta_file:
+                    meta_file.write(json.dumps(asdict(info)))
+                os.replace(meta_tmp, dataset_dir / 'meta.json')
+            finally:
+                if os.path.exists(meta_tmp):
+                    os.unlink(meta_tmp)
+
+            extends = f", extending {parent.dataset_id[:12]}" if parent is not None else ""
+            logger.info(f"Registered dataset {dataset_id[:12]} ({size} bytes) from {filename}{extends}")
+            return info, True
+        finally:
+            if os.path.exists(staging_path):
+                os.unlink(staging_path)
+
+    def get(self, dataset_id: str) -> Optional[DatasetInfo]:
+        """Look up dataset metadata, or None if unknown"""
+        if not DATASET_ID_PATTERN.match(dataset_id):
+            return None
+
+        meta_path = self._dataset_dir(dataset_id) / 'meta.json'
+        if not meta_path.exists():
+            return None
+
+        try:
+            return DatasetInfo(**json.loads(meta_path.read_text()))
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(f"Unreadable metadata for dataset {dataset_id[:12]}: {e}")
+            return None
+
+    def logs_path(self, dataset_id: str) -> str:
+        """Path of the stored raw log file"""
+        return str(self._dataset_dir(dataset_id) / 'logs')
+
+    def index_path(self, dataset_id: str) -> str:
+        """Directory of the persisted columnar store (see ColumnarLogStore.save)"""
+        return str(self._dataset_dir(dataset_id) / 'index')
+
+    def _dataset_dir(self, dataset_id: str) -> Path:
+        return self.storage_dir / dataset_id
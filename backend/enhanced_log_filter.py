@@ -4,25 +4,83 @@ Enhanced Intelligent Log Filtering System
 Implements advanced filtering strategies for maximum accuracy with minimal API costs
 """
 
+import io
 import json
 import re
-import hashlib
 import logging
-from typing import List, Dict, Any, Tuple, Optional, Union
-from datetime import datetime, timezone
-from collections import defaultdict, Counter
+from typing import List, Dict, Any, Tuple, Optional, Union, Iterable, Iterator, TextIO, NamedTuple, TYPE_CHECKING
+from datetime import datetime, timedelta, timezone
+from collections import Counter
+from itertools import chain, islice
 from dataclasses import dataclass, field
 from pathlib import Path
+import time
 import uuid
 
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; filter_store falls back to the object pipeline
+    np = None
+
+from template_miner import TemplateMiner
+from timestamp_parser import TimestampParser, MISSING_TIMESTAMP, MAX_TIMESTAMP
+from time_range import TimeRangeQuery, parse_time_range, resolve_time_range
+from windowing import sweep_windows, sweep_windows_columnar
+from metrics import timed, timed_iter
+from relevance import (
+    RELEVANCE_WEIGHT, TermStats, query_terms, log_terms, token_count, bm25, bm25_sparse, idf_array
+)
+from template_spikes import TemplateSpikes, SpikeCounter
+from log_index import keyword_in_body
+
+if TYPE_CHECKING:
+    from columnar_store import ColumnarLogStore
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Timestamps are stored as integer epoch nanoseconds; int64 min means missing
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def datetime_to_ns(value: Optional[datetime]) -> int:
+    """Convert an aware datetime to integer epoch nanoseconds"""
+    if value is None:
+        return MISSING_TIMESTAMP
+    return (value - EPOCH) // timedelta(microseconds=1) * 1000
+
+
+def ns_to_datetime(value: int) -> Optional[datetime]:
+    """Convert integer epoch nanoseconds back to an aware datetime"""
+    if value == MISSING_TIMESTAMP:
+        return None
+    return EPOCH + timedelta(microseconds=value // 1000)
+
+
+# Per-entry feature bits (LogEntry.features), computed once at normalization
+FEATURE_ERROR_KEYWORD = 1 << 0   # error keyword in body
+FEATURE_SERVER_ERROR = 1 << 1    # status >= 500
+FEATURE_HIGH_SEVERITY = 1 << 2   # severity >= WARN
+FEATURE_CLIENT_ERROR = 1 << 3    # 400 <= status < 500
+FEATURE_HAS_TRACE = 1 << 4
+HOT_FEATURES = FEATURE_ERROR_KEYWORD | FEATURE_SERVER_ERROR | FEATURE_HIGH_SEVERITY
+
+HTTP_METHODS = ('GET', 'POST', 'PUT', 'DELETE', 'PATCH', 'HEAD', 'OPTIONS')
+
+
+class BodyFeatures(NamedTuple):
+    """Everything the body-regex fallbacks need, from one scan of the body"""
+    trace_id: Optional[str] = None
+    status: Optional[int] = None
+    route: Optional[str] = None
+    method: Optional[str] = None
+    error_keyword: bool = False
+
 @dataclass
 class LogEntry:
     """Normalized log entry with defensive field extraction"""
     raw: Dict[str, Any]
-    timestamp: Optional[datetime] = None
+    timestamp_ns: int = MISSING_TIMESTAMP
     timestamp_raw: Optional[str] = None
     severity_text: Optional[str] = None
     severity_number: Optional[int] = None
@@ -35,6 +93,17 @@ class LogEntry:
     service_name: str = "unknown"
     is_hot: bool = False
     template_hash: Optional[str] = None
+    template_id: Optional[int] = None
+    features: int = 0
+
+    @property
+    def timestamp(self) -> Optional[datetime]:
+        """Aware datetime view of timestamp_ns (microsecond precision)"""
+        return ns_to_datetime(self.timestamp_ns)
+
+    @timestamp.setter
+    def timestamp(self, value: Optional[datetime]):
+        self.timestamp_ns = datetime_to_ns(value)
 
 @dataclass
 class LogWindow:
@@ -48,6 +117,14 @@ class LogWindow:
     template_counts: Dict[str, int] = field(default_factory=dict)
     summary: str = ""
 
+@dataclass
+class AccessPlan:
+    """Field-access plan compiled for one record shape (key-set signature)"""
+    signature: Tuple
+    shape: str
+    # normalized field -> only the candidate paths that exist in this shape
+    paths: Dict[str, List[Tuple[str, ...]]] = field(default_factory=dict)
+
 class EnhancedLogFilter:
     def __init__(self):
         # Severity mappings with numeric values
@@ -60,7 +137,8 @@ class EnhancedLogFilter:
         }
         
         # Hot event patterns (high precision indicators)
-        self.error_patterns = re.compile(r'\b(error|exception|failed?|failure|crash|timeout|refused|denied|unavailable|unreachable|panic|fatal|critical|alert|emergency|abort|kill|interrupt)\b', re.IGNORECASE)
+        error_keywords = r'error|exception|failed?|failure|crash|timeout|refused|denied|unavailable|unreachable|panic|fatal|critical|alert|emergency|abort|kill|interrupt'
+        self.error_patterns = re.compile(rf'\b({error_keywords})\b', re.IGNORECASE)
         
         # HTTP status patterns
         self.status_pattern = re.compile(r'\b(status[:\s]*([45]\d{2})|HTTP[/\s]*([45]\d{2})|\b([45]\d{2})\b)', re.IGNORECASE)
@@ -71,101 +149,185 @@ class EnhancedLogFilter:
         # Method patterns
         self.method_pattern = re.compile(r'\b(GET|POST|PUT|DELETE|PATCH|HEAD|OPTIONS)\b', re.IGNORECASE)
         
-        # Template patterns for deduplication
-        self.template_patterns = [
-            (re.compile(r'\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b', re.IGNORECASE), 'UUID'),
-            (re.compile(r'\b\d+\b'), 'NUM'),
-            (re.compile(r'"[^"]*"'), 'STR'),
-            (re.compile(r"'[^']*'"), 'STR'),
-            (re.compile(r'\b[0-9a-f]{16,64}\b', re.IGNORECASE), 'HASH'),
-            (re.compile(r'\b\d{4}-\d{2}-\d{2}[T\s]\d{2}:\d{2}:\d{2}'), 'TIMESTAMP')
-        ]
+        # Single-pass body scanner combining the trace, status, route, method and
+        # error-keyword patterns above. Trace ids and route targets are captured in
+        # lookaheads so matches starting inside them are still seen by the same scan.
+        methods = '|'.join(HTTP_METHODS)
+        # The leading class lists the first character of every alternative so the
+        # regex engine can skip other positions without trying each branch.
+        self.body_feature_pattern = re.compile(
+            r'(?=[tshgpdoreufckai45])(?:'
+            r'trace[_-]?id[:\s=]*(?=(?P<trace>[a-f0-9]{16,64}))'
+            r'|\bstatus[:\s]*(?P<status1>[45]\d{2})'
+            r'|\bHTTP[/\s]*(?P<status2>[45]\d{2})'
+            r'|\b(?P<status3>[45]\d{2})\b'
+            rf'|(?P<route_method>{methods})(?=\s+(?P<route1>[/\w\-\.:]+))'
+            r'|(?:route|path|endpoint)(?=[:\s]*(?P<route2>[/\w\-\.:]+))'
+            rf'|\b(?P<method>{methods})\b'
+            rf'|\b(?P<error>{error_keywords})\b)',
+            re.IGNORECASE
+        )
+        
+        # Online template miner for deduplication; shared across uploads so
+        # template ids stay stable for the lifetime of this filter
+        self.template_miner = TemplateMiner()
+
+        # Detects each timestamp field's format once, then parses to epoch ns
+        self.timestamp_parser = TimestampParser()
+
+        # Candidate field paths per normalized field, in priority order (pre-split on '.')
+        field_candidates = {
+            'timestamp': [
+                'timestamp', '@timestamp', 'time', 'ts', 'datetime',
+                'fields.timestamp', 'attributes.timestamp'
+            ],
+            'severity': [
+                'fields.severity_text', 'severity_text', 'severity', 'level',
+                'fields.severity_number', 'severity_number', 'levelname'
+            ],
+            'trace_id': [
+                'fields.trace_id', 'trace_id', 'traceId', 'traceid',
+                'attributes.trace_id', 'spans.trace_id', 'context.trace_id'
+            ],
+            'span_id': [
+                'fields.span_id', 'span_id', 'spanId', 'spanid',
+                'attributes.span_id'
+            ],
+            'status': [
+                'status', 'status_code', 'http.status_code', 'response.status',
+                'attributes.http.status_code', 'fields.status'
+            ],
+            'route': [
+                'route', 'path', 'endpoint', 'url', 'uri',
+                'http.route', 'http.target', 'attributes.http.route'
+            ],
+            'method': [
+                'method', 'http.method', 'request.method',
+                'attributes.http.method'
+            ],
+            'body': [
+                'body', 'message', 'msg', 'text', 'log',
+                'attributes.message', 'fields.message'
+            ],
+            'service_name': [
+                'resource_attributes.service.name',
+                'service.name', 'service_name', 'serviceName',
+                'resource_attributes.k8s.deployment.name',
+                'resource_attributes.k8s.container.name',
+                'k8s.deployment.name', 'k8s.container.name',
+                'container_name', 'containerName', 'app', 'component'
+            ]
+        }
+        self.field_paths = {
+            name: [tuple(path.split('.')) for path in paths]
+            for name, paths in field_candidates.items()
+        }
+
+        # Nested key prefixes of the candidate paths; a record's shape signature
+        # only looks at these, since no other nesting affects field access
+        self._nested_prefixes = self._build_prefix_trie(self.field_paths)
+        self._access_plans: Dict[Tuple, AccessPlan] = {}
+        self.max_access_plans = 1024
+        self.schema_sample_size = 1000
+
+    def normalize_log_entry(self, raw_log: Dict[str, Any], assign_template: bool = True) -> LogEntry:
+        """
+        Defensive field extraction with multiple fallback paths
 
-    def normalize_log_entry(self, raw_log: Dict[str, Any]) -> LogEntry:
-        """Defensive field extraction with multiple fallback paths"""
+        assign_template=False skips template mining (parallel ingestion workers
+        leave it to the parent so template ids come from a single miner)
+        """
         entry = LogEntry(raw=raw_log)
+        plan = self._access_plan(raw_log)
         
-        entry.timestamp_raw, entry.timestamp = self._extract_timestamp(raw_log)
-        entry.severity_text, entry.severity_number = self._extract_severity(raw_log)
+        entry.timestamp_raw, entry.timestamp_ns = self._extract_timestamp(raw_log, plan)
+        entry.severity_text, entry.severity_number = self._extract_severity(raw_log, plan)
+        
+        # Body is extracted and scanned once; extractors fall back to these features
+        entry.body = self._extract_body(raw_log, plan)
+        body_features = self.extract_body_features(entry.body)
         
         # trace id
-        entry.trace_id = self._extract_trace_id(raw_log)
-        entry.span_id = self._extract_span_id(raw_log)
+        entry.trace_id = self._extract_trace_id(raw_log, plan, body_features)
+        entry.span_id = self._extract_span_id(raw_log, plan)
         
-        entry.status = self._extract_status(raw_log)
+        entry.status = self._extract_status(raw_log, plan, body_features)
         
-        entry.route = self._extract_route(raw_log)
-        entry.method = self._extract_method(raw_log)
-        entry.body = self._extract_body(raw_log)
+        entry.route = self._extract_route(raw_log, plan, body_features)
+        entry.method = self._extract_method(raw_log, plan, body_features)
     
-        entry.service_name = self._extract_service_name(raw_log)
+        entry.service_name = self._extract_service_name(raw_log, plan)
         
+        entry.features = self._feature_bits(entry, body_features)
         entry.is_hot = self._is_hot_event(entry)
        
-        entry.template_hash = self._generate_template_hash(entry.body)
+        if assign_template:
+            self.assign_template(entry)
         
         return entry
 
-    def _extract_timestamp(self, log: Dict[str, Any]) -> Tuple[Optional[str], Optional[datetime]]:
-        """Extract timestamp with multiple fallback paths"""
-        timestamp_fields = [
-            'timestamp', '@timestamp', 'time', 'ts', 'datetime',
-            'fields.timestamp', 'attributes.timestamp'
-        ]
-        
-        for field_path in timestamp_fields:
-            value = self._safe_get_nested(log, field_path)
-            if value is not None:
-                dt = self._parse_timestamp(value)
-                if dt:
-                    return str(value), dt
-        
-        return None, None
+    def assign_template(self, entry: LogEntry) -> LogEntry:
+        """Mine the entry's body and record its template id"""
+        cluster = self.template_miner.add_log(entry.body)
+        entry.template_id = cluster.cluster_id
+        entry.template_hash = str(cluster.cluster_id)
 
-    def _parse_timestamp(self, value: Union[str, int, float]) -> Optional[datetime]:
-        """Parse timestamp from various formats"""
-        if isinstance(value, (int, float)):
-            try:
-                # Handle nanosecond, microsecond, millisecond, and second timestamps
-                if value > 1e15:  # Nanoseconds
-                    return datetime.fromtimestamp(value / 1e9, tz=timezone.utc)
-                elif value > 1e12:  # Microseconds
-                    return datetime.fromtimestamp(value / 1e6, tz=timezone.utc)
-                elif value > 1e10:  # Milliseconds
-                    return datetime.fromtimestamp(value / 1e3, tz=timezone.utc)
-                else:  # Seconds
-                    return datetime.fromtimestamp(value, tz=timezone.utc)
-            except (ValueError, OSError):
-                pass
-        
-        if isinstance(value, str):
-            # Try ISO8601 formats
-            iso_formats = [
-                '%Y-%m-%dT%H:%M:%S.%fZ',
-                '%Y-%m-%dT%H:%M:%SZ',
-                '%Y-%m-%dT%H:%M:%S.%f',
-                '%Y-%m-%dT%H:%M:%S',
-                '%Y-%m-%d %H:%M:%S.%f',
-                '%Y-%m-%d %H:%M:%S',
-            ]
-            
-            for fmt in iso_formats:
-                try:
-                    return datetime.strptime(value, fmt).replace(tzinfo=timezone.utc)
-                except ValueError:
+        return entry
+
+    def store_template_ids(self, store: 'ColumnarLogStore') -> Optional[List[Tuple[int, str]]]:
+        """
+        (template_id, template_hash) from this filter's miner for each of a loaded store's templates
+
+        Stores loaded from disk got their ids from another process. Each of their
+        templates is mined once, from its saved template text (else its first
+        row), and the mapping is kept on the store so every reader of the store
+        assigns the same ids. None for stores built in this process.
+        """
+        if store.template_texts is None:
+            return None
+        if store.template_remap is None:
+            template_column = np.asarray(store.columns['template_id'])
+            templates, first_rows = np.unique(template_column, return_index=True)
+            first_row = {template: row for template, row in zip(templates.tolist(), first_rows.tolist()) if template >= 0}
+            counts = np.bincount(template_column[template_column >= 0], minlength=len(store.templates)).tolist()
+            remap = []
+            for template, text in enumerate(store.template_texts):
+                if template not in first_row:
+                    remap.append((None, store.templates.decode(template)))
                     continue
+                body = store.body(first_row[template])
+                cluster = self.template_miner.add_masked(text or self.template_miner.mask(body), body, counts[template])
+                remap.append((cluster.cluster_id, str(cluster.cluster_id)))
+            store.template_remap = remap
+            logger.info(f"Re-mined {len(first_row)} templates of a loaded store")
+        return store.template_remap
+
+    def store_entries(self, store: 'ColumnarLogStore', rows: Optional[Iterable[int]] = None) -> Iterator[LogEntry]:
+        """A store's rows (all, or the given ones) as entries, with template ids from store_template_ids()"""
+        remap = self.store_template_ids(store)
+        template_column = store.columns['template_id']
+        for row in range(len(store)) if rows is None else rows:
+            entry = store.entry(row)
+            template = int(template_column[row])
+            if remap is not None and template >= 0:
+                entry.template_id, entry.template_hash = remap[template]
+            yield entry
+
+    def _extract_timestamp(self, log: Dict[str, Any], plan: Optional[AccessPlan] = None) -> Tuple[Optional[str], int]:
+        """Extract timestamp (raw string, epoch ns) with multiple fallback paths"""
+        for keys in self._field_paths(plan, 'timestamp'):
+            value = self._get_path(log, keys)
+            if value is not None:
+                ns = self.timestamp_parser.parse(value, keys)
+                if ns != MISSING_TIMESTAMP:
+                    return str(value), ns
         
-        return None
+        return None, MISSING_TIMESTAMP
 
-    def _extract_severity(self, log: Dict[str, Any]) -> Tuple[Optional[str], Optional[int]]:
+    def _extract_severity(self, log: Dict[str, Any], plan: Optional[AccessPlan] = None) -> Tuple[Optional[str], Optional[int]]:
         """Extract severity with normalization"""
-        severity_fields = [
-            'fields.severity_text', 'severity_text', 'severity', 'level',
-            'fields.severity_number', 'severity_number', 'levelname'
-        ]
-        
-        for field_path in severity_fields:
-            value = self._safe_get_nested(log, field_path)
+        for keys in self._field_paths(plan, 'severity'):
+            value = self._get_path(log, keys)
             if value is not None:
                 if isinstance(value, str):
                     normalized = value.upper().strip()
@@ -185,49 +347,32 @@ class EnhancedLogFilter:
         
         return None, None
 
-    def _extract_trace_id(self, log: Dict[str, Any]) -> Optional[str]:
+    def _extract_trace_id(self, log: Dict[str, Any], plan: Optional[AccessPlan] = None,
+                          body_features: Optional[BodyFeatures] = None) -> Optional[str]:
         """Extract trace ID from various locations"""
-        trace_fields = [
-            'fields.trace_id', 'trace_id', 'traceId', 'traceid',
-            'attributes.trace_id', 'spans.trace_id', 'context.trace_id'
-        ]
-        
-        for field_path in trace_fields:
-            value = self._safe_get_nested(log, field_path)
+        for keys in self._field_paths(plan, 'trace_id'):
+            value = self._get_path(log, keys)
             if value and isinstance(value, str) and len(value) > 8:
                 return value
         
         # Try to extract from body
-        body = self._extract_body(log)
-        trace_match = re.search(r'trace[_-]?id[:\s=]*([a-f0-9]{16,64})', body, re.IGNORECASE)
-        if trace_match:
-            return trace_match.group(1)
-        
-        return None
+        body_features = body_features or self.extract_body_features(self._extract_body(log, plan))
+        return body_features.trace_id
 
-    def _extract_span_id(self, log: Dict[str, Any]) -> Optional[str]:
+    def _extract_span_id(self, log: Dict[str, Any], plan: Optional[AccessPlan] = None) -> Optional[str]:
         """Extract span ID"""
-        span_fields = [
-            'fields.span_id', 'span_id', 'spanId', 'spanid',
-            'attributes.span_id'
-        ]
-        
-        for field_path in span_fields:
-            value = self._safe_get_nested(log, field_path)
+        for keys in self._field_paths(plan, 'span_id'):
+            value = self._get_path(log, keys)
             if value and isinstance(value, str):
                 return value
         
         return None
 
-    def _extract_status(self, log: Dict[str, Any]) -> Optional[int]:
+    def _extract_status(self, log: Dict[str, Any], plan: Optional[AccessPlan] = None,
+                        body_features: Optional[BodyFeatures] = None) -> Optional[int]:
         """Extract HTTP status code"""
-        status_fields = [
-            'status', 'status_code', 'http.status_code', 'response.status',
-            'attributes.http.status_code', 'fields.status'
-        ]
-        
-        for field_path in status_fields:
-            value = self._safe_get_nested(log, field_path)
+        for keys in self._field_paths(plan, 'status'):
+            value = self._get_path(log, keys)
             if isinstance(value, int) and 100 <= value <= 599:
                 return value
             elif isinstance(value, str) and value.isdigit():
@@ -235,220 +380,421 @@ class EnhancedLogFilter:
                 if 100 <= status <= 599:
                     return status
         
-        body = self._extract_body(log)
-        status_match = self.status_pattern.search(body)
-        if status_match:
-            for group in status_match.groups():
-                if group and group.isdigit():
-                    status = int(group)
-                    if 100 <= status <= 599:
-                        return status
-        
-        return None
+        body_features = body_features or self.extract_body_features(self._extract_body(log, plan))
+        return body_features.status
 
-    def _extract_route(self, log: Dict[str, Any]) -> Optional[str]:
+    def _extract_route(self, log: Dict[str, Any], plan: Optional[AccessPlan] = None,
+                       body_features: Optional[BodyFeatures] = None) -> Optional[str]:
         """Extract route/endpoint"""
-        route_fields = [
-            'route', 'path', 'endpoint', 'url', 'uri',
-            'http.route', 'http.target', 'attributes.http.route'
-        ]
-        
-        for field_path in route_fields:
-            value = self._safe_get_nested(log, field_path)
+        for keys in self._field_paths(plan, 'route'):
+            value = self._get_path(log, keys)
             if value and isinstance(value, str) and value.startswith('/'):
                 return value
         
-        body = self._extract_body(log)
-        route_match = self.route_pattern.search(body)
-        if route_match:
-            for group in route_match.groups():
-                if group and group.startswith('/'):
-                    return group
-        
-        return None
+        body_features = body_features or self.extract_body_features(self._extract_body(log, plan))
+        return body_features.route
 
-    def _extract_method(self, log: Dict[str, Any]) -> Optional[str]:
+    def _extract_method(self, log: Dict[str, Any], plan: Optional[AccessPlan] = None,
+                        body_features: Optional[BodyFeatures] = None) -> Optional[str]:
         """Extract HTTP method"""
-        method_fields = [
-            'method', 'http.method', 'request.method',
-            'attributes.http.method'
-        ]
-        
-        for field_path in method_fields:
-            value = self._safe_get_nested(log, field_path)
+        for keys in self._field_paths(plan, 'method'):
+            value = self._get_path(log, keys)
             if value and isinstance(value, str):
                 method = value.upper()
-                if method in ['GET', 'POST', 'PUT', 'DELETE', 'PATCH', 'HEAD', 'OPTIONS']:
+                if method in HTTP_METHODS:
                     return method
     
-        body = self._extract_body(log)
-        method_match = self.method_pattern.search(body)
-        if method_match:
-            return method_match.group(1).upper()
-        
-        return None
+        body_features = body_features or self.extract_body_features(self._extract_body(log, plan))
+        return body_features.method
 
-    def _extract_body(self, log: Dict[str, Any]) -> str:
+    def _extract_body(self, log: Dict[str, Any], plan: Optional[AccessPlan] = None) -> str:
         """Extract log message/body with fallbacks"""
-        body_fields = [
-            'body', 'message', 'msg', 'text', 'log',
-            'attributes.message', 'fields.message'
-        ]
-        
-        for field_path in body_fields:
-            value = self._safe_get_nested(log, field_path)
+        for keys in self._field_paths(plan, 'body'):
+            value = self._get_path(log, keys)
             if value:
                 return str(value)
         
         # If no body field found, return string representation of entire log
         return str(log)
 
-    def _extract_service_name(self, log: Dict[str, Any]) -> str:
+    def _extract_service_name(self, log: Dict[str, Any], plan: Optional[AccessPlan] = None) -> str:
         """Extract service name with fallbacks"""
-        service_fields = [
-            'resource_attributes.service.name',
-            'service.name', 'service_name', 'serviceName',
-            'resource_attributes.k8s.deployment.name',
-            'resource_attributes.k8s.container.name',
-            'k8s.deployment.name', 'k8s.container.name',
-            'container_name', 'app', 'component'
-        ]
-        
-        for field_path in service_fields:
-            value = self._safe_get_nested(log, field_path)
+        for keys in self._field_paths(plan, 'service_name'):
+            value = self._get_path(log, keys)
             if value and isinstance(value, str):
                 return value.lower()
         
         return 'unknown'
 
-    def _safe_get_nested(self, obj: Dict[str, Any], path: str) -> Any:
-        """Safely get nested dictionary value"""
-        keys = path.split('.')
-        current = obj
-        
+    def extract_body_features(self, body: str) -> BodyFeatures:
+        """Scan a body once for trace id, status, route, method and error keywords
+
+        Each feature keeps its leftmost match, like the individual patterns.
+        As with route_pattern, only the first route-like match counts, and only
+        if it starts with '/'.
+        """
+        trace_id = status = route = method = None
+        route_seen = error_keyword = False
+
+        for match in self.body_feature_pattern.finditer(body):
+            kind = match.lastgroup
+            if kind == 'error':
+                error_keyword = True
+            elif kind == 'trace':
+                if trace_id is None:
+                    trace_id = match.group('trace')
+            elif kind in ('status1', 'status2', 'status3'):
+                if status is None:
+                    status = int(match.group(kind))
+            elif kind == 'method':
+                if method is None:
+                    method = match.group('method').upper()
+            else:
+                # route_method/route1 or route2 (lookahead groups close last)
+                if not route_seen:
+                    route_seen = True
+                    target = match.group('route1') or match.group('route2')
+                    if target.startswith('/'):
+                        route = target
+                route_method = match.group('route_method')
+                if route_method and method is None:
+                    start = match.start()
+                    # The standalone method pattern needs a word boundary before it
+                    if start == 0 or not (body[start - 1].isalnum() or body[start - 1] == '_'):
+                        method = route_method.upper()
+
+            if error_keyword and route_seen and trace_id and status and method:
+                break
+
+        return BodyFeatures(trace_id, status, route, method, error_keyword)
+
+    def _feature_bits(self, entry: LogEntry, body_features: BodyFeatures) -> int:
+        """Pack the per-entry flags every scoring stage reads into a bitmask"""
+        features = 0
+        if body_features.error_keyword:
+            features |= FEATURE_ERROR_KEYWORD
+        if entry.status:
+            if entry.status >= 500:
+                features |= FEATURE_SERVER_ERROR
+            elif entry.status >= 400:
+                features |= FEATURE_CLIENT_ERROR
+        if entry.severity_number and entry.severity_number >= 70:
+            features |= FEATURE_HIGH_SEVERITY
+        if entry.trace_id:
+            features |= FEATURE_HAS_TRACE
+        return features
+
+    def infer_schema(self, records: Iterable[Any]) -> Dict[str, int]:
+        """Compile access plans for the key shapes in a sample of raw records
+
+        Returns record counts per detected shape. Shapes first seen later in
+        the file still get their own plan lazily in normalize_log_entry.
+        """
+        shape_counts = Counter()
+        for record in records:
+            plan = self._access_plan(record)
+            shape_counts[plan.shape if plan else 'uncached'] += 1
+
+        if shape_counts:
+            logger.info(f"Schema inference: {dict(shape_counts)} across {len(self._access_plans)} key shapes")
+        return dict(shape_counts)
+
+    def _access_plan(self, log: Any) -> Optional[AccessPlan]:
+        """Return the cached access plan for this record's shape, compiling it on first sight"""
+        if not isinstance(log, dict):
+            return None
+
+        signature = self._shape_signature(log, self._nested_prefixes)
+        plan = self._access_plans.get(signature)
+        if plan is None:
+            if len(self._access_plans) >= self.max_access_plans:
+                # Too many distinct shapes to be worth caching - use the full candidate lists
+                return None
+            plan = self._compile_access_plan(log, signature)
+            self._access_plans[signature] = plan
+        return plan
+
+    def _compile_access_plan(self, log: Dict[str, Any], signature: Tuple) -> AccessPlan:
+        """Keep only the candidate paths that exist for this shape, in priority order"""
+        plan = AccessPlan(signature=signature, shape=self._classify_shape(log))
+        for name, candidates in self.field_paths.items():
+            plan.paths[name] = [keys for keys in candidates if self._path_exists(log, keys)]
+        return plan
+
+    def _classify_shape(self, log: Dict[str, Any]) -> str:
+        """Human-readable label for a record shape (used for logging)"""
+        if 'containerName' in log and 'podName' in log and 'log' in log:
+            return 'kubernetes'
+        if 'resource_attributes' in log or 'severity_text' in log or 'severity_number' in log:
+            return 'otel'
+        if 'fields' in log or 'attributes' in log:
+            return 'structured'
+        return 'generic'
+
+    def _shape_signature(self, obj: Dict[str, Any], prefixes: Dict[str, Any]) -> Tuple:
+        """Key-set signature of a record: its keys plus the keys of nested dicts on candidate paths"""
+        nested = tuple(
+            (key, self._shape_signature(obj[key], children))
+            for key, children in prefixes.items()
+            if key in obj and isinstance(obj[key], dict)
+        )
+        return (tuple(obj), nested) if nested else tuple(obj)
+
+    def _build_prefix_trie(self, field_paths: Dict[str, List[Tuple[str, ...]]]) -> Dict[str, Any]:
+        """Trie of the non-leaf keys of all candidate paths"""
+        trie: Dict[str, Any] = {}
+        for candidates in field_paths.values():
+            for keys in candidates:
+                node = trie
+                for key in keys[:-1]:
+                    node = node.setdefault(key, {})
+        return trie
+
+    def _field_paths(self, plan: Optional[AccessPlan], name: str) -> List[Tuple[str, ...]]:
+        """Candidate paths for a field: the compiled plan's, or the full list without one"""
+        if plan is not None:
+            return plan.paths[name]
+        return self.field_paths[name]
+
+    def _path_exists(self, obj: Any, keys: Tuple[str, ...]) -> bool:
+        for key in keys:
+            if isinstance(obj, dict) and key in obj:
+                obj = obj[key]
+            else:
+                return False
+        return True
+
+    def _get_path(self, obj: Any, keys: Tuple[str, ...]) -> Any:
+        """Safely get a nested value from a pre-split path"""
         for key in keys:
-            if isinstance(current, dict) and key in current:
-                current = current[key]
+            if isinstance(obj, dict) and key in obj:
+                obj = obj[key]
             else:
                 return None
-        
-        return current
+        return obj
 
     def _is_hot_event(self, entry: LogEntry) -> bool:
-        """Determine if this is a hot event (high importance)"""
-        # Severity >= WARN
-        if entry.severity_number and entry.severity_number >= 70:
-            return True
-        
-        # Status >= 500
-        if entry.status and entry.status >= 500:
-            return True
-        
-        # Error keywords in body
-        if self.error_patterns.search(entry.body):
-            return True
-        
-        return False
+        """Determine if this is a hot event (high importance)
+
+        Severity >= WARN, status >= 500 or error keywords in body, read from
+        the feature bitmask computed during normalization.
+        """
+        return bool(entry.features & HOT_FEATURES)
 
     def _generate_template_hash(self, body: str) -> str:
-        """Generate template hash for deduplication"""
-        template = body
-        for pattern, replacement in self.template_patterns:
-            template = pattern.sub(replacement, template)
-        
-        return hashlib.md5(template.encode()).hexdigest()[:8]
+        """Template key for deduplication (the mined template id)"""
+        return str(self.template_miner.add_log(body).cluster_id)
 
     def load_logs(self, file_path: str) -> List[LogEntry]:
         """Load logs from NDJSON or JSON array"""
-        logs = []
-        
+        return list(self.iter_logs(file_path))
+
+    def iter_logs(self, file_path: str, chunk_size: int = 1 << 20,
+                  timings: Optional[Dict[str, float]] = None, offset: int = 0) -> Iterator[LogEntry]:
+        """Stream normalized logs from NDJSON or JSON array without reading the whole file
+
+        With a timings dict, seconds spent reading/decoding JSON and normalizing
+        are added to its 'parse' and 'normalize' entries. A non-zero byte offset
+        reads NDJSON from there on (the lines appended after an earlier version
+        of the file).
+        """
+        records = self._iter_records(file_path, chunk_size, offset)
+        if timings is not None:
+            records = timed_iter(records, timings, 'parse')
+        self.timestamp_parser.reset()
+
+        # Compile access plans from a leading sample before normalizing
+        sample = list(islice(records, self.schema_sample_size))
+        with timed(timings, 'normalize'):
+            self.infer_schema(sample)
+
+        if timings is None:
+            for log_data in chain(sample, records):
+                yield self.normalize_log_entry(log_data)
+            return
+
+        clock = time.perf_counter
+        elapsed = 0.0
+        try:
+            for log_data in chain(sample, records):
+                start = clock()
+                entry = self.normalize_log_entry(log_data)
+                elapsed += clock() - start
+                yield entry
+        finally:
+            timings['normalize'] = timings.get('normalize', 0.0) + elapsed
+
+    def _iter_records(self, file_path: str, chunk_size: int, offset: int = 0) -> Iterator[Any]:
+        """Yield raw JSON records, detecting JSON array vs NDJSON from the first character"""
+        if offset:
+            # offset counts bytes, so seek the binary file and decode from there.
+            # A line cut at the offset belonged to the earlier version; its tail is malformed and skipped
+            with open(file_path, 'rb') as raw:
+                raw.seek(offset)
+                yield from self._iter_ndjson(io.TextIOWrapper(raw, errors='replace'))
+            return
+
         with open(file_path, 'r') as f:
-            content = f.read().strip()
-            
-            # Try to parse as JSON array first
+            first_char = self._peek_first_char(f)
+            if first_char == '[':
+                yielded = 0
+                try:
+                    for record in self._iter_json_array(f, chunk_size):
+                        yielded += 1
+                        yield record
+                    return
+                except json.JSONDecodeError:
+                    if yielded:
+                        logger.warning(f"Malformed JSON array after {yielded} records, stopping")
+                        return
+                # Not a valid array - fall back to NDJSON from the start
+                f.seek(0)
+
+            yield from self._iter_ndjson(f)
+
+    def _peek_first_char(self, f: TextIO) -> str:
+        """Return the first non-whitespace character and rewind the file"""
+        while True:
+            chunk = f.read(4096)
+            if not chunk:
+                break
+            stripped = chunk.lstrip()
+            if stripped:
+                f.seek(0)
+                return stripped[0]
+        f.seek(0)
+        return ''
+
+    def _iter_ndjson(self, f: TextIO) -> Iterator[Any]:
+        """Parse NDJSON line by line, skipping blank and malformed lines"""
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
             try:
-                if content.startswith('['):
-                    json_logs = json.loads(content)
-                    for log_data in json_logs:
-                        logs.append(self.normalize_log_entry(log_data))
-                    return logs
+                yield json.loads(line)
             except json.JSONDecodeError:
-                pass
-            
-            # Parse as NDJSON
-            for line in content.split('\n'):
-                line = line.strip()
-                if not line:
+                continue
+
+    def _iter_json_array(self, f: TextIO, chunk_size: int) -> Iterator[Any]:
+        """Incrementally decode the elements of a top-level JSON array"""
+        decoder = json.JSONDecoder()
+        buffer = f.read(chunk_size)
+        while '[' not in buffer:
+            buffer = f.read(chunk_size)
+            if not buffer:
+                raise json.JSONDecodeError("Expected JSON array", '', 0)
+        pos = buffer.index('[') + 1
+        eof = False
+
+        while True:
+            # Skip whitespace and element separators
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+
+            if pos >= len(buffer) or (not eof and len(buffer) - pos < 64):
+                more = f.read(chunk_size)
+                if more:
+                    buffer = buffer[pos:] + more
+                    pos = 0
                     continue
-                try:
-                    log_data = json.loads(line)
-                    logs.append(self.normalize_log_entry(log_data))
-                except json.JSONDecodeError:
+                eof = True
+                if pos >= len(buffer):
+                    raise json.JSONDecodeError("Unterminated JSON array", buffer, pos)
+
+            if buffer[pos] == ']':
+                return
+
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                more = f.read(chunk_size)
+                if not more:
+                    eof = True
+                buffer = buffer[pos:] + more
+                pos = 0
+                continue
+
+            # A scalar ending exactly at the buffer edge may be truncated
+            if end == len(buffer) and not eof:
+                more = f.read(chunk_size)
+                if more:
+                    buffer = buffer[pos:] + more
+                    pos = 0
                     continue
-        
-        return logs
+                eof = True
+
+            yield record
+            pos = end
 
-    def hot_event_prefilter(self, logs: List[LogEntry]) -> List[LogEntry]:
+            # Drop consumed text so the buffer stays around one chunk
+            if pos >= chunk_size:
+                buffer = buffer[pos:]
+                pos = 0
+
+    def hot_event_prefilter(self, logs: Iterable[LogEntry]) -> List[LogEntry]:
         """Quick prefilter to keep only interesting logs"""
-        hot_logs = [log for log in logs if log.is_hot]
-        logger.info(f"Hot event prefilter: {len(logs)} → {len(hot_logs)} logs")
+        total_logs, hot_logs, _ = self._partition_hot_events(logs)
+        logger.info(f"Hot event prefilter: {total_logs} → {len(hot_logs)} logs")
         return hot_logs
 
-    def create_trace_windows(self, logs: List[LogEntry], window_seconds: int = 30, max_window_size: int = 40) -> List[LogWindow]:
-        """Create trace-based or time-based windows"""
-        windows = []
-        processed_logs = set()
-        
-        # Group by trace_id first
-        trace_groups = defaultdict(list)
-        no_trace_logs = []
-        
+    def _partition_hot_events(self, logs: Iterable[LogEntry], fallback_limit: int = 200) -> Tuple[int, List[LogEntry], List[LogEntry]]:
+        """Single pass over logs: count them, keep hot events and a capped severity fallback"""
+        total_logs = 0
+        hot_logs = []
+        fallback_logs = []
+
         for log in logs:
-            if log.trace_id:
-                trace_groups[log.trace_id].append(log)
-            else:
-                no_trace_logs.append(log)
-        
-        # Create trace-based windows
-        for trace_id, trace_logs in trace_groups.items():
-            if len(trace_logs) <= max_window_size:
-                window = LogWindow(
-                    logs=trace_logs,
-                    trace_id=trace_id,
-                    start_time=min((log.timestamp for log in trace_logs if log.timestamp), default=None),
-                    end_time=max((log.timestamp for log in trace_logs if log.timestamp), default=None)
-                )
-                windows.append(window)
-                processed_logs.update(id(log) for log in trace_logs)
-        
-        # Create time-based windows for logs without trace_id
-        remaining_logs = [log for log in no_trace_logs if id(log) not in processed_logs]
-        remaining_logs.sort(key=lambda x: x.timestamp or datetime.min.replace(tzinfo=timezone.utc))
-        
-        i = 0
-        while i < len(remaining_logs):
-            window_logs = [remaining_logs[i]]
-            base_time = remaining_logs[i].timestamp
-            
-            j = i + 1
-            while j < len(remaining_logs) and len(window_logs) < max_window_size:
-                current_time = remaining_logs[j].timestamp
-                if base_time and current_time and (current_time - base_time).total_seconds() <= window_seconds:
-                    window_logs.append(remaining_logs[j])
-                    j += 1
-                else:
-                    break
-            
-            window = LogWindow(
+            total_logs += 1
+            if log.is_hot:
+                hot_logs.append(log)
+            elif len(fallback_logs) < fallback_limit and log.severity_number and log.severity_number >= 30:
+                fallback_logs.append(log)
+
+        return total_logs, hot_logs, fallback_logs
+
+    def create_trace_windows(self, logs: List[LogEntry], window_seconds: int = 30, max_window_size: int = 40,
+                             stats: Optional[Dict[str, Any]] = None) -> List[LogWindow]:
+        """
+        Create trace-based or time-based windows (see windowing.sweep_windows)
+
+        Every log lands in exactly one window: oversized traces are split by
+        span and time, traceless logs are swept per service. Pass a dict as
+        `stats` to receive per-strategy coverage under 'windowing'.
+        """
+        members, sizes, window_traces, coverage = sweep_windows(
+            [log.trace_id or None for log in logs],
+            [log.span_id for log in logs],
+            [log.service_name or '' for log in logs],
+            [log.timestamp_ns for log in logs],
+            window_seconds * 1_000_000_000,
+            max_window_size
+        )
+        if stats is not None:
+            stats['windowing'] = coverage
+
+        windows = []
+        offset = 0
+        for size, trace_id in zip(sizes, window_traces):
+            window_logs = [logs[i] for i in members[offset:offset + size]]
+            offset += size
+            windows.append(LogWindow(
                 logs=window_logs,
-                start_time=min((log.timestamp for log in window_logs if log.timestamp), default=None),
-                end_time=max((log.timestamp for log in window_logs if log.timestamp), default=None)
-            )
-            windows.append(window)
-            i = j if j > i + 1 else i + 1
-        
+                trace_id=trace_id,
+                start_time=self._min_time(window_logs),
+                end_time=self._max_time(window_logs)
+            ))
         return windows
 
+    def _min_time(self, logs: List[LogEntry]) -> Optional[datetime]:
+        return ns_to_datetime(min((log.timestamp_ns for log in logs if log.timestamp_ns != MISSING_TIMESTAMP),
+                                  default=MISSING_TIMESTAMP))
+
+    def _max_time(self, logs: List[LogEntry]) -> Optional[datetime]:
+        return ns_to_datetime(max((log.timestamp_ns for log in logs), default=MISSING_TIMESTAMP))
+
     def deduplicate_templates(self, window: LogWindow) -> LogWindow:
         """Apply template deduplication within window"""
         template_counts = Counter()
@@ -465,8 +811,11 @@ class EnhancedLogFilter:
         window.template_counts = dict(template_counts)
         return window
 
-    def calculate_importance_score(self, window: LogWindow) -> float:
-        """Calculate importance score for window"""
+    def calculate_importance_score(self, window: LogWindow, spikes: Optional[TemplateSpikes] = None) -> float:
+        """Calculate importance score for window
+
+        With spikes, each log in a template-frequency spike adds Spike.score
+        """
         score = 0.0
         
         for log in window.logs:
@@ -476,11 +825,15 @@ class EnhancedLogFilter:
             if log.status and log.status >= 500:
                 score += 30
 
-            if self.error_patterns.search(log.body):
+            if log.features & FEATURE_ERROR_KEYWORD:
                 score += 20
 
             template_count = window.template_counts.get(log.template_hash, 1)
             score += max(10 - template_count, 1)
+
+            spike = spikes.lookup(log) if spikes else None
+            if spike:
+                score += spike.score
         
         if window.end_time:
             hours_ago = (datetime.now(timezone.utc) - window.end_time).total_seconds() / 3600
@@ -501,6 +854,7 @@ class EnhancedLogFilter:
             'error_indicators': False,
             'keywords': [],
             'time_recent': False,
+            'time_range': None,
             'status_codes': []
         }
 
@@ -536,52 +890,49 @@ class EnhancedLogFilter:
         time_keywords = ['recent', 'latest', 'current', 'now', 'today']
         if any(keyword in query_lower for keyword in time_keywords):
             criteria['time_recent'] = True
+
+        # Explicit time range; its phrase is not used for keyword matching,
+        # except for an anchoring event word ("before the crash")
+        keyword_text = query_lower
+        time_range = parse_time_range(query)
+        if time_range:
+            criteria['time_range'] = time_range
+            anchors = [point.value for point in (time_range.start, time_range.end) if point and point.kind == 'event']
+            keyword_text = keyword_text.replace(time_range.text.lower(), ' '.join(dict.fromkeys(anchors)))
         
         # Extract other keywords
         stop_words = {'the', 'is', 'are', 'was', 'were', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'}
-        words = re.findall(r'\b\w+\b', query_lower)
+        words = re.findall(r'\b\w+\b', keyword_text)
         criteria['keywords'] = [word for word in words if word not in stop_words and len(word) > 2]
         
         return criteria
 
-    def calculate_prompt_match_score(self, window: LogWindow, criteria: Dict[str, Any]) -> float:
-        """Calculate how well window matches the query"""
-        score = 0.0
-        
+    def calculate_prompt_match_score(self, window: LogWindow, criteria: Dict[str, Any],
+                                     term_idf: Optional[Dict[str, float]] = None,
+                                     average_length: Optional[float] = None) -> float:
+        """BM25 relevance of the window's logs to the query terms, scaled by RELEVANCE_WEIGHT
+
+        term_idf gives each term's idf over the dataset (TermStats.idf(); default
+        1.0) and average_length the mean window length in tokens (default: this
+        window's own length, i.e. no length normalization)
+        """
+        terms = query_terms(criteria)
+        if not terms:
+            return 0.0
+
+        term_counts = Counter()
+        length = 0
         for log in window.logs:
-            # Service matching
-            if criteria['services']:
-                for service in criteria['services']:
-                    if service in log.service_name:
-                        score += 30.0
-                        break
-            
-            # Route matching
-            if criteria['routes'] and log.route:
-                for route in criteria['routes']:
-                    if route in log.route:
-                        score += 25.0
-                        break
-            
-            # Method matching
-            if criteria['methods'] and log.method:
-                if log.method in criteria['methods']:
-                    score += 20.0
-            
-            # Status code matching
-            if criteria['status_codes'] and log.status:
-                if log.status in criteria['status_codes']:
-                    score += 25.0
-            
-            # Keyword matching in body
-            for keyword in criteria['keywords']:
-                if keyword in log.body.lower():
-                    score += 5.0
-        
-        return score
+            length += token_count(log.body)
+            term_counts.update(log_terms(log, criteria, terms))
+        if term_idf is None:
+            term_idf = dict.fromkeys(terms, 1.0)
+        if average_length is None:
+            average_length = length
+        return RELEVANCE_WEIGHT * bm25(term_counts, term_idf, length, average_length)
 
-    def generate_window_summary(self, window: LogWindow) -> str:
-        """Generate human-readable summary for window"""
+    def generate_window_summary(self, window: LogWindow, spikes: Optional[TemplateSpikes] = None) -> str:
+        """Generate human-readable summary for window (naming its strongest template spike, if any)"""
         if not window.logs:
             return "Empty window"
 
@@ -597,7 +948,11 @@ class EnhancedLogFilter:
         if top_service[1] > 1:
             summary_parts.append(f"{top_service[0]} service")
 
-        error_count = sum(1 for log in window.logs if self.error_patterns.search(log.body))
+        spike = spikes.strongest(window.logs) if spikes else None
+        if spike:
+            summary_parts.append(spike.describe())
+
+        error_count = sum(1 for log in window.logs if log.features & FEATURE_ERROR_KEYWORD)
         if error_count > 0:
             summary_parts.append(f"{error_count} errors")
 
@@ -622,41 +977,431 @@ class EnhancedLogFilter:
         
         return "; ".join(summary_parts) if summary_parts else f"{len(window.logs)} log entries"
 
-    def filter_logs_enhanced(self, logs: List[LogEntry], query: str, max_windows: int = 20) -> List[LogWindow]:
-        """Main enhanced filtering function"""
-        logger.info(f"Starting enhanced filtering with {len(logs)} logs")
-        
-        # Hot event prefilter
-        hot_logs = self.hot_event_prefilter(logs)
+    def filter_logs_enhanced(self, logs: Iterable[LogEntry], query: str, max_windows: int = 20,
+                             stats: Optional[Dict[str, Any]] = None,
+                             term_frequencies: Optional[Dict[Any, Tuple[int, int]]] = None) -> List[LogWindow]:
+        """Main enhanced filtering function
+
+        Accepts any iterable of logs (e.g. iter_logs()) so large files are never
+        materialized as a full list. A time range in the query is resolved by
+        one extra pass over the logs first: lists, stores and other re-iterable
+        inputs are simply read twice, one-shot iterators are spooled into a
+        compact ColumnarLogStore. Pass a dict as `stats` to receive counts
+        and per-stage seconds (under 'timings'). term_frequencies is a TermStats
+        cache kept across queries over the same logs.
+        """
+        logger.info("Starting enhanced filtering")
+        timings = stats.setdefault('timings', {}) if stats is not None else None
+
+        query_criteria = self.parse_query_advanced(query)
+        logger.debug(f"Query criteria: {query_criteria}")
+        loaded_logs = None
+        time_bounds = None
+        if query_criteria['time_range']:
+            with timed(timings, 'time_range'):
+                if iter(logs) is logs:
+                    from columnar_store import ColumnarLogStore
+                    logs = ColumnarLogStore.from_entries(logs)
+                time_bounds, loaded_logs = self._resolve_logs_time_range(logs, query_criteria['time_range'])
+
+        # Query term document frequencies over every loaded log, for BM25 idf
+        term_stats = TermStats(query_criteria, term_frequencies)
+        if term_stats.terms:
+            logs = term_stats.count(logs)
+        # Per-template bucket counts over every loaded log, for spike detection
+        spike_counter = SpikeCounter()
+        if np is not None:
+            logs = spike_counter.count(logs)
+        if time_bounds is not None:
+            logs = (log for log in logs if time_bounds[0] <= log.timestamp_ns <= time_bounds[1])
+        
+        # Hot event prefilter (single pass, also collects the severity fallback)
+        with timed(timings, 'prefilter'):
+            total_logs, hot_logs, fallback_logs = self._partition_hot_events(logs)
+        if time_bounds is not None:
+            self._record_time_range(query_criteria['time_range'], time_bounds, total_logs, stats)
+        if loaded_logs is not None:
+            total_logs = loaded_logs
+        logger.info(f"Hot event prefilter: {total_logs} → {len(hot_logs)} logs")
         if not hot_logs:
             logger.info("No hot events found, keeping top severity logs")
             # Fallback: keep logs with some severity
-            hot_logs = [log for log in logs if log.severity_number and log.severity_number >= 30][:200]
+            hot_logs = fallback_logs
+
+        if stats is not None:
+            stats['total_logs'] = total_logs
+            stats['hot_logs'] = len(hot_logs)
+
+        # Logs of spiking templates join the candidates even when they are not hot
+        with timed(timings, 'prefilter'):
+            spikes = spike_counter.detect()
+            candidates = self._with_spike_samples(hot_logs, spikes, spike_counter.hot_positions, time_bounds)
+        logger.info(f"Template spikes: {len(spikes)} buckets, {len(candidates) - len(hot_logs)} logs added")
+        if stats is not None:
+            stats['template_spikes'] = len(spikes)
         
         # Create trace/time windows
-        windows = self.create_trace_windows(hot_logs)
+        with timed(timings, 'windowing'):
+            windows = self.create_trace_windows(candidates, stats=stats)
         logger.info(f"Created {len(windows)} windows")
         
         # Template deduplication
-        for window in windows:
-            self.deduplicate_templates(window)
+        with timed(timings, 'dedup'):
+            for window in windows:
+                self.deduplicate_templates(window)
         
         # Calculate scores
-        query_criteria = self.parse_query_advanced(query)
-        logger.debug(f"Query criteria: {query_criteria}")
-        
-        for window in windows:
-            window.importance_score = self.calculate_importance_score(window)
-            window.prompt_match_score = self.calculate_prompt_match_score(window, query_criteria)
-            window.summary = self.generate_window_summary(window)
+        with timed(timings, 'scoring'):
+            term_idf = term_stats.idf()
+            lengths = [sum(token_count(log.body) for log in window.logs) for window in windows]
+            average_length = sum(lengths) / len(lengths) if lengths else 0.0
+            for window in windows:
+                window.importance_score = self.calculate_importance_score(window, spikes)
+                window.prompt_match_score = self.calculate_prompt_match_score(
+                    window, query_criteria, term_idf, average_length
+                )
+        with timed(timings, 'summaries'):
+            for window in windows:
+                window.summary = self.generate_window_summary(window, spikes)
         
         # Sort and limit
-        windows.sort(key=lambda w: w.importance_score + w.prompt_match_score, reverse=True)
+        with timed(timings, 'scoring'):
+            windows.sort(key=lambda w: w.importance_score + w.prompt_match_score, reverse=True)
         final_windows = windows[:max_windows]
         
         logger.info(f"Returning {len(final_windows)} top-scored windows")
         return final_windows
 
+    def _with_spike_samples(self, logs: List[LogEntry], spikes: TemplateSpikes, positions: Dict[int, int],
+                            time_bounds: Optional[Tuple[int, int]] = None) -> List[LogEntry]:
+        """
+        logs plus the sampled logs of spiking buckets, merged in stream order
+        when every log's position is known (positions holds the hot logs')
+
+        time_bounds restricts the samples to the query's (inclusive) time range
+        """
+        present = {id(log) for log in logs}
+        extra = [
+            (position, log) for position, log in spikes.sample_logs
+            if id(log) not in present
+            and (time_bounds is None or time_bounds[0] <= log.timestamp_ns <= time_bounds[1])
+        ]
+        if not extra:
+            return logs
+        if all(id(log) in positions for log in logs):
+            merged = [(positions[id(log)], log) for log in logs] + extra
+            merged.sort(key=lambda item: item[0])
+            return [log for _, log in merged]
+        return logs + [log for _, log in extra]
+
+    def filter_store(self, store: 'ColumnarLogStore', query: str, max_windows: int = 20,
+                     stats: Optional[Dict[str, Any]] = None) -> List[LogWindow]:
+        """Columnar variant of filter_logs_enhanced
+
+        Prefilter, windowing, deduplication and scoring run as vectorized NumPy
+        operations over the store; LogEntry objects are only materialized for the
+        returned windows. Falls back to the object pipeline without NumPy.
+        """
+        if not store.vectorized:
+            logger.info("NumPy unavailable, filtering columnar store with the object pipeline")
+            return self.filter_logs_enhanced(
+                store, query, max_windows, stats, term_frequencies=store.term_frequencies
+            )
+
+        logger.info(f"Starting columnar filtering with {len(store)} logs")
+        timings = stats.setdefault('timings', {}) if stats is not None else None
+
+        query_criteria = self.parse_query_advanced(query)
+        logger.debug(f"Query criteria: {query_criteria}")
+
+        # A time range in the query narrows everything below to a binary-searched slice
+        time_rows = None
+        if query_criteria['time_range']:
+            with timed(timings, 'time_range'):
+                time_rows = self._store_rows_in_time_range(store, query_criteria['time_range'], stats)
+
+        with timed(timings, 'prefilter'):
+            spikes = store.template_spikes()
+            hot_rows, matches, query_rows, candidate_rows = self._store_candidates(store, query_criteria, time_rows, spikes)
+
+        if stats is not None:
+            stats['total_logs'] = len(store)
+            stats['hot_logs'] = len(hot_rows)
+            stats['query_rows'] = len(query_rows)
+            stats['template_spikes'] = len(spikes)
+
+        # Create trace/time windows
+        with timed(timings, 'windowing'):
+            members, offsets, window_traces = self.create_trace_windows_columnar(store, candidate_rows, stats=stats)
+        logger.info(f"Created {len(offsets) - 1} windows")
+        if len(offsets) <= 1:
+            return []
+
+        # Template deduplication and scoring
+        scored = self._score_windows_columnar(store, members, offsets, query_criteria, matches, timings, spikes)
+        unique_rows, unique_offsets, template_counts, importance, prompt_match, start_ns, end_ns = scored
+
+        # Sort and limit (stable, so ties keep window creation order like list.sort)
+        with timed(timings, 'scoring'):
+            order = np.argsort(-(importance + prompt_match), kind='stable')[:max_windows]
+
+        final_windows = []
+        with timed(timings, 'summaries'):
+            for w in order.tolist():
+                start, end = unique_offsets[w], unique_offsets[w + 1]
+                logs = [store.entry(row) for row in unique_rows[start:end].tolist()]
+                trace_id = int(window_traces[w])
+                window = LogWindow(
+                    logs=logs,
+                    trace_id=store.traces.decode(trace_id),
+                    start_time=self._ns_to_datetime(start_ns[w]),
+                    end_time=self._ns_to_datetime(end_ns[w]),
+                    importance_score=float(importance[w]),
+                    prompt_match_score=float(prompt_match[w]),
+                    template_counts={
+                        log.template_hash: int(count)
+                        for log, count in zip(logs, template_counts[start:end].tolist())
+                    }
+                )
+                window.summary = self.generate_window_summary(window, spikes)
+                final_windows.append(window)
+
+        logger.info(f"Returning {len(final_windows)} top-scored windows")
+        return final_windows
+
+    def _store_candidates(self, store: 'ColumnarLogStore', query_criteria: Dict[str, Any],
+                          time_rows: Optional['np.ndarray'], spikes: Optional[TemplateSpikes] = None
+                          ) -> Tuple['np.ndarray', Dict[str, 'np.ndarray'], 'np.ndarray', 'np.ndarray']:
+        """Hot rows, the index's per-criterion matches, query-selected rows and the union of those
+        with the spikes' sample rows (the windowing candidates)"""
+        # Hot event prefilter
+        if time_rows is None:
+            hot_rows = np.flatnonzero(store.columns['features'] & HOT_FEATURES)
+        else:
+            hot_rows = time_rows[(store.columns['features'][time_rows] & HOT_FEATURES) != 0]
+        logger.info(f"Hot event prefilter: {len(store) if time_rows is None else len(time_rows)} → {len(hot_rows)} logs")
+        if not len(hot_rows):
+            logger.info("No hot events found, keeping top severity logs")
+            if time_rows is None:
+                hot_rows = np.flatnonzero(store.columns['severity'] >= 30)[:200]
+            else:
+                hot_rows = time_rows[store.columns['severity'][time_rows] >= 30][:200]
+
+        # Evaluate the query against the inverted index
+        matches = store.index.match_rows(store, query_criteria)
+
+        # Logs selected by the query's specific criteria join the candidates even
+        # when they are not hot (e.g. 4xx responses on the route being asked about)
+        query_rows = self._query_selected_rows(store, matches, time_rows)
+        candidate_rows = np.union1d(hot_rows, query_rows) if len(query_rows) else hot_rows
+
+        # Logs of spiking templates join too, hot or not
+        if spikes is not None and spikes.sample_rows is not None and len(spikes.sample_rows):
+            spike_rows = spikes.sample_rows
+            if time_rows is not None:
+                spike_rows = np.intersect1d(spike_rows, time_rows, assume_unique=True)
+            candidate_rows = np.union1d(candidate_rows, spike_rows)
+        logger.info(f"Query index: {len(query_rows)} rows selected, {len(candidate_rows)} candidates")
+        return hot_rows, matches, query_rows, candidate_rows
+
+    def _query_selected_rows(self, store: 'ColumnarLogStore', matches: Dict[str, 'np.ndarray'],
+                             time_rows: Optional['np.ndarray'] = None, max_rows: int = 1000) -> 'np.ndarray':
+        """Rows matching every specific criterion (route, method, status) by posting-list intersection
+
+        Service words alone are too broad to select logs, so they only narrow a
+        selection, as does the query's time range. Keeps the max_rows most severe rows.
+        """
+        selectors = [matches[name] for name in ('routes', 'methods', 'status_codes') if name in matches]
+        if not selectors:
+            return np.zeros(0, dtype=np.int64)
+        if 'services' in matches:
+            selectors.append(matches['services'])
+        if time_rows is not None:
+            selectors.append(time_rows)
+
+        rows = store.index.intersect(selectors)
+        if len(rows) > max_rows:
+            order = np.argsort(-store.columns['severity'][rows].astype(np.int64), kind='stable')[:max_rows]
+            rows = np.sort(rows[order])
+        return rows
+
+    def create_trace_windows_columnar(self, store: 'ColumnarLogStore', rows: 'np.ndarray', window_seconds: int = 30,
+                                      max_window_size: int = 40,
+                                      stats: Optional[Dict[str, Any]] = None) -> Tuple['np.ndarray', 'np.ndarray', 'np.ndarray']:
+        """Vectorized create_trace_windows over store rows
+
+        Returns (members, offsets, window_traces): window w holds store rows
+        members[offsets[w]:offsets[w + 1]], window_traces[w] is its trace id or -1.
+        """
+        columns = store.columns
+        # Service ids ranked by name so traceless windows order like the object pipeline
+        names = store.services.values
+        name_rank = np.empty(len(names) + 1, dtype=np.int64)
+        name_rank[0] = -1
+        name_rank[1 + np.asarray(sorted(range(len(names)), key=names.__getitem__), dtype=np.int64)] = np.arange(len(names))
+
+        positions, sizes, window_traces, coverage = sweep_windows_columnar(
+            columns['trace_id'][rows],
+            columns['span_id'][rows],
+            name_rank[columns['service_id'][rows].astype(np.int64) + 1],
+            columns['timestamp_ns'][rows],
+            window_seconds * 1_000_000_000,
+            max_window_size
+        )
+        if stats is not None:
+            stats['windowing'] = coverage
+
+        offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        return rows[positions], offsets, window_traces
+
+    def _score_windows_columnar(self, store: 'ColumnarLogStore', members: 'np.ndarray', offsets: 'np.ndarray',
+                                criteria: Dict[str, Any],
+                                matches: Optional[Dict[str, 'np.ndarray']] = None,
+                                timings: Optional[Dict[str, float]] = None,
+                                spikes: Optional[TemplateSpikes] = None) -> Tuple['np.ndarray', ...]:
+        """Vectorized deduplicate_templates + calculate_importance_score + calculate_prompt_match_score
+
+        matches are the index's per-criterion row sets (store.index.match_rows);
+        timings receives 'dedup' and 'scoring' seconds; spikes come from store.template_spikes()
+        """
+        if matches is None:
+            matches = store.index.match_rows(store, criteria)
+        with timed(timings, 'dedup'):
+            columns = store.columns
+            num_windows = len(offsets) - 1
+            sizes = np.diff(offsets)
+            window_of_member = np.repeat(np.arange(num_windows), sizes)
+
+            # Window time bounds come from all member logs, before deduplication
+            member_ts = columns['timestamp_ns'][members]
+            starts = offsets[:-1]
+            start_ns = np.minimum.reduceat(np.where(member_ts == MISSING_TIMESTAMP, MAX_TIMESTAMP, member_ts), starts)
+            end_ns = np.maximum.reduceat(member_ts, starts)
+
+            # Template deduplication: keep the first log per (window, template)
+            template_ids = columns['template_id'][members].astype(np.int64) + 1
+            keys = window_of_member.astype(np.int64) * (len(store.templates) + 1) + template_ids
+            _, first_pos, template_counts = np.unique(keys, return_index=True, return_counts=True)
+            first_order = np.argsort(first_pos)
+            unique_pos = first_pos[first_order]
+            template_counts = template_counts[first_order]
+            unique_rows = members[unique_pos]
+            unique_window = window_of_member[unique_pos]
+            unique_offsets = np.concatenate([[0], np.cumsum(np.bincount(unique_window, minlength=num_windows))])
+
+        with timed(timings, 'scoring'):
+            # Error keywords come from the feature bitmask
+            error_flags = (columns['features'][unique_rows] & FEATURE_ERROR_KEYWORD) != 0
+
+            # Importance score
+            severity = columns['severity'][unique_rows].astype(np.float64)
+            status = columns['status'][unique_rows]
+            row_importance = (
+                np.where(severity > 0, severity * 0.5, 0.0)
+                + np.where(status >= 500, 30.0, 0.0)
+                + np.where(error_flags, 20.0, 0.0)
+                + np.maximum(10 - template_counts, 1)
+            )
+            if spikes:
+                row_importance = row_importance + spikes.row_scores(store, unique_rows)
+            importance = np.bincount(unique_window, weights=row_importance, minlength=num_windows)
+
+            has_end = end_ns != MISSING_TIMESTAMP
+            hours_ago = (time.time_ns() - end_ns.astype(np.float64)) / 3.6e12
+            recent = has_end & (hours_ago < 24)
+            importance = importance + np.where(recent, np.maximum(10 - hours_ago, 0), 0.0)
+
+            # Prompt match score: BM25 over sparse (window, term) counts; each term's
+            # posting list spans the whole store, so its length is the term's document frequency
+            term_rows = list(matches.values())
+            prompt_match = np.zeros(num_windows, dtype=np.float64)
+            if term_rows:
+                hit_windows = [unique_window[np.isin(unique_rows, rows, assume_unique=True)] for rows in term_rows]
+                keys = np.concatenate([
+                    hits * len(term_rows) + term for term, hits in enumerate(hit_windows)
+                ]).astype(np.int64)
+                keys, counts = np.unique(keys, return_counts=True)
+                term_idf = idf_array(len(store), [len(rows) for rows in term_rows])
+                lengths = np.bincount(unique_window, weights=columns['token_count'][unique_rows], minlength=num_windows)
+                prompt_match = RELEVANCE_WEIGHT * bm25_sparse(
+                    keys // len(term_rows), keys % len(term_rows), counts, term_idf, lengths
+                )
+
+        return unique_rows, unique_offsets, template_counts, importance, prompt_match, start_ns, end_ns
+
+    def _store_rows_in_time_range(self, store: 'ColumnarLogStore', time_range: TimeRangeQuery,
+                                  stats: Optional[Dict[str, Any]] = None) -> Optional['np.ndarray']:
+        """Rows inside the query's time range, or None if it cannot be resolved for this store"""
+        bounds = store.time_bounds()
+        if bounds is None:
+            return None
+
+        def event_time(word: str) -> Optional[int]:
+            timestamps = store.columns['timestamp_ns'][store.index.keyword_rows(word, store.bodies)]
+            timestamps = timestamps[timestamps != MISSING_TIMESTAMP]
+            return int(timestamps.min()) if len(timestamps) else None
+
+        resolved = resolve_time_range(time_range, bounds[0], bounds[1], event_time)
+        if resolved is None:
+            logger.info(f"Ignoring time range '{time_range.text}': anchor not found in logs")
+            return None
+
+        rows = store.rows_between(*resolved)
+        self._record_time_range(time_range, resolved, len(rows), stats)
+        return rows
+
+    def _resolve_logs_time_range(self, logs: Iterable[LogEntry], time_range: TimeRangeQuery
+                                 ) -> Tuple[Optional[Tuple[int, int]], int]:
+        """
+        Object-pipeline counterpart of _store_rows_in_time_range: one pass over
+        logs for their time bounds and the first mention of each anchor word
+
+        Returns ((start_ns, end_ns) or None when the range does not apply, logs read)
+        """
+        words = [point.value for point in (time_range.start, time_range.end)
+                 if point is not None and point.kind == 'event']
+        first_mention: Dict[str, int] = {}
+        low, high = MAX_TIMESTAMP, MISSING_TIMESTAMP
+        count = 0
+        for log in logs:
+            count += 1
+            timestamp = log.timestamp_ns
+            if timestamp == MISSING_TIMESTAMP:
+                continue
+            low, high = min(low, timestamp), max(high, timestamp)
+            if words:
+                body = log.body.lower()
+                for word in words:
+                    if timestamp < first_mention.get(word, MAX_TIMESTAMP) and keyword_in_body(word, body):
+                        first_mention[word] = timestamp
+        if high == MISSING_TIMESTAMP:
+            return None, count
+
+        resolved = resolve_time_range(time_range, low, high, first_mention.get)
+        if resolved is None:
+            logger.info(f"Ignoring time range '{time_range.text}': anchor not found in logs")
+        return resolved, count
+
+    def _record_time_range(self, time_range: TimeRangeQuery, resolved: Tuple[int, int], count: int,
+                           stats: Optional[Dict[str, Any]]):
+        logger.info(
+            f"Time range '{time_range.text}': {ns_to_datetime(resolved[0])} to {ns_to_datetime(resolved[1])}, {count} logs"
+        )
+        if stats is not None:
+            stats['time_range'] = {
+                'text': time_range.text,
+                'start': ns_to_datetime(resolved[0]).isoformat(),
+                'end': ns_to_datetime(resolved[1]).isoformat(),
+                'logs': count
+            }
+
+    def _ns_to_datetime(self, value: int) -> Optional[datetime]:
+        """Epoch nanoseconds to datetime; int64 min/max sentinels mean missing"""
+        value = int(value)
+        if value == MAX_TIMESTAMP:
+            return None
+        return ns_to_datetime(value)
+
 
 def main():
     """Test the enhanced filtering system"""
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Live NDJSON ingestion
+Reads a continuous NDJSON feed (e.g. a log forwarder posting a chunked body) as
+a streaming pipeline: the network reader splits chunks into line batches and
+hands them through a bounded queue to a worker that parses, normalizes and
+prefilters them off the event loop. When the worker falls behind the queue
+fills and the reader stops pulling from the socket, so backpressure reaches the
+sender instead of memory. Hot logs land in rolling windows, so the top windows
+are scored and ready before anyone asks a question.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Executor
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+
+from enhanced_log_filter import EnhancedLogFilter, LogWindow
+from window_accumulator import WindowAccumulator
+
+logger = logging.getLogger(__name__)
+
+# Windows whose last log is older than this (log time, relative to the newest log) are evicted
+LIVE_RETENTION_SECONDS = float(os.getenv('LIVE_RETENTION_SECONDS', '900'))
+LIVE_MAX_WINDOWS = int(os.getenv('LIVE_MAX_WINDOWS', '2000'))
+# Lines per batch handed to the worker, and batches buffered before the reader waits
+LIVE_BATCH_LINES = int(os.getenv('LIVE_BATCH_LINES', '500'))
+LIVE_QUEUE_BATCHES = int(os.getenv('LIVE_QUEUE_BATCHES', '4'))
+# A partial line longer than this is dropped rather than buffered until its newline
+LIVE_MAX_LINE_BYTES = int(os.getenv('LIVE_MAX_LINE_BYTES', str(1 << 20)))
+
+
+class LiveStream:
+    """One live feed: its rolling windows plus ingestion counters"""
+
+    def __init__(self, stream_id: str, log_filter: EnhancedLogFilter,
+                 retention_seconds: float = LIVE_RETENTION_SECONDS, max_windows: int = LIVE_MAX_WINDOWS,
+                 batch_lines: int = LIVE_BATCH_LINES, queue_batches: int = LIVE_QUEUE_BATCHES,
+                 max_line_bytes: int = LIVE_MAX_LINE_BYTES):
+        self.stream_id = stream_id
+        self.filter = log_filter
+        self.windows = WindowAccumulator(log_filter, retention_seconds=retention_seconds, max_windows=max_windows)
+        self.batch_lines = batch_lines
+        self.queue_batches = queue_batches
+        self.max_line_bytes = max_line_bytes
+
+        self.counters = {
+            'bytes': 0,
+            'lines': 0,
+            'malformed_lines': 0,
+            'oversized_lines': 0,
+            'backpressure_waits': 0
+        }
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self._lock = threading.Lock()
+
+    async def ingest(self, chunks: AsyncIterator[bytes], executor: Executor) -> Dict[str, int]:
+        """
+        Consume an NDJSON byte stream until it ends; returns this call's line counts
+
+        Batches are normalized in executor, one at a time per call
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_batches)
+        totals = {'lines': 0, 'malformed_lines': 0, 'hot_logs': 0}
+
+        async def consume():
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    return
+                try:
+                    lines, malformed, hot = await loop.run_in_executor(executor, self._process, batch)
+                except Exception:
+                    logger.exception(f"Dropped a batch of {len(batch)} lines on stream {self.stream_id}")
+                    continue
+                totals['lines'] += lines
+                totals['malformed_lines'] += malformed
+                totals['hot_logs'] += hot
+
+        consumer = asyncio.create_task(consume())
+        try:
+            async for batch in self._batches(chunks):
+                if queue.full():
+                    self.counters['backpressure_waits'] += 1
+                await queue.put(batch)
+        finally:
+            # Whatever was read is still processed, also when the sender disconnects
+            await queue.put(None)
+            await consumer
+
+        logger.info(f"Stream {self.stream_id}: ingested {totals['lines']} lines ({totals['hot_logs']} hot)")
+        return totals
+
+    def top(self, k: int) -> List[LogWindow]:
+        return self.windows.top(k)
+
+    def nbytes(self) -> int:
+        return self.windows.nbytes()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            **counters,
+            **self.windows.stats(),
+            'created_at': self.created_at,
+            'updated_at': self.updated_at
+        }
+
+    async def _batches(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[List[bytes]]:
+        """Complete lines of the byte stream, at most batch_lines per batch and flushed at every chunk"""
+        partial = b''
+        skipping = False
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            self.counters['bytes'] += len(chunk)
+            data = partial + chunk
+            if skipping:
+                newline = data.find(b'\n')
+                if newline < 0:
+                    partial = b''
+                    continue
+                data = data[newline + 1:]
+                skipping = False
+
+            lines = data.split(b'\n')
+            partial = lines.pop()
+            if len(partial) > self.max_line_bytes:
+                self.counters['oversized_lines'] += 1
+                partial = b''
+                skipping = True
+
+            for start in range(0, len(lines), self.batch_lines):
+                yield lines[start:start + self.batch_lines]
+
+        if partial.strip() and not skipping:
+            yield [partial]
+
+    def _process(self, batch: List[bytes]) -> Tuple[int, int, int]:
+        """Parse, normalize and window one batch (runs in the executor); returns (lines, malformed, hot)"""
+        records = []
+        malformed = 0
+        for line in batch:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                malformed += 1
+                continue
+            if isinstance(record, dict):
+                records.append(record)
+            else:
+                malformed += 1
+
+        # Normalize before taking the window lock so readers of top() are not held up
+        entries = [self.filter.normalize_log_entry(record) for record in records]
+        hot = self.windows.add(entries)
+
+        lines = len(records) + malformed
+        with self._lock:
+            self.counters['lines'] += lines
+            self.counters['malformed_lines'] += malformed
+            self.updated_at = time.time()
+        return lines, malformed, hot
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+LLM response cache
+Two-tier (in-memory LRU + SQLite) cache keyed on a fingerprint of the model,
+request parameters and the fully built message list
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    def __init__(self, db_path: Optional[str] = None, memory_entries: int = 256,
+                 ttl_seconds: Optional[float] = None, max_disk_bytes: Optional[int] = None,
+                 touch_seconds: Optional[float] = None, size_sync_seconds: float = 60.0):
+        """
+        Args:
+            db_path: SQLite file (default: LLM_CACHE_PATH env var, else a temp dir file)
+            memory_entries: Entries kept in the in-memory LRU tier
+            ttl_seconds: Entry lifetime (default: LLM_CACHE_TTL env var, else 24h)
+            max_disk_bytes: SQLite tier budget for cached payloads (default: LLM_CACHE_MAX_BYTES env var, else 100 MB)
+            touch_seconds: A disk hit only rewrites the row's access time if it is older than this
+                (default: LLM_CACHE_TOUCH_SECONDS env var, else 5 minutes)
+            size_sync_seconds: The running payload total is re-read from SQLite at least this often,
+                since other processes may share the file
+        """
+        self.db_path = db_path or os.getenv('LLM_CACHE_PATH') or str(Path(tempfile.gettempdir()) / 'llm_cache.sqlite3')
+        self.memory_entries = memory_entries
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv('LLM_CACHE_TTL', 24 * 3600))
+        self.max_disk_bytes = max_disk_bytes if max_disk_bytes is not None else int(os.getenv('LLM_CACHE_MAX_BYTES', 100 << 20))
+        self.touch_seconds = touch_seconds if touch_seconds is not None else float(os.getenv('LLM_CACHE_TOUCH_SECONDS', 300))
+        self.size_sync_seconds = size_sync_seconds
+
+        # key -> (stored_at, value)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created_at)")
+        self._db.commit()
+        self._sync_disk_bytes(time.time())
+
+    @staticmethod
+    def make_key(model: str, params: Dict[str, Any], messages: List[Dict[str, str]]) -> str:
+        """Fingerprint of everything that determines the completion"""
+        payload = json.dumps({'model': model, 'params': params, 'messages': messages}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                stored_at, value = item
+                if now - stored_at <= self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.counters['memory_hits'] += 1
+                    return value
+                del self._memory[key]
+
+            row = self._db.execute(
+                "SELECT value, created_at, accessed_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[1] <= self.ttl_seconds:
+                # LRU order only needs to be roughly right, so most hits skip the write
+                if now - row[2] > self.touch_seconds:
+                    self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                value = json.loads(row[0])
+                self._remember(key, row[1], value)
+                self.counters['disk_hits'] += 1
+                return value
+
+            self.counters['misses'] += 1
+            return None
+
+    def put(self, key: str, value: Dict[str, Any]):
+        now = time.time()
+        encoded = json.dumps(value)
+        with self._lock:
+            self._remember(key, now, value)
+            replaced = self._db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, encoded, len(encoded), now, now)
+            )
+            self._disk_bytes += len(encoded) - (replaced[0] if replaced else 0)
+            self._evict_disk(now)
+            self._db.commit()
+            self.counters['stores'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            lookups = self.counters['memory_hits'] + self.counters['disk_hits'] + self.counters['misses']
+            hits = lookups - self.counters['misses']
+            return {
+                **self.counters,
+                'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'disk_entries': entries,
+                'disk_bytes': size
+            }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _remember(self, key: str, stored_at: float, value: Dict[str, Any]):
+        self._memory[key] = (stored_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _sync_disk_bytes(self, now: float):
+        self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self._disk_bytes_synced_at = now
+
+    def _evict_disk(self, now: float):
+        """Drop expired rows, then least recently used rows until under the size budget"""
+        cutoff = now - self.ttl_seconds
+        expired, expired_bytes = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses WHERE created_at < ?", (cutoff,)
+        ).fetchone()
+        if expired:
+            self._db.execute("DELETE FROM responses WHERE created_at < ?", (cutoff,))
+            self._disk_bytes -= expired_bytes
+        evicted = expired
+
+        # The running total is exact for this process; recount when it would trigger eviction or is stale
+        if self._disk_bytes > self.max_disk_bytes or now - self._disk_bytes_synced_at > self.size_sync_seconds:
+            self._sync_disk_bytes(now)
+        total = self._disk_bytes
+        if total > self.max_disk_bytes:
+            for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY accessed_at").fetchall():
+                if total <= self.max_disk_bytes:
+                    break
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._memory.pop(key, None)
+                total -= size
+                evicted += 1
+            self._disk_bytes = total
+
+        if evicted:
+            self.counters['evictions'] += evicted
+            logger.info(f"LLM cache evicted {evicted} entries ({total} bytes remain)")
@@ -4,21 +4,42 @@ LLM Service for log analysis
 Handles OpenAI API calls with conversation context
 """
 
+import asyncio
 import logging
 import json
 import os
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
+import time
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+import httpx
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
+from llm_cache import LLMResponseCache
+from context_packer import ContextPacker
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
 class LLMService:
-    def __init__(self):
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    def __init__(self, cache: Optional[LLMResponseCache] = None):
+        # One pooled async HTTP client shared by all requests, so concurrent
+        # analyses overlap their API waits instead of blocking the event loop
+        max_connections = int(os.getenv('LLM_MAX_CONNECTIONS', '20'))
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(120.0, connect=10.0)
+        )
+        self.client = AsyncOpenAI(api_key=os.getenv('OPENAI_API_KEY'), http_client=self.http_client)
         self.model = "gpt-4o-mini"
+        self.temperature = 0.1
+        
+        # Identical prompts (same model, params and messages) are answered from cache
+        self.cache = cache or LLMResponseCache()
+        
+        # Log context is packed into a token budget rather than fixed log counts
+        self.context_packer = ContextPacker(self.model)
+        self.context_token_budget = int(os.getenv('LLM_CONTEXT_TOKENS', '4000'))
         
         # System prompt
         self.system_prompt = """You are an expert log analysis assistant. You help developers understand and debug issues in their application logs.
@@ -42,7 +63,18 @@ TONE:
 - Focus on actionable insights over lengthy explanations
 - Prioritize what developers need to know to fix issues quickly"""
 
-    def analyze_logs(self, 
+        # Map stage of map-reduce analysis: structured findings per batch of windows
+        self.map_prompt = """You extract evidence from a batch of filtered log windows for a larger incident analysis.
+
+Respond with JSON only, in this shape:
+{"findings": [{"severity": "critical|warning|info", "service": "<service>", "issue": "<one sentence>", "evidence": ["<trace ids, status codes, key messages>"], "windows": [<window numbers>]}]}
+
+Only report what the logs show, most relevant to the user's query first. Return {"findings": []} if nothing is relevant."""
+        self.map_batch_size = int(os.getenv('MAP_BATCH_WINDOWS', '5'))
+        self.map_concurrency = int(os.getenv('MAP_CONCURRENCY', '4'))
+        self.map_context_token_budget = int(os.getenv('MAP_CONTEXT_TOKENS', '2500'))
+
+    async def analyze_logs(self, 
                     filtered_windows: List[Dict[str, Any]], 
                     user_query: str, 
                     conversation_history: List[Dict[str, str]] = None,
@@ -60,59 +92,25 @@ TONE:
             Dict with LLM response and metadata
         """
         try:
-            log_context = self._prepare_log_context(filtered_windows, processing_summary)
-
-            #cache to store messages
-            messages = [{"role": "system", "content": self.system_prompt}]
-
-            if conversation_history:
-                messages.extend(conversation_history)
-
-            user_message = f"""**User Query:** {user_query}
-
-**Filtered Log Data:**
-{log_context}
-
-Please analyze these logs and help me understand what's happening with my system."""
-
-            messages.append({"role": "user", "content": user_message})
+            start = time.perf_counter()
+            messages, context_budget = self._analysis_messages(filtered_windows, user_query, conversation_history, processing_summary)
+            context_seconds = time.perf_counter() - start
             
             logger.info(f"Sending request to OpenAI with {len(messages)} messages")
             
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_tokens=1500,
-                temperature=0.1  
-            )
-            
-            llm_response = response.choices[0].message.content
-            
-            # Calculate cost (approximate)
-            input_tokens = response.usage.prompt_tokens
-            output_tokens = response.usage.completion_tokens
-            total_tokens = response.usage.total_tokens
+            result = await self._complete(messages, max_tokens=1500)
+            result["context_budget"] = context_budget
+            result["timings"]["context_build"] = context_seconds
             
-            input_cost = (input_tokens / 1000000) * 0.15  # $0.15 per 1M input tokens
-            output_cost = (output_tokens / 1000000) * 0.60  # $0.60 per 1M output tokens
-            total_cost = input_cost + output_cost
+            logger.info(f"OpenAI response received. Tokens: {result['tokens_used']}, Cost: ${result['estimated_cost']:.4f}")
             
-            logger.info(f"OpenAI response received. Tokens: {total_tokens}, Cost: ${total_cost:.4f}")
-            
-            return {
-                "response": llm_response,
-                "tokens_used": total_tokens,
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens,
-                "estimated_cost": total_cost,
-                "model": self.model
-            }
+            return result
             
         except Exception as e:
             logger.error(f"Error calling OpenAI API: {str(e)}")
             raise Exception(f"LLM analysis failed: {str(e)}")
 
-    def chat_about_logs(self, 
+    async def chat_about_logs(self, 
                        user_query: str, 
                        conversation_history: List[Dict[str, str]] = None,
                        initial_analysis: str = "",
@@ -122,107 +120,405 @@ Please analyze these logs and help me understand what's happening with my system
         Uses cached analysis to save costs
         """
         try:
-            # Build conversation messages with cached context
-            messages = [{"role": "system", "content": self.system_prompt}]
-            
-            # Add the initial analysis as context
-            context_message = f"""**Previous Log Analysis:**
-{initial_analysis}
-
-**Log Summary:** {log_summary}
-
-You have already analyzed the user's logs. Use this previous analysis to answer follow-up questions. Do not re-analyze the logs - just reference your previous findings and provide helpful insights based on the user's new question."""
-
-            messages.append({"role": "assistant", "content": context_message})
-            
-            # Add conversation history if available
-            if conversation_history:
-                messages.extend(conversation_history)
-            
-            # Add the current query
-            messages.append({"role": "user", "content": user_query})
+            messages = self._chat_messages(user_query, conversation_history, initial_analysis, log_summary)
             
             logger.info(f"Sending follow-up chat request to OpenAI with {len(messages)} messages")
             
             # Call OpenAI API
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                max_tokens=800,  # Smaller for follow-up questions
-                temperature=0.1
-            )
-            
-            # Extract response
-            llm_response = response.choices[0].message.content
+            result = await self._complete(messages, max_tokens=800)  # Smaller for follow-up questions
             
-            # Calculate cost
-            input_tokens = response.usage.prompt_tokens
-            output_tokens = response.usage.completion_tokens
-            total_tokens = response.usage.total_tokens
+            logger.info(f"Follow-up response received. Tokens: {result['tokens_used']}, Cost: ${result['estimated_cost']:.4f}")
             
-            # GPT-4o mini pricing
-            input_cost = (input_tokens / 1000000) * 0.15
-            output_cost = (output_tokens / 1000000) * 0.60
-            total_cost = input_cost + output_cost
-            
-            logger.info(f"Follow-up response received. Tokens: {total_tokens}, Cost: ${total_cost:.4f}")
-            
-            return {
-                "response": llm_response,
-                "tokens_used": total_tokens,
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens,
-                "estimated_cost": total_cost,
-                "model": self.model
-            }
+            return result
             
         except Exception as e:
             logger.error(f"Error in follow-up chat: {str(e)}")
             raise Exception(f"Follow-up chat failed: {str(e)}")
 
-    def _prepare_log_context(self, filtered_windows: List[Dict[str, Any]], processing_summary: str) -> str:
-        """Prepare log data in a format optimized for LLM analysis"""
+    async def stream_analyze_logs(self,
+                                  filtered_windows: List[Dict[str, Any]],
+                                  user_query: str,
+                                  conversation_history: List[Dict[str, str]] = None,
+                                  processing_summary: str = "") -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of analyze_logs
+        Yields {'type': 'delta', 'content': ...} events, then {'type': 'result', ...}
+        with the same fields analyze_logs returns
+        """
+        start = time.perf_counter()
+        messages, context_budget = self._analysis_messages(filtered_windows, user_query, conversation_history, processing_summary)
+        context_seconds = time.perf_counter() - start
+        logger.info(f"Streaming request to OpenAI with {len(messages)} messages")
+        try:
+            async for event in self._stream_completion(messages, max_tokens=1500):
+                if event["type"] == "result":
+                    event["context_budget"] = context_budget
+                    event["timings"]["context_build"] = context_seconds
+                yield event
+        except Exception as e:
+            logger.error(f"Error streaming from OpenAI API: {str(e)}")
+            raise Exception(f"LLM analysis failed: {str(e)}")
+
+    async def stream_chat_about_logs(self,
+                                     user_query: str,
+                                     conversation_history: List[Dict[str, str]] = None,
+                                     initial_analysis: str = "",
+                                     log_summary: str = "") -> AsyncIterator[Dict[str, Any]]:
+        """Streaming variant of chat_about_logs (same events as stream_analyze_logs)"""
+        messages = self._chat_messages(user_query, conversation_history, initial_analysis, log_summary)
+        logger.info(f"Streaming follow-up chat request to OpenAI with {len(messages)} messages")
+        try:
+            async for event in self._stream_completion(messages, max_tokens=800):
+                yield event
+        except Exception as e:
+            logger.error(f"Error in streamed follow-up chat: {str(e)}")
+            raise Exception(f"Follow-up chat failed: {str(e)}")
+
+    async def map_reduce_analyze(self,
+                                 filtered_windows: List[Dict[str, Any]],
+                                 user_query: str,
+                                 conversation_history: List[Dict[str, str]] = None,
+                                 processing_summary: str = "") -> Dict[str, Any]:
+        """
+        Analyze many windows in two stages: batches of windows are summarized into
+        structured findings in parallel (map), then one call merges them (reduce)
+        
+        Returns the analyze_logs fields, with tokens and cost summed over all
+        calls, plus 'stages' holding the per-stage breakdown
+        """
+        result = None
+        async for event in self.stream_map_reduce_analyze(filtered_windows, user_query, conversation_history, processing_summary):
+            if event["type"] == "result":
+                result = event
+        result.pop("type")
+        return result
+
+    async def stream_map_reduce_analyze(self,
+                                        filtered_windows: List[Dict[str, Any]],
+                                        user_query: str,
+                                        conversation_history: List[Dict[str, str]] = None,
+                                        processing_summary: str = "") -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of map_reduce_analyze
+        Yields {'type': 'progress', 'stage': 'map', ...} as batches finish, then the
+        reduce call's delta events and a final result event
+        """
+        try:
+            started = time.perf_counter()
+            batches = [
+                (start, filtered_windows[start:start + self.map_batch_size])
+                for start in range(0, len(filtered_windows), self.map_batch_size)
+            ]
+            logger.info(f"Map-reduce analysis: {len(filtered_windows)} windows in {len(batches)} batches")
+
+            semaphore = asyncio.Semaphore(self.map_concurrency)
+
+            async def run_batch(start: int, windows: List[Dict[str, Any]]) -> Dict[str, Any]:
+                async with semaphore:
+                    return await self._map_batch(windows, user_query, start + 1)
+
+            tasks = [asyncio.ensure_future(run_batch(start, windows)) for start, windows in batches]
+            map_results = []
+            try:
+                for completed, task in enumerate(asyncio.as_completed(tasks), 1):
+                    map_results.append(await task)
+                    yield {"type": "progress", "stage": "map", "completed": completed, "total": len(batches)}
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+            map_seconds = time.perf_counter() - started
+
+            # Keep findings in window order regardless of completion order
+            map_results.sort(key=lambda r: r["first_window"])
+            findings = [finding for r in map_results for finding in r["findings"]]
+
+            messages = self._reduce_messages(findings, user_query, conversation_history, processing_summary, len(batches))
+            reduce_result = None
+            async for event in self._stream_completion(messages, max_tokens=1500):
+                if event["type"] == "delta":
+                    yield event
+                else:
+                    reduce_result = event
+
+            map_stage = self._stage_totals(map_results)
+            reduce_stage = self._stage_totals([reduce_result])
+            result = {
+                "type": "result",
+                "response": reduce_result["response"],
+                "tokens_used": map_stage["tokens_used"] + reduce_stage["tokens_used"],
+                "input_tokens": map_stage["input_tokens"] + reduce_stage["input_tokens"],
+                "output_tokens": map_stage["output_tokens"] + reduce_stage["output_tokens"],
+                "estimated_cost": map_stage["estimated_cost"] + reduce_stage["estimated_cost"],
+                "model": self.model,
+                "cached": all(r.get("cached") for r in map_results + [reduce_result]),
+                "stages": {"map": map_stage, "reduce": reduce_stage},
+                "context_budget": self._combine_context_budgets([r["context_budget"] for r in map_results]),
+                # Batches run concurrently, so context_build is summed CPU time inside the map wall time
+                "timings": {
+                    "context_build": sum(r["timings"]["context_build"] for r in map_results),
+                    "llm_map": map_seconds,
+                    "llm_reduce": reduce_result["timings"]["llm"],
+                    "llm": time.perf_counter() - started
+                }
+            }
+            logger.info(
+                f"Map-reduce complete: {len(findings)} findings, map ${map_stage['estimated_cost']:.4f}, "
+                f"reduce ${reduce_stage['estimated_cost']:.4f}"
+            )
+            yield result
+
+        except Exception as e:
+            logger.error(f"Error in map-reduce analysis: {str(e)}")
+            raise Exception(f"LLM analysis failed: {str(e)}")
+
+    async def _map_batch(self, windows: List[Dict[str, Any]], user_query: str, first_window: int) -> Dict[str, Any]:
+        """Extract structured findings from one batch of windows"""
+        start = time.perf_counter()
+        log_context, context_budget = self._prepare_log_context(
+            windows, f"Windows {first_window}-{first_window + len(windows) - 1}",
+            first_window, token_budget=self.map_context_token_budget
+        )
+        context_seconds = time.perf_counter() - start
+        messages = [
+            {"role": "system", "content": self.map_prompt},
+            {"role": "user", "content": f"**User Query:** {user_query}\n\n**Log Windows:**\n{log_context}"}
+        ]
+        result = await self._complete(messages, max_tokens=600, response_format={"type": "json_object"})
+
+        try:
+            findings = json.loads(result["response"]).get("findings", [])
+            if not isinstance(findings, list):
+                raise ValueError("findings is not a list")
+        except (ValueError, AttributeError) as e:
+            # Keep whatever the model said rather than losing the batch
+            logger.warning(f"Unstructured findings for windows starting at {first_window}: {e}")
+            findings = [{"severity": "info", "issue": result["response"], "windows": [first_window]}]
+
+        result["timings"]["context_build"] = context_seconds
+        return {**result, "findings": findings, "first_window": first_window, "context_budget": context_budget}
+
+    def _reduce_messages(self, findings: List[Dict[str, Any]], user_query: str,
+                         conversation_history: Optional[List[Dict[str, str]]],
+                         processing_summary: str, batch_count: int) -> List[Dict[str, str]]:
+        """Message list for the reduce call: merge per-batch findings into one answer"""
+        messages = [{"role": "system", "content": self.system_prompt}]
+
+        if conversation_history:
+            messages.extend(conversation_history)
+
+        user_message = f"""**User Query:** {user_query}
+
+**Processing Summary:** {processing_summary}
+
+**Findings extracted from {batch_count} batches of log windows:**
+```json
+{json.dumps(findings, indent=1)}
+```
+
+Merge these findings (deduplicate, correlate across services and windows, rank by severity) and help me understand what's happening with my system."""
+
+        messages.append({"role": "user", "content": user_message})
+        return messages
+
+    def _combine_context_budgets(self, reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Sum per-batch context budget reports"""
+        combined = {
+            key: sum(report[key] for report in reports)
+            for key in ('token_budget', 'tokens_used', 'logs_available', 'logs_packed', 'windows_packed')
+        }
+        combined['utilization'] = round(combined['tokens_used'] / combined['token_budget'], 3) if combined['token_budget'] else 0.0
+        combined['shortened'] = any(report['shortened'] for report in reports)
+        combined['tokenizer'] = self.context_packer.tokenizer
+        return combined
+
+    def _stage_totals(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Token and cost rollup for one stage of a map-reduce analysis"""
+        return {
+            "calls": len(results),
+            "cached_calls": sum(1 for r in results if r.get("cached")),
+            "tokens_used": sum(r["tokens_used"] for r in results),
+            "input_tokens": sum(r["input_tokens"] for r in results),
+            "output_tokens": sum(r["output_tokens"] for r in results),
+            "estimated_cost": sum(r["estimated_cost"] for r in results)
+        }
+
+    async def _complete(self, messages: List[Dict[str, str]], max_tokens: int, **params) -> Dict[str, Any]:
+        """
+        Run a completion, answering from cache when the exact prompt was seen before
+        The result's 'timings' holds the round trip ('llm' seconds)
+        """
+        start = time.perf_counter()
+        key = self._cache_key(messages, max_tokens, **params)
+        # The cache reads and commits SQLite, so it runs off the event loop
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            return {**self._cached_result(cached), "timings": {"llm": time.perf_counter() - start}}
+
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=self.temperature,
+            **params
+        )
         
-        context_parts = [f"**Processing Summary:** {processing_summary}", ""]
+        result = self._usage_result(
+            response.choices[0].message.content,
+            response.usage.prompt_tokens,
+            response.usage.completion_tokens
+        )
+        await asyncio.to_thread(self.cache.put, key, result)
+        return {**result, "timings": {"llm": time.perf_counter() - start}}
+
+    async def _stream_completion(self, messages: List[Dict[str, str]], max_tokens: int) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a completion as delta events followed by one result event with usage and cost
+        The result's 'timings' holds the round trip ('llm') and time to the first delta ('llm_first_token')
+        """
+        start = time.perf_counter()
+        key = self._cache_key(messages, max_tokens)
+        cached = await asyncio.to_thread(self.cache.get, key)
+        if cached is not None:
+            result = self._cached_result(cached)
+            elapsed = time.perf_counter() - start
+            yield {"type": "delta", "content": result["response"]}
+            yield {"type": "result", **result, "timings": {"llm": elapsed, "llm_first_token": elapsed}}
+            return
+
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=self.temperature,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+
+        parts = []
+        usage = None
+        first_token = None
+        async for chunk in stream:
+            if chunk.usage:
+                # Final chunk (no choices) carries token usage
+                usage = chunk.usage
+            for choice in chunk.choices:
+                if choice.delta and choice.delta.content:
+                    if first_token is None:
+                        first_token = time.perf_counter() - start
+                    parts.append(choice.delta.content)
+                    yield {"type": "delta", "content": choice.delta.content}
+
+        result = self._usage_result(
+            "".join(parts),
+            usage.prompt_tokens if usage else 0,
+            usage.completion_tokens if usage else 0
+        )
+        logger.info(f"OpenAI stream complete. Tokens: {result['tokens_used']}, Cost: ${result['estimated_cost']:.4f}")
+        if usage is not None:
+            await asyncio.to_thread(self.cache.put, key, result)
+        timings = {"llm": time.perf_counter() - start}
+        if first_token is not None:
+            timings["llm_first_token"] = first_token
+        yield {"type": "result", **result, "timings": timings}
+
+    def _cache_key(self, messages: List[Dict[str, str]], max_tokens: int, **params) -> str:
+        return LLMResponseCache.make_key(
+            self.model, {"max_tokens": max_tokens, "temperature": self.temperature, **params}, messages
+        )
+
+    def _cached_result(self, cached: Dict[str, Any]) -> Dict[str, Any]:
+        """A cached answer costs nothing this time: report zero incremental tokens and cost"""
+        logger.info(f"LLM cache hit ({cached['tokens_used']} tokens, ${cached['estimated_cost']:.4f} saved)")
+        return {
+            **cached,
+            "tokens_used": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "estimated_cost": 0.0,
+            "cached": True
+        }
+
+    def _analysis_messages(self, filtered_windows: List[Dict[str, Any]], user_query: str,
+                           conversation_history: Optional[List[Dict[str, str]]],
+                           processing_summary: str) -> Tuple[List[Dict[str, str]], Dict[str, Any]]:
+        """
+        Message list for a first analysis: system prompt, history, query plus filtered logs
+        Returns (messages, context budget report)
+        """
+        log_context, context_budget = self._prepare_log_context(filtered_windows, processing_summary)
+
+        #cache to store messages
+        messages = [{"role": "system", "content": self.system_prompt}]
+
+        if conversation_history:
+            messages.extend(conversation_history)
+
+        user_message = f"""**User Query:** {user_query}
+
+**Filtered Log Data:**
+{log_context}
+
+Please analyze these logs and help me understand what's happening with my system."""
+
+        messages.append({"role": "user", "content": user_message})
+        return messages, context_budget
+
+    def _chat_messages(self, user_query: str, conversation_history: Optional[List[Dict[str, str]]],
+                       initial_analysis: str, log_summary: str) -> List[Dict[str, str]]:
+        """Message list for a follow-up: cached analysis as context, history, then the query"""
+        # Build conversation messages with cached context
+        messages = [{"role": "system", "content": self.system_prompt}]
         
-        for i, window in enumerate(filtered_windows, 1):
-            context_parts.append(f"**Window {i}: {window['summary']}**")
-            
-            for j, log in enumerate(window['logs'], 1):
-                log_info = []
-                
-                if log.get('service') and log['service'] != 'unknown':
-                    log_info.append(f"Service: {log['service']}")
-
-                if log.get('severity'):
-                    log_info.append(f"Severity: {log['severity']}")
-                
-                if log.get('method') and log.get('route'):
-                    log_info.append(f"HTTP: {log['method']} {log['route']}")
-                elif log.get('route'):
-                    log_info.append(f"Route: {log['route']}")
-                
-                # status code
-                if log.get('status'):
-                    log_info.append(f"Status: {log['status']}")
-                
-                # trace ID
-                if log.get('trace_id'):
-                    log_info.append(f"Trace: {log['trace_id'][:16]}...")
-                
-                # format log entry
-                log_header = f"  Log {j}: {' | '.join(log_info)}" if log_info else f"  Log {j}:"
-                context_parts.append(log_header)
-                context_parts.append(f"    Message: {log['message']}")
-                context_parts.append("")
+        # Add the initial analysis as context
+        context_message = f"""**Previous Log Analysis:**
+{initial_analysis}
+
+**Log Summary:** {log_summary}
+
+You have already analyzed the user's logs. Use this previous analysis to answer follow-up questions. Do not re-analyze the logs - just reference your previous findings and provide helpful insights based on the user's new question."""
+
+        messages.append({"role": "assistant", "content": context_message})
         
-        return "\n".join(context_parts)
+        # Add conversation history if available
+        if conversation_history:
+            messages.extend(conversation_history)
+        
+        # Add the current query
+        messages.append({"role": "user", "content": user_query})
+        return messages
+
+    def _usage_result(self, llm_response: str, input_tokens: int, output_tokens: int) -> Dict[str, Any]:
+        """Response plus token counts and GPT-4o mini cost"""
+        input_cost = (input_tokens / 1000000) * 0.15  # $0.15 per 1M input tokens
+        output_cost = (output_tokens / 1000000) * 0.60  # $0.60 per 1M output tokens
+        
+        return {
+            "response": llm_response,
+            "tokens_used": input_tokens + output_tokens,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "estimated_cost": input_cost + output_cost,
+            "model": self.model,
+            "cached": False
+        }
 
-    def health_check(self) -> bool:
+    def _prepare_log_context(self, filtered_windows: List[Dict[str, Any]], processing_summary: str,
+                             first_window: int = 1, token_budget: Optional[int] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        Prepare log data in a format optimized for LLM analysis
+        Packs the most useful logs into token_budget; returns (context, budget report)
+        """
+        return self.context_packer.pack(
+            filtered_windows, processing_summary,
+            token_budget or self.context_token_budget, first_window
+        )
+
+    async def health_check(self) -> bool:
         """Check if OpenAI API is accessible"""
         try:
             # simple test
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": "Hello"}],
                 max_tokens=5,
@@ -232,3 +528,8 @@ You have already analyzed the user's logs. Use this previous analysis to answer
         except Exception as e:
             logger.error(f"OpenAI health check failed: {str(e)}")
             return False
+
+    async def close(self):
+        """Close pooled connections and the response cache"""
+        await self.client.close()
+        self.cache.close()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Deterministic OTel-demo-style log generator
+Writes NDJSON in the two shapes the filter sees in practice: container stdout
+records like the take-home sample (epoch-ns timestamp string, no trace) and
+structured OTel records with trace/span ids, severity and HTTP attributes.
+The same seed and parameters always produce the same file.
+"""
+
+import argparse
+import json
+import logging
+import random
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+SERVICES = [
+    'frontend', 'frauddetectionservice', 'cartservice', 'checkoutservice', 'paymentservice',
+    'productcatalogservice', 'currencyservice', 'shippingservice', 'emailservice',
+    'recommendationservice', 'adservice', 'quoteservice', 'accountingservice', 'kafka'
+]
+
+# Downstream calls a span in each service may fan out to
+CALLS = {
+    'frontend': ['checkoutservice', 'cartservice', 'productcatalogservice', 'recommendationservice', 'adservice', 'currencyservice'],
+    'checkoutservice': ['cartservice', 'paymentservice', 'shippingservice', 'emailservice', 'currencyservice', 'kafka'],
+    'recommendationservice': ['productcatalogservice'],
+    'shippingservice': ['quoteservice'],
+    'kafka': ['frauddetectionservice', 'accountingservice'],
+}
+
+ROUTES = {
+    'frontend': [('GET', '/'), ('GET', '/api/products'), ('POST', '/api/cart'), ('GET', '/api/cart'), ('POST', '/api/checkout')],
+    'cartservice': [('POST', '/oteldemo.CartService/AddItem'), ('GET', '/oteldemo.CartService/GetCart')],
+    'checkoutservice': [('POST', '/oteldemo.CheckoutService/PlaceOrder')],
+    'paymentservice': [('POST', '/oteldemo.PaymentService/Charge')],
+    'productcatalogservice': [('GET', '/oteldemo.ProductCatalogService/GetProduct')],
+    'shippingservice': [('POST', '/get-quote'), ('POST', '/ship-order')],
+}
+
+# Message shapes; {k} is replaced by per-template words so cardinality is tunable
+INFO_PHRASES = [
+    'Consumed record with orderId: {order}',
+    'processed {k} request for user {user} in {ms}ms',
+    'cache {k} lookup for product {product} returned {count} items',
+    'sending {k} confirmation to {email}',
+    'converted {amount} {k} from USD to EUR',
+    'published {k} event to topic orders partition {count}',
+    'charge {k} accepted for amount {amount} transaction {order}',
+    'quote {k} computed for {count} items cost {amount}',
+]
+ERROR_PHRASES = [
+    'ERROR failed to {k} cart for user {user}: connection refused',
+    'ERROR {k} charge failed: card declined transaction {order}',
+    'ERROR timeout after {ms}ms calling {k} upstream',
+    'ERROR exception in {k} handler: NullPointerException at line {count}',
+    'ERROR could not {k} order {order}: status 503 service unavailable',
+]
+WARN_PHRASES = [
+    'WARN slow {k} response {ms}ms for route {route}',
+    'WARN retrying {k} attempt {count} for order {order}',
+]
+TEMPLATE_WORDS = [
+    'get', 'put', 'sync', 'async', 'batch', 'single', 'primary', 'replica', 'fast', 'slow',
+    'legacy', 'modern', 'internal', 'external', 'bulk', 'partial', 'scheduled', 'manual',
+    'remote', 'local', 'cached', 'direct', 'queued', 'inline', 'signed', 'plain',
+]
+
+
+@dataclass
+class GeneratorConfig:
+    lines: int = 10_000
+    seed: int = 7
+    error_rate: float = 0.02           # share of traces that fail, and of untraced lines that are errors
+    warn_rate: float = 0.03
+    traced_fraction: float = 0.4       # share of lines that belong to traces
+    fan_out: int = 4                   # mean child spans per trace
+    wide_trace_rate: float = 0.002     # traces with 25x fan-out (exercise oversized-trace splitting)
+    template_cardinality: int = 200    # distinct message templates
+    lines_per_second: float = 2000.0
+    start_ns: int = 1756854761248507718
+
+
+class OtelDemoLogGenerator:
+    def __init__(self, config: GeneratorConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.now_ns = config.start_ns
+        self.info_templates = self._build_templates(INFO_PHRASES, config.template_cardinality)
+        self.error_templates = self._build_templates(ERROR_PHRASES, max(config.template_cardinality // 10, len(ERROR_PHRASES)))
+        self.warn_templates = self._build_templates(WARN_PHRASES, max(config.template_cardinality // 20, len(WARN_PHRASES)))
+
+        # A trace yields many lines per draw (spans x 1-3 logs), so draw traces
+        # with the probability that makes traced_fraction hold per line
+        lines_per_trace = 2.0 * (1 + config.fan_out * (1 + 24 * config.wide_trace_rate))
+        share = config.traced_fraction
+        self.trace_draw_probability = share / (share + (1 - share) * lines_per_trace) if share < 1 else 1.0
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        """Exactly config.lines records, in (roughly) increasing time order"""
+        produced = 0
+        while produced < self.config.lines:
+            if self.rng.random() < self.trace_draw_probability:
+                batch = self._trace()
+            else:
+                batch = [self._container_record()]
+            for record in batch[:self.config.lines - produced]:
+                yield record
+            produced += len(batch)
+
+    def write(self, path: str) -> int:
+        """Write NDJSON to path; returns bytes written"""
+        size = 0
+        with open(path, 'w') as f:
+            for record in self.records():
+                line = json.dumps(record, separators=(',', ':')) + '\n'
+                f.write(line)
+                size += len(line)
+        logger.info(f"Generated {self.config.lines} logs ({size} bytes) to {path}")
+        return size
+
+    def _build_templates(self, phrases: List[str], count: int) -> List[str]:
+        templates = []
+        words = TEMPLATE_WORDS
+        for i in range(count):
+            phrase = phrases[i % len(phrases)]
+            variant = i // len(phrases)
+            k = words[variant % len(words)]
+            if variant >= len(words):
+                k += '-' + words[(variant // len(words)) % len(words)]
+            if variant >= len(words) ** 2:
+                k += f'-v{variant}'
+            templates.append(phrase.replace('{k}', k))
+        return templates
+
+    def _tick(self) -> int:
+        self.now_ns += int(self.rng.expovariate(self.config.lines_per_second) * 1e9)
+        return self.now_ns
+
+    def _hex(self, bits: int) -> str:
+        return f'{self.rng.getrandbits(bits):0{bits // 4}x}'
+
+    def _message(self, level: str, service: str) -> str:
+        rng = self.rng
+        templates = {'ERROR': self.error_templates, 'WARN': self.warn_templates}.get(level, self.info_templates)
+        # Zipf-like skew: a few templates dominate, like real services
+        index = min(int(rng.paretovariate(1.2)) - 1, len(templates) - 1)
+        template = templates[index]
+        routes = ROUTES.get(service) or ROUTES['frontend']
+        return template.format(
+            order=f'{self._hex(32)[:8]}-{self._hex(16)}-11f0-9338-{self._hex(48)}',
+            user=rng.randint(1, 99999),
+            ms=rng.randint(1, 5000),
+            product=f'{self._hex(40)[:10].upper()}',
+            count=rng.randint(1, 64),
+            email=f'user{rng.randint(1, 99999)}@example.com',
+            amount=f'{rng.uniform(1, 500):.2f}',
+            route=rng.choice(routes)[1]
+        )
+
+    def _level(self) -> str:
+        r = self.rng.random()
+        if r < self.config.error_rate:
+            return 'ERROR'
+        if r < self.config.error_rate + self.config.warn_rate:
+            return 'WARN'
+        return 'INFO'
+
+    def _container_record(self) -> Dict[str, Any]:
+        """Sample-format stdout line: no trace, severity only inside the text"""
+        service = self.rng.choice(SERVICES)
+        timestamp = self._tick()
+        date, clock = self._date_time(timestamp)
+        return {
+            'clusterUid': '111de5db-ce60-429a-9b8b-d7e9652ef3c2',
+            'containerId': self._hex(256),
+            'containerName': service,
+            'log': f'{date} {clock} - {service} - {self._message(self._level(), service)}',
+            'namespace': 'oteldemo',
+            'podName': f'oteldemo-{service}-7c68f5d95-{self._hex(20)[:5]}',
+            'stream': 'stdout',
+            'timestamp': str(timestamp)
+        }
+
+    def _trace(self) -> List[Dict[str, Any]]:
+        """One request fanning out from the frontend; a failing trace errors at a leaf and propagates 5xx up"""
+        rng = self.rng
+        config = self.config
+        trace_id = self._hex(128)
+        failing = rng.random() < config.error_rate
+        fan_out = config.fan_out * (25 if rng.random() < config.wide_trace_rate else 1)
+
+        spans: List[Tuple[str, str, str]] = [('frontend', self._hex(64), '')]
+        while len(spans) < 1 + fan_out:
+            parent_service, parent_span, _ = rng.choice(spans)
+            callees = CALLS.get(parent_service) or CALLS['frontend']
+            spans.append((rng.choice(callees), self._hex(64), parent_span))
+        failing_span = rng.randrange(1, len(spans)) if failing and len(spans) > 1 else -1
+
+        failed_parents = set()
+        if failing_span >= 0:
+            parent = spans[failing_span][2]
+            by_id = {span_id: parent_id for _, span_id, parent_id in spans}
+            while parent:
+                failed_parents.add(parent)
+                parent = by_id.get(parent, '')
+
+        records = []
+        for index, (service, span_id, _) in enumerate(spans):
+            method, route = rng.choice(ROUTES.get(service) or ROUTES['frontend'])
+            if index == failing_span:
+                level, status = 'ERROR', rng.choice([500, 503])
+            elif span_id in failed_parents:
+                level, status = 'ERROR', 500
+            else:
+                level, status = ('WARN' if rng.random() < config.warn_rate else 'INFO'), 200
+            for _ in range(rng.randint(1, 3)):
+                timestamp = self._tick()
+                records.append({
+                    'timestamp': self._iso(timestamp),
+                    'severity_text': level,
+                    'body': self._message(level, service),
+                    'trace_id': trace_id,
+                    'span_id': span_id,
+                    'resource_attributes': {'service': {'name': service}},
+                    'attributes': {'http': {'method': method, 'route': route, 'status_code': status}}
+                })
+        return records
+
+    def _date_time(self, timestamp: int) -> Tuple[str, str]:
+        parts = time.gmtime(timestamp // 1_000_000_000)
+        return time.strftime('%Y-%m-%d', parts), time.strftime('%H:%M:%S', parts)
+
+    def _iso(self, timestamp: int) -> str:
+        date, clock = self._date_time(timestamp)
+        return f'{date}T{clock}.{timestamp % 1_000_000_000:09d}Z'
+
+
+def parse_count(value: str) -> int:
+    """'10k' / '1m' / '10M' / '2500' to an int"""
+    value = value.strip().lower()
+    multiplier = {'k': 1_000, 'm': 1_000_000}.get(value[-1:], 1)
+    return int(float(value[:-1] if multiplier > 1 else value) * multiplier)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
+    parser = argparse.ArgumentParser(description='Generate deterministic oteldemo-style NDJSON logs')
+    parser.add_argument('output')
+    parser.add_argument('--lines', default='10k', help='e.g. 10k, 1m, 10m')
+    defaults = GeneratorConfig()
+    for name, value in asdict(defaults).items():
+        if name != 'lines':
+            parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+
+    options = {name: getattr(args, name) for name in asdict(defaults) if name != 'lines'}
+    OtelDemoLogGenerator(GeneratorConfig(lines=parse_count(args.lines), **options)).write(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Inverted index over normalized logs
+Body tokens map to posting lists of store rows, and service/route/method/status
+values map to exact-match posting lists, so query criteria are answered with
+lookups and posting-list intersections instead of scanning every body.
+Id-like tokens (a digit and more than MAX_NUMERIC_TOKEN_LENGTH characters:
+ids, hashes, counters, timestamps) are not indexed whole, only their runs of
+MIN_SEGMENT_LENGTH or more non-digit characters ("redis" of "redis6379");
+keywords containing a digit are matched by a substring scan over the body pool
+instead.
+"""
+
+import logging
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # lookups need NumPy; without it filtering uses the object pipeline
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Query keywords are \w+ runs, so a keyword occurs in a lowercased body exactly
+# when it occurs inside one of the body's \w+ tokens
+TOKEN_PATTERN = re.compile(r'\w+')
+
+DIGIT_PATTERN = re.compile(r'\d')
+
+# Longer tokens with a digit are id-like and kept out of the vocabulary (status
+# codes and names like "v2" or "s3" stay in)
+MAX_NUMERIC_TOKEN_LENGTH = 3
+
+# Id-like tokens contribute their non-digit runs of at least this length, so
+# digit-free keywords (query keywords are longer than 2 characters) still find
+# names glued to numbers, like "redis" in "redis6379"
+MIN_SEGMENT_LENGTH = 3
+SEGMENT_PATTERN = re.compile(rf'[^\W\d]{{{MIN_SEGMENT_LENGTH},}}')
+
+
+def is_indexed_token(token: str) -> bool:
+    return len(token) <= MAX_NUMERIC_TOKEN_LENGTH or DIGIT_PATTERN.search(token) is None
+
+
+def indexed_terms(token: str) -> List[str]:
+    """Vocabulary entries for one \\w+ token: the token itself, or the segments of an id-like one"""
+    return [token] if is_indexed_token(token) else SEGMENT_PATTERN.findall(token)
+
+
+def keyword_in_body(keyword: str, body: str) -> bool:
+    """
+    The index's keyword semantics for one lowercased body: a keyword with a
+    digit matches anywhere in the body, other keywords must occur inside one
+    of the body's indexed terms (for keywords of MIN_SEGMENT_LENGTH or more
+    characters, that is anywhere in the body too)
+    """
+    if keyword not in body:
+        return False
+    if DIGIT_PATTERN.search(keyword) or len(keyword) >= MIN_SEGMENT_LENGTH:
+        return True
+    return any(keyword in term for token in TOKEN_PATTERN.findall(body) for term in indexed_terms(token))
+
+
+# Columns with exact-match posting lists
+FIELD_COLUMNS = ('service_id', 'route_id', 'method_id', 'status')
+
+
+class InvertedLogIndex:
+    def __init__(self, max_cached_keywords: int = 256):
+        self.postings: Dict[str, array] = {}
+        self.field_postings: Dict[str, Dict[int, Any]] = {}
+        self.frozen = False
+        self._keyword_cache: "OrderedDict[str, Any]" = OrderedDict()
+        self.max_cached_keywords = max_cached_keywords
+        # Guards the keyword cache and the lazily built vocabulary and trigrams (filter threads share a store)
+        self._lock = threading.Lock()
+
+        # Set by load(): newline-joined vocabulary and memory-mapped concatenated postings
+        self._vocabulary_data: Optional[bytes] = None
+        self._vocabulary: Optional[List[str]] = None
+        self._posting_offsets = None
+        self._posting_rows = None
+        # Built on first keyword lookup: trigram -> ids of the vocabulary tokens containing it
+        self._trigrams: Optional[Dict[str, List[int]]] = None
+
+    def add(self, row: int, body: str) -> int:
+        """Index the distinct tokens of one body (rows must be added in increasing order); returns its token count"""
+        postings = self.postings
+        tokens = TOKEN_PATTERN.findall(body.lower())
+        terms = set()
+        for token in set(tokens):
+            if is_indexed_token(token):
+                terms.add(token)
+            else:
+                terms.update(SEGMENT_PATTERN.findall(token))
+        for term in terms:
+            posting = postings.get(term)
+            if posting is None:
+                posting = postings[term] = array('i')
+            posting.append(row)
+        return len(tokens)
+
+    def freeze(self, columns: Dict[str, Any]):
+        """Build exact-match posting lists from the store's (NumPy) columns"""
+        if np is not None:
+            for name in FIELD_COLUMNS:
+                column = np.asarray(columns[name])
+                order = np.argsort(column, kind='stable')
+                values, starts = np.unique(column[order], return_index=True)
+                groups = np.split(order.astype(np.int64), starts[1:])
+                self.field_postings[name] = dict(zip(values.tolist(), groups))
+        self.frozen = True
+
+    @property
+    def vocabulary_size(self) -> int:
+        if self._posting_offsets is not None:
+            return len(self._posting_offsets) - 1
+        return len(self.postings)
+
+    def save(self, directory: Path):
+        """
+        Write the index next to a saved store: index.vocabulary (tokens joined by
+        newlines; tokens are \\w+ so never contain one), index.postings.npy
+        (all posting lists concatenated) with index.posting_offsets.npy, and the
+        field postings as grouped row orders
+        """
+        tokens = list(self.postings)
+        lengths = np.fromiter((len(self.postings[token]) for token in tokens), dtype=np.int64, count=len(tokens))
+        offsets = np.zeros(len(tokens) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        rows = np.empty(int(offsets[-1]), dtype=np.int32)
+        for i, token in enumerate(tokens):
+            rows[offsets[i]:offsets[i + 1]] = np.frombuffer(self.postings[token], dtype=np.int32)
+
+        (directory / 'index.vocabulary').write_bytes('\n'.join(tokens).encode('utf-8'))
+        np.save(directory / 'index.posting_offsets.npy', offsets)
+        np.save(directory / 'index.postings.npy', rows)
+
+        for name, postings in self.field_postings.items():
+            values = np.array(list(postings), dtype=np.int64)
+            groups = list(postings.values())
+            starts = np.zeros(len(groups) + 1, dtype=np.int64)
+            np.cumsum([len(group) for group in groups], out=starts[1:])
+            order = np.concatenate(groups) if groups else np.zeros(0, dtype=np.int64)
+            np.savez(directory / f'index.field.{name}.npz', values=values, starts=starts, order=order)
+
+    @classmethod
+    def load(cls, directory: Path, **kwargs) -> "InvertedLogIndex":
+        """Index written by save(); postings stay memory-mapped and the vocabulary is decoded on first keyword lookup"""
+        index = cls(**kwargs)
+        index._vocabulary_data = (directory / 'index.vocabulary').read_bytes()
+        index._posting_offsets = np.load(directory / 'index.posting_offsets.npy', mmap_mode='r')
+        index._posting_rows = np.load(directory / 'index.postings.npy', mmap_mode='r')
+        for name in FIELD_COLUMNS:
+            with np.load(directory / f'index.field.{name}.npz') as data:
+                values, starts, order = data['values'], data['starts'], data['order']
+            index.field_postings[name] = {
+                value: order[starts[i]:starts[i + 1]] for i, value in enumerate(values.tolist())
+            }
+        index.frozen = True
+        return index
+
+    def keyword_rows(self, keyword: str, bodies: Any) -> 'np.ndarray':
+        """
+        Rows whose lowercased body matches keyword (see keyword_in_body)
+
+        bodies is the store's body StringPool, scanned for keywords with a digit
+        """
+        keyword = keyword.lower()
+        with self._lock:
+            rows = self._keyword_cache.get(keyword)
+            if rows is not None:
+                self._keyword_cache.move_to_end(keyword)
+                return rows
+
+        if DIGIT_PATTERN.search(keyword):
+            rows = self._scan_bodies(keyword, bodies)
+        else:
+            # Substring semantics: union the postings of every vocabulary token containing the keyword
+            rows = self._union([self._posting(token_id) for token_id in self._matching_tokens(keyword)])
+
+        with self._lock:
+            self._keyword_cache[keyword] = rows
+            if len(self._keyword_cache) > self.max_cached_keywords:
+                self._keyword_cache.popitem(last=False)
+        return rows
+
+    def _vocabulary_tokens(self) -> List[str]:
+        with self._lock:
+            if self._vocabulary is None:
+                if self._posting_rows is None:
+                    self._vocabulary = list(self.postings)
+                else:
+                    self._vocabulary = self._vocabulary_data.decode('utf-8').split('\n') if self._vocabulary_data else []
+                    self._vocabulary_data = None
+            return self._vocabulary
+
+    def _matching_tokens(self, keyword: str) -> List[int]:
+        """Ids of the vocabulary tokens containing keyword, checked only against the rarest of its trigrams' tokens"""
+        vocabulary = self._vocabulary_tokens()
+        if len(keyword) < 3:
+            return [i for i, token in enumerate(vocabulary) if keyword in token]
+
+        with self._lock:
+            if self._trigrams is None:
+                trigrams: Dict[str, List[int]] = {}
+                for i, token in enumerate(vocabulary):
+                    for gram in {token[j:j + 3] for j in range(len(token) - 2)}:
+                        trigrams.setdefault(gram, []).append(i)
+                self._trigrams = trigrams
+
+        candidates = None
+        for gram in {keyword[j:j + 3] for j in range(len(keyword) - 2)}:
+            token_ids = self._trigrams.get(gram)
+            if token_ids is None:
+                return []
+            if candidates is None or len(token_ids) < len(candidates):
+                candidates = token_ids
+        return [i for i in candidates if keyword in vocabulary[i]]
+
+    def _posting(self, token_id: int) -> 'np.ndarray':
+        if self._posting_rows is None:
+            return np.frombuffer(self.postings[self._vocabulary[token_id]], dtype=np.int32)
+        return self._posting_rows[self._posting_offsets[token_id]:self._posting_offsets[token_id + 1]]
+
+    def _scan_bodies(self, keyword: str, bodies: Any) -> 'np.ndarray':
+        """
+        Rows whose body contains keyword (ASCII case-insensitive), by one regex pass over the pool's buffer
+
+        Bodies are concatenated without a separator, so every (overlapping)
+        match position is found and matches running into the next body are dropped
+        """
+        if not len(bodies):
+            return np.zeros(0, dtype=np.int64)
+        needle = keyword.encode('utf-8')
+        pattern = re.compile(b'(?=' + re.escape(needle) + b')', re.IGNORECASE)
+        positions = np.fromiter((match.start() for match in pattern.finditer(bodies.data)), dtype=np.int64)
+        offsets = np.asarray(bodies.offsets, dtype=np.int64)
+        rows = np.searchsorted(offsets, positions, side='right') - 1
+        inside = positions + len(needle) <= offsets[rows + 1]
+        return np.unique(rows[inside])
+
+    def field_rows(self, field: str, value_ids: List[int]) -> 'np.ndarray':
+        """Rows whose column value is any of value_ids"""
+        postings = self.field_postings.get(field, {})
+        return self._union([postings[value] for value in value_ids if value in postings])
+
+    def match_rows(self, store: Any, criteria: Dict[str, Any]) -> Dict[str, 'np.ndarray']:
+        """
+        Rows matching each parse_query_advanced criterion type that is present
+        ('services', 'routes', 'methods', 'status_codes', plus 'keyword:<word>'
+        per keyword). Service and route criteria are substring matches, as in
+        calculate_prompt_match_score.
+        """
+        matches = {}
+        if criteria['services']:
+            ids = [i for i, name in enumerate(store.services.values)
+                   if any(service in name for service in criteria['services'])]
+            matches['services'] = self.field_rows('service_id', ids)
+        if criteria['routes']:
+            ids = [i for i, value in enumerate(store.routes.values)
+                   if any(route in value for route in criteria['routes'])]
+            matches['routes'] = self.field_rows('route_id', ids)
+        if criteria['methods']:
+            ids = [store.methods.lookup(method) for method in criteria['methods']]
+            matches['methods'] = self.field_rows('method_id', [i for i in ids if i >= 0])
+        if criteria['status_codes']:
+            matches['status_codes'] = self.field_rows('status', criteria['status_codes'])
+        for keyword in dict.fromkeys(criteria['keywords']):
+            matches[f'keyword:{keyword}'] = self.keyword_rows(keyword, store.bodies)
+        return matches
+
+    def intersect(self, row_sets: List['np.ndarray']) -> 'np.ndarray':
+        """Intersection of sorted posting lists, smallest first"""
+        if not row_sets:
+            return np.zeros(0, dtype=np.int64)
+        row_sets = sorted(row_sets, key=len)
+        result = row_sets[0]
+        for rows in row_sets[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, rows, assume_unique=True)
+        return result
+
+    def nbytes(self) -> int:
+        total = sum(posting.itemsize * len(posting) for posting in self.postings.values())
+        if self._posting_rows is not None:
+            total += self._posting_rows.nbytes
+        for postings in self.field_postings.values():
+            total += sum(rows.nbytes for rows in postings.values())
+        return total
+
+    def _union(self, row_sets: List['np.ndarray']) -> 'np.ndarray':
+        if not row_sets:
+            return np.zeros(0, dtype=np.int64)
+        if len(row_sets) == 1:
+            return row_sets[0].astype(np.int64)
+        return np.unique(np.concatenate(row_sets)).astype(np.int64)
@@ -4,19 +4,34 @@ FastAPI backend for log analysis MVP
 Accepts file + query and returns filtered data for LLM processing
 """
 
+import asyncio
 import logging
 import json
 import tempfile
 import os
-from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Callable, Optional, Tuple, AsyncIterator, Iterator
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 
-from enhanced_log_filter import EnhancedLogFilter
+from enhanced_log_filter import EnhancedLogFilter, LogEntry, LogWindow
+from columnar_store import ColumnarLogStore
+from parallel_ingest import ParallelLogLoader
 from llm_service import LLMService
+from dataset_registry import DatasetRegistry, DatasetInfo
+from state_store import create_state_store
+from window_accumulator import WindowAccumulator
+from live_ingest import LiveStream
+from metrics import PipelineMetrics, timed, request_breakdown, debug_view
 
 # Load environment variables
 load_dotenv()
@@ -43,12 +58,114 @@ app.add_middleware(
 
 # Initialize services
 filter_system = EnhancedLogFilter()
+log_loader = ParallelLogLoader(filter_system)
 llm_service = LLMService()
+dataset_registry = DatasetRegistry()
 
-# In-memory conversation storage (resets on server restart)
-conversations: Dict[str, List[Dict[str, str]]] = {}
-# Track which conversations have analyzed logs already
-analyzed_conversations: Dict[str, Dict[str, Any]] = {}
+# Analysis modes: one prompt over the top windows, or map-reduce over many more
+# windows (batches summarized in parallel, then merged by a final call).
+# logs_per_window is the candidate pool; LLMService packs what fits its token budget.
+ANALYSIS_MODES = {
+    'single': {'max_windows': 10, 'logs_per_window': 10},
+    'map_reduce': {
+        'max_windows': int(os.getenv('MAP_REDUCE_MAX_WINDOWS', '40')),
+        'logs_per_window': int(os.getenv('MAP_REDUCE_LOGS_PER_WINDOW', '8'))
+    }
+}
+
+# CPU-heavy load/filter work runs here so it never blocks the event loop;
+# the worker count bounds how many analyses filter at once
+filter_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('FILTER_CONCURRENCY', '2')),
+    thread_name_prefix='log-filter'
+)
+
+# Indexed stores of recently analyzed datasets (datasets are immutable, keyed by content hash)
+dataset_stores: "OrderedDict[str, ColumnarLogStore]" = OrderedDict()
+dataset_stores_lock = threading.Lock()
+max_dataset_stores = int(os.getenv('DATASET_STORE_CACHE', '2'))
+max_dataset_store_bytes = int(os.getenv('DATASET_STORE_MAX_BYTES', str(2 << 30)))
+
+# Open hot-event windows of recently appended datasets, so the next append only
+# processes its own new lines (moved to the new dataset id on each append)
+dataset_windows: "OrderedDict[str, WindowAccumulator]" = OrderedDict()
+dataset_windows_lock = threading.Lock()
+max_dataset_windows = int(os.getenv('DATASET_WINDOW_CACHE', '4'))
+max_dataset_window_bytes = int(os.getenv('DATASET_WINDOW_MAX_BYTES', str(256 << 20)))
+
+# Live NDJSON feeds and their rolling windows (least recently fed dropped first)
+live_streams: "OrderedDict[str, LiveStream]" = OrderedDict()
+live_streams_lock = threading.Lock()
+max_live_streams = int(os.getenv('MAX_LIVE_STREAMS', '8'))
+max_live_stream_bytes = int(os.getenv('LIVE_STREAMS_MAX_BYTES', str(512 << 20)))
+
+def _store_nbytes(store: ColumnarLogStore) -> int:
+    return store.nbytes() + store.index.nbytes()
+
+def _trim_cache(cache: OrderedDict, max_entries: int, max_bytes: int,
+                nbytes: Callable[[Any], int] = lambda item: item.nbytes()) -> List[str]:
+    """
+    Drop least recently used entries over the count or byte budget (call with the cache's lock held)
+    The most recent entry is kept even if it alone is over max_bytes; returns the dropped keys
+    """
+    total = sum(nbytes(item) for item in cache.values())
+    dropped = []
+    while cache and (len(cache) > max_entries or (len(cache) > 1 and total > max_bytes)):
+        key, item = cache.popitem(last=False)
+        total -= nbytes(item)
+        dropped.append(key)
+    return dropped
+
+# Stage latency, token and cost histograms served on /metrics
+pipeline_metrics = PipelineMetrics()
+
+def _dataset_store_bytes() -> int:
+    with dataset_stores_lock:
+        stores = list(dataset_stores.values())
+    return sum(_store_nbytes(store) for store in stores)
+
+pipeline_metrics.add_gauge(
+    'log_analysis_dataset_store_bytes', 'Bytes held by cached indexed dataset stores', _dataset_store_bytes
+)
+
+def _live_windows() -> int:
+    with live_streams_lock:
+        streams = list(live_streams.values())
+    return sum(len(stream.windows.windows) for stream in streams)
+
+pipeline_metrics.add_gauge('log_analysis_live_streams', 'Live NDJSON streams held in memory', lambda: len(live_streams))
+pipeline_metrics.add_gauge('log_analysis_live_windows', 'Rolling windows held across live streams', _live_windows)
+
+def _live_stream_bytes() -> int:
+    with live_streams_lock:
+        streams = list(live_streams.values())
+    return sum(stream.nbytes() for stream in streams)
+
+pipeline_metrics.add_gauge('log_analysis_live_stream_bytes', 'Estimated bytes held by live stream windows', _live_stream_bytes)
+
+@app.on_event("shutdown")
+async def shutdown_services():
+    filter_executor.shutdown(wait=False)
+    log_loader.shutdown()
+    await llm_service.close()
+
+# Conversation history, cached first analyses and dataset metadata, evicted by idle
+# time, LRU and size. In memory by default; STATE_BACKEND=sqlite shares it between
+# uvicorn workers (and keeps it across restarts)
+app_state = create_state_store()
+
+def _conversation_evictions() -> int:
+    stats = app_state.stats()
+    return stats['expired'] + stats['evicted']
+
+pipeline_metrics.add_gauge(
+    'log_analysis_conversation_state_bytes', 'Estimated bytes held by conversation state',
+    lambda: app_state.stats()['resident_bytes']
+)
+pipeline_metrics.add_gauge(
+    'log_analysis_conversation_evictions_total', 'Conversations dropped for idling past the TTL or to stay within the caps',
+    _conversation_evictions, kind='counter'
+)
 
 class AnalysisResponse(BaseModel):
     """Response model for log analysis"""
@@ -60,193 +177,747 @@ class AnalysisResponse(BaseModel):
     llm_tokens_used: int
     llm_cost: float
     conversation_id: str
+    cached: bool = False  # answered from the LLM response cache (zero incremental cost)
+    llm_stages: Optional[Dict[str, Dict[str, Any]]] = None  # per-stage tokens/cost for map-reduce analyses
+    context_budget: Optional[Dict[str, Any]] = None  # prompt token budget used by the packed log context
+    debug: Optional[Dict[str, Any]] = None  # per-stage ms, log counts, LLM usage and memory (debug=true only)
+
+class AppendResponse(BaseModel):
+    """Response model for appending to a dataset"""
+    dataset_id: str
+    parent_id: str
+    filename: str
+    size_bytes: int
+    created: bool
+    new_logs: int
+    new_hot_logs: int
+    rescored_windows: int
+    total_logs: int
+    top_windows: List[Dict[str, Any]]
+
+class StreamIngestResponse(BaseModel):
+    """Counts for one ingest request plus the stream's running totals"""
+    stream_id: str
+    lines: int
+    malformed_lines: int
+    hot_logs: int
+    stream: Dict[str, Any]
+
+class StreamWindowsResponse(BaseModel):
+    """Current top windows of a live stream"""
+    stream_id: str
+    stream: Dict[str, Any]
+    top_windows: List[Dict[str, Any]]
+
+class DatasetResponse(BaseModel):
+    """Response model for dataset registration"""
+    dataset_id: str
+    filename: str
+    size_bytes: int
+    created: bool
+    # Log count, services and time bounds, once the dataset has been analyzed
+    metadata: Optional[Dict[str, Any]] = None
 
 @app.get("/")
 async def root():
     """Health check endpoint"""
     return {"message": "Log Analysis API is running", "version": "1.0.0"}
 
+def _validate_analysis_mode(mode: str):
+    if mode not in ANALYSIS_MODES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown analysis mode '{mode}', expected one of: {', '.join(ANALYSIS_MODES)}"
+        )
+
+def _validate_log_filename(filename: Optional[str]):
+    """Reject uploads that are not JSON/NDJSON log files"""
+    if not filename or not (filename.endswith('.json') or filename.endswith('.ndjson')):
+        raise HTTPException(
+            status_code=400,
+            detail="Only .json and .ndjson files are supported"
+        )
+
+@app.post("/datasets", response_model=DatasetResponse)
+async def create_dataset(
+    file: UploadFile = File(..., description="Log file (.json or .ndjson)")
+):
+    """
+    Register a log file once under its content hash
+    Re-uploading identical bytes is a no-op that returns the existing dataset id
+    """
+    logger.info(f"Received dataset upload: {file.filename} ({file.content_type})")
+    _validate_log_filename(file.filename)
+
+    info, created = await run_in_threadpool(dataset_registry.add_file, file.file, file.filename)
+    return DatasetResponse(
+        dataset_id=info.dataset_id,
+        filename=info.filename,
+        size_bytes=info.size_bytes,
+        created=created,
+        metadata=await run_in_threadpool(app_state.get_dataset, info.dataset_id)
+    )
+
+@app.get("/datasets/{dataset_id}", response_model=DatasetResponse)
+async def get_dataset(dataset_id: str):
+    """Look up a registered dataset so clients can skip re-uploading it"""
+    info = dataset_registry.get(dataset_id)
+    if not info:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    return DatasetResponse(
+        dataset_id=info.dataset_id,
+        filename=info.filename,
+        size_bytes=info.size_bytes,
+        created=False,
+        metadata=await run_in_threadpool(app_state.get_dataset, info.dataset_id)
+    )
+
+@app.post("/datasets/{dataset_id}/append", response_model=AppendResponse)
+async def append_dataset(
+    dataset_id: str,
+    file: UploadFile = File(..., description="Re-export of the dataset with new lines appended (.ndjson)"),
+    top_k: int = Form(10, description="Number of top windows to return")
+):
+    """
+    Register a re-export that extends a dataset and refresh its top windows
+    Only the lines after the dataset's bytes are normalized; they are merged into
+    the open windows and only the windows they touch are rescored
+    """
+    logger.info(f"Received append to dataset {dataset_id[:12]}: {file.filename}")
+    _validate_log_filename(file.filename)
+    parent = dataset_registry.get(dataset_id)
+    if not parent:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    # Reject JSON arrays before the re-export is registered as a dataset
+    head = await file.read(4096)
+    await file.seek(0)
+    if head.lstrip().startswith(b'['):
+        raise HTTPException(status_code=400, detail="Only NDJSON datasets can be appended to")
+
+    try:
+        info, created = await run_in_threadpool(dataset_registry.extend, parent, file.file, file.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(filter_executor, _append_windows, parent, info, top_k)
+    return AppendResponse(
+        dataset_id=info.dataset_id,
+        parent_id=parent.dataset_id,
+        filename=info.filename,
+        size_bytes=info.size_bytes,
+        created=created,
+        **result
+    )
+
+@app.post("/streams/{stream_id}/ingest", response_model=StreamIngestResponse)
+async def ingest_stream(stream_id: str, request: Request):
+    """
+    Feed NDJSON lines into a live stream (created on first use)
+    The body is read as it arrives, so a forwarder can hold one chunked request
+    open or post a batch per flush; reading pauses while normalization catches up
+    """
+    with live_streams_lock:
+        stream = live_streams.pop(stream_id, None)
+        if stream is None:
+            logger.info(f"Opening live stream {stream_id}")
+            stream = LiveStream(stream_id, filter_system)
+        live_streams[stream_id] = stream
+        _trim_live_streams()
+
+    result = await stream.ingest(request.stream(), filter_executor)
+    with live_streams_lock:
+        # The stream grew while reading; others may need to make room
+        if live_streams.get(stream_id) is stream:
+            live_streams.move_to_end(stream_id)
+            _trim_live_streams()
+    return StreamIngestResponse(stream_id=stream_id, stream=stream.stats(), **result)
+
+def _trim_live_streams():
+    for evicted_id in _trim_cache(live_streams, max_live_streams, max_live_stream_bytes):
+        logger.info(f"Dropped live stream {evicted_id}")
+
+@app.get("/streams/{stream_id}/windows", response_model=StreamWindowsResponse)
+async def stream_windows(stream_id: str, top_k: int = 10):
+    """Top windows of a live stream by importance (only windows changed since the last call are rescored)"""
+    with live_streams_lock:
+        stream = live_streams.get(stream_id)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="Stream not found")
+
+    loop = asyncio.get_running_loop()
+    windows = await loop.run_in_executor(filter_executor, stream.top, top_k)
+    return StreamWindowsResponse(
+        stream_id=stream_id,
+        stream=stream.stats(),
+        top_windows=[_window_overview(window) for window in windows]
+    )
+
+@app.delete("/streams/{stream_id}")
+async def delete_stream(stream_id: str):
+    """Drop a live stream and its windows"""
+    with live_streams_lock:
+        stream = live_streams.pop(stream_id, None)
+    if stream is None:
+        raise HTTPException(status_code=404, detail="Stream not found")
+    return {"stream_id": stream_id, "deleted": True}
+
+@app.post("/datasets/{dataset_id}/analyze", response_model=AnalysisResponse)
+async def analyze_dataset(
+    dataset_id: str,
+    query: str = Form(..., description="User query about the logs"),
+    conversation_id: Optional[str] = Form(None, description="Conversation ID for context"),
+    mode: str = Form("single", description="'single' or 'map_reduce' (first analysis only)"),
+    debug: bool = Form(False, description="Attach a per-stage timing breakdown to the response")
+):
+    """
+    Analyze a previously registered dataset based on user query
+    Same behaviour as /analyze-logs, but the logs are referenced by id instead of re-uploaded
+    """
+    logger.info(f"Received analysis request for dataset {dataset_id[:12]}: '{query}'")
+    _validate_analysis_mode(mode)
+    logger.info(f"Conversation ID: {conversation_id}")
+
+    if not dataset_registry.get(dataset_id):
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    return await _run_analysis(query, conversation_id, dataset_registry.logs_path(dataset_id), mode, dataset_id, debug)
+
 @app.post("/analyze-logs", response_model=AnalysisResponse)
 async def analyze_logs(
     query: str = Form(..., description="User query about the logs"),
-    file: UploadFile = File(..., description="Log file (.json or .ndjson)"),
-    conversation_id: Optional[str] = Form(None, description="Conversation ID for context")
+    file: Optional[UploadFile] = File(None, description="Log file (.json or .ndjson); optional on follow-ups"),
+    conversation_id: Optional[str] = Form(None, description="Conversation ID for context"),
+    mode: str = Form("single", description="'single' or 'map_reduce' (first analysis only)"),
+    debug: bool = Form(False, description="Attach a per-stage timing breakdown to the response")
 ):
     """
     Analyze logs based on user query using LLM
     Returns LLM analysis with conversation context
     """
     logger.info(f"Received analysis request for query: '{query}'")
-    logger.info(f"File: {file.filename} ({file.content_type})")
+    _validate_analysis_mode(mode)
+    if file:
+        logger.info(f"File: {file.filename} ({file.content_type})")
     logger.info(f"Conversation ID: {conversation_id}")
     
+    # Follow-ups reuse the cached analysis, so the upload is never read
+    if await run_in_threadpool(app_state.has_analysis, conversation_id):
+        return await _run_analysis(query, conversation_id, None, mode, debug=debug)
+
+    if not file:
+        raise HTTPException(status_code=400, detail="A log file is required for the first analysis")
+
     # Validate file type
-    if not (file.filename.endswith('.json') or file.filename.endswith('.ndjson')):
-        raise HTTPException(
-            status_code=400,
-            detail="Only .json and .ndjson files are supported"
-        )
+    _validate_log_filename(file.filename)
     
+    temp_file_path = await _save_upload(file)
     try:
-        # Generate conversation ID if not provided (new conversation)
-        is_new_conversation = not conversation_id
-        if not conversation_id:
-            import uuid
-            conversation_id = str(uuid.uuid4())[:8]
-            logger.info(f"Generated new conversation ID: {conversation_id}")
-        
-        # Check if this conversation has already analyzed logs
-        is_first_analysis = conversation_id not in analyzed_conversations
-        
-        # Only process logs if this is the first analysis for this conversation
-        if is_first_analysis:
-            logger.info("First analysis for this conversation - processing logs")
-            
-            # Save uploaded file to temporary location
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.json') as temp_file:
-                content = await file.read()
-                temp_file.write(content)
-                temp_file_path = temp_file.name
-            
-            logger.info(f"Saved uploaded file to {temp_file_path}")
-            
-            # Load and process logs
-            logs = filter_system.load_logs(temp_file_path)
-            logger.info(f"Loaded {len(logs)} logs from uploaded file")
-            
-            # Apply enhanced filtering
-            windows = filter_system.filter_logs_enhanced(logs, query, max_windows=10)
-            
-            # Prepare LLM-ready data
-            llm_data = []
-            total_logs = 0
-            
-            for window in windows:
-                window_data = {
-                    'summary': window.summary,
-                    'logs': []
-                }
-                
-                # Include the most important logs from each window (max 3 per window)
-                important_logs = sorted(window.logs, key=lambda x: (x.severity_number or 0), reverse=True)[:3]
-                total_logs += len(important_logs)
-                
-                for log in important_logs:
-                    window_data['logs'].append({
-                        'service': log.service_name,
-                        'severity': log.severity_text or 'UNKNOWN',
-                        'message': log.body[:200] + ('...' if len(log.body) > 200 else ''),
-                        'status': log.status,
-                        'route': log.route,
-                        'method': log.method,
-                        'timestamp': log.timestamp_raw,
-                        'trace_id': log.trace_id
-                    })
-                
-                llm_data.append(window_data)
-            
-            # Calculate metrics
-            cost_reduction = (1 - total_logs / len(logs)) * 100 if logs else 0
-            processing_summary = f"Filtered {len(logs)} logs down to {total_logs} most relevant logs across {len(llm_data)} windows"
-            
-            logger.info(f"Filtering complete: {cost_reduction:.1f}% cost reduction")
-            
-            # Clean up temp file
+        return await _run_analysis(query, conversation_id, temp_file_path, mode, debug=debug)
+    finally:
+        # Clean up temp file
+        if os.path.exists(temp_file_path):
             os.unlink(temp_file_path)
-            
-        else:
-            logger.info("Follow-up question - using cached log analysis, skipping file processing")
-            # Use cached data
-            llm_data = analyzed_conversations[conversation_id]['filtered_windows']
-            processing_summary = analyzed_conversations[conversation_id]['log_summary']
-            # Set dummy metrics for follow-up questions
-            cost_reduction = 99.9
-            total_logs = len([log for window in llm_data for log in window['logs']])
+
+@app.post("/datasets/{dataset_id}/analyze/stream")
+async def analyze_dataset_stream(
+    dataset_id: str,
+    query: str = Form(..., description="User query about the logs"),
+    conversation_id: Optional[str] = Form(None, description="Conversation ID for context"),
+    mode: str = Form("single", description="'single' or 'map_reduce' (first analysis only)"),
+    debug: bool = Form(False, description="Attach a per-stage timing breakdown to the response")
+):
+    """
+    Streaming variant of /datasets/{dataset_id}/analyze (server-sent events)
+    Emits progress, response token deltas, then a 'complete' event with the AnalysisResponse fields
+    """
+    logger.info(f"Received streaming analysis request for dataset {dataset_id[:12]}: '{query}'")
+    _validate_analysis_mode(mode)
+
+    if not dataset_registry.get(dataset_id):
+        raise HTTPException(status_code=404, detail="Dataset not found")
+
+    return _sse_response(_stream_analysis(query, conversation_id, dataset_registry.logs_path(dataset_id), mode, dataset_id, debug))
+
+@app.post("/analyze-logs/stream")
+async def analyze_logs_stream(
+    query: str = Form(..., description="User query about the logs"),
+    file: Optional[UploadFile] = File(None, description="Log file (.json or .ndjson); optional on follow-ups"),
+    conversation_id: Optional[str] = Form(None, description="Conversation ID for context"),
+    mode: str = Form("single", description="'single' or 'map_reduce' (first analysis only)"),
+    debug: bool = Form(False, description="Attach a per-stage timing breakdown to the response")
+):
+    """Streaming variant of /analyze-logs (server-sent events, same events as the dataset stream)"""
+    logger.info(f"Received streaming analysis request for query: '{query}'")
+    _validate_analysis_mode(mode)
+
+    if await run_in_threadpool(app_state.has_analysis, conversation_id):
+        return _sse_response(_stream_analysis(query, conversation_id, None, mode, debug=debug))
+
+    if not file:
+        raise HTTPException(status_code=400, detail="A log file is required for the first analysis")
+    _validate_log_filename(file.filename)
+
+    # The stream outlives this handler, so it deletes the temp file when done
+    temp_file_path = await _save_upload(file)
+    return _sse_response(_stream_analysis(query, conversation_id, temp_file_path, mode, debug=debug, cleanup_path=temp_file_path))
+
+async def _save_upload(file: UploadFile) -> str:
+    """Save an uploaded file to a temporary location and return its path"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.json') as temp_file:
+        try:
+            await run_in_threadpool(shutil.copyfileobj, file.file, temp_file)
+        except Exception:
+            os.unlink(temp_file.name)
+            raise
+    
+    logger.info(f"Saved uploaded file to {temp_file.name}")
+    return temp_file.name
+
+def _load_store(log_path: str, dataset_id: Optional[str] = None,
+                timings: Optional[Dict[str, float]] = None) -> ColumnarLogStore:
+    """
+    Stream and normalize logs into a compact, indexed columnar store
+    Stores of registered datasets are kept (LRU) so new conversations skip ingestion,
+    and persisted next to the dataset so restarts memory-map them instead of re-parsing
+    """
+    if dataset_id:
+        with dataset_stores_lock:
+            store = dataset_stores.get(dataset_id)
+            if store is not None:
+                dataset_stores.move_to_end(dataset_id)
+                logger.info(f"Reusing indexed store for dataset {dataset_id[:12]}")
+                return store
+
+    store = _load_persisted_store(dataset_id) if dataset_id else None
+    if store is None:
+        store = ColumnarLogStore.from_entries(_dataset_entries(log_path, dataset_id, timings))
+        if dataset_id:
+            _persist_store(store, dataset_id)
+
+    if dataset_id:
+        _cache_store(dataset_id, store)
+    return store
+
+def _dataset_entries(log_path: str, dataset_id: Optional[str] = None,
+                     timings: Optional[Dict[str, float]] = None) -> Iterator[LogEntry]:
+    """
+    Normalized logs of a dataset for building its store
+    An appended dataset whose parent has an indexed store takes the parent's rows
+    from that store and only parses the bytes after them
+    """
+    info = dataset_registry.get(dataset_id) if dataset_id else None
+    parent = dataset_registry.get(info.parent_id) if info and info.parent_id else None
+    if parent is not None:
+        with dataset_stores_lock:
+            parent_store = dataset_stores.get(parent.dataset_id)
+        if parent_store is None and os.path.isdir(dataset_registry.index_path(parent.dataset_id)):
+            parent_store = _load_store(dataset_registry.logs_path(parent.dataset_id), parent.dataset_id)
+        if parent_store is not None:
+            logger.info(f"Building store for dataset {dataset_id[:12]} from its parent {parent.dataset_id[:12]}")
+            yield from filter_system.store_entries(parent_store)
+            yield from filter_system.iter_logs(log_path, timings=timings, offset=parent.size_bytes)
+            return
+    yield from log_loader.iter_logs(log_path, timings=timings)
+
+def _cache_store(dataset_id: str, store: ColumnarLogStore):
+    if app_state.get_dataset(dataset_id) is None:
+        app_state.put_dataset(dataset_id, _dataset_metadata(store))
+    with dataset_stores_lock:
+        dataset_stores[dataset_id] = store
+        _trim_cache(dataset_stores, max_dataset_stores, max_dataset_store_bytes, _store_nbytes)
+
+def _append_windows(parent: DatasetInfo, child: DatasetInfo, top_k: int) -> Dict[str, Any]:
+    """
+    Advance the parent's open windows by the child's new lines (runs in filter_executor)
+    Without cached windows for the parent, they are seeded from its indexed store's hot rows.
+    The child's store is only built when the child is first analyzed (see _load_store).
+    """
+    child_path = dataset_registry.logs_path(child.dataset_id)
+    with dataset_windows_lock:
+        accumulator = dataset_windows.pop(parent.dataset_id, None)
+    if accumulator is None:
+        accumulator = WindowAccumulator(filter_system)
+        accumulator.add_store(_load_store(dataset_registry.logs_path(parent.dataset_id), parent.dataset_id))
+
+    new_entries = list(filter_system.iter_logs(child_path, offset=parent.size_bytes))
+    new_hot_logs = accumulator.add(new_entries)
+    new_logs = len(new_entries)
+    rescored = accumulator.refresh()
+    top_windows = [_window_overview(window) for window in accumulator.top(top_k)]
+    logger.info(f"Appended {new_logs} logs ({new_hot_logs} hot) to dataset {parent.dataset_id[:12]}, rescored {rescored} windows")
+
+    with dataset_windows_lock:
+        dataset_windows[child.dataset_id] = accumulator
+        _trim_cache(dataset_windows, max_dataset_windows, max_dataset_window_bytes)
+
+    return {
+        'new_logs': new_logs,
+        'new_hot_logs': new_hot_logs,
+        'rescored_windows': rescored,
+        'total_logs': accumulator.total_logs,
+        'top_windows': top_windows
+    }
+
+def _window_overview(window: LogWindow, sample_logs: int = 3) -> Dict[str, Any]:
+    """Compact view of a window: scores, summary and its first few distinct logs"""
+    return {
+        'trace_id': window.trace_id,
+        'start_time': window.start_time.isoformat() if window.start_time else None,
+        'end_time': window.end_time.isoformat() if window.end_time else None,
+        'importance_score': window.importance_score,
+        'summary': window.summary,
+        'log_count': sum(window.template_counts.values()),
+        'logs': [
+            {
+                'timestamp': log.timestamp_raw,
+                'service': log.service_name,
+                'severity': log.severity_text,
+                'status': log.status,
+                'message': log.body
+            }
+            for log in window.logs[:sample_logs]
+        ]
+    }
+
+def _dataset_metadata(store: ColumnarLogStore) -> Dict[str, Any]:
+    bounds = store.time_bounds() if store.vectorized else None
+    return {
+        'total_logs': len(store),
+        'services': len(store.services),
+        'first_timestamp_ns': bounds[0] if bounds else None,
+        'last_timestamp_ns': bounds[1] if bounds else None,
+        'indexed': store.vectorized
+    }
+
+def _load_persisted_store(dataset_id: str) -> Optional[ColumnarLogStore]:
+    index_path = dataset_registry.index_path(dataset_id)
+    if not os.path.isdir(index_path):
+        return None
+    try:
+        return ColumnarLogStore.load(index_path)
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring unreadable index for dataset {dataset_id[:12]}: {e}")
+        return None
+
+def _persist_store(store: ColumnarLogStore, dataset_id: str):
+    if not store.vectorized:
+        return
+    miner = filter_system.template_miner
+    template_texts = []
+    for template_hash in store.templates.values:
+        cluster = miner.get(int(template_hash)) if template_hash and template_hash.isdigit() else None
+        template_texts.append(cluster.template if cluster else None)
+    try:
+        store.save(dataset_registry.index_path(dataset_id), template_texts=template_texts)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not persist index for dataset {dataset_id[:12]}: {e}")
+
+def _filter_logs(query: str, log_path: str, max_windows: int = 10,
+                 logs_per_window: int = 3, dataset_id: Optional[str] = None,
+                 stats: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], int, int]:
+    """
+    Load, filter and condense logs into LLM-ready windows (runs in filter_executor)
+    Returns (windows, total logs loaded, logs kept); stats receives filter counts and stage timings
+    """
+    filter_stats: Dict[str, Any] = stats if stats is not None else {}
+    timings = filter_stats.setdefault('timings', {})
+
+    # Query criteria are answered from the store's inverted index
+    with timed(timings, 'load'):
+        store = _load_store(log_path, dataset_id, timings)
+    windows = filter_system.filter_store(store, query, max_windows=max_windows, stats=filter_stats)
+    total_logs_loaded = filter_stats['total_logs']
+    logger.info(f"Loaded {total_logs_loaded} logs from {log_path}")
+    if 'windowing' in filter_stats:
+        logger.info(f"Window coverage: {filter_stats['windowing']}")
+    
+    # Prepare LLM-ready data
+    llm_data = []
+    total_logs = 0
+    
+    for window in windows:
+        window_data = {
+            'summary': window.summary,
+            'trace_id': window.trace_id,
+            'importance_score': window.importance_score,
+            'prompt_match_score': window.prompt_match_score,
+            'logs': []
+        }
         
-        # Get conversation history
-        conversation_history = conversations.get(conversation_id, [])
+        # Include the most important logs from each window
+        important_logs = sorted(window.logs, key=lambda x: (x.severity_number or 0), reverse=True)[:logs_per_window]
+        total_logs += len(important_logs)
         
-        if is_first_analysis:
-            # First time - analyze logs with full context
-            logger.info("First analysis for this conversation - including log data")
-            llm_result = llm_service.analyze_logs(
-                filtered_windows=llm_data,
-                user_query=query,
-                conversation_history=conversation_history,
-                processing_summary=processing_summary
-            )
-            
-            # Store the analyzed log data for future reference
-            analyzed_conversations[conversation_id] = {
-                'log_summary': processing_summary,
-                'filtered_windows': llm_data,
-                'initial_analysis': llm_result["response"],
-                'total_logs_processed': len(logs)
-            }
-        else:
-            # Subsequent queries - just chat without re-analyzing logs
-            logger.info("Follow-up question - using cached log analysis")
-            llm_result = llm_service.chat_about_logs(
-                user_query=query,
-                conversation_history=conversation_history,
-                initial_analysis=analyzed_conversations[conversation_id]['initial_analysis'],
-                log_summary=analyzed_conversations[conversation_id]['log_summary']
-            )
+        for log in important_logs:
+            window_data['logs'].append({
+                'service': log.service_name,
+                'severity': log.severity_text or 'UNKNOWN',
+                'message': log.body[:500],  # trimmed further when the context is packed
+                'status': log.status,
+                'route': log.route,
+                'method': log.method,
+                'timestamp': log.timestamp_raw,
+                'trace_id': log.trace_id,
+                'template': log.template_hash
+            })
         
-        # Update conversation history
-        if conversation_id not in conversations:
-            conversations[conversation_id] = []
+        llm_data.append(window_data)
+
+    filter_stats['kept_logs'] = total_logs
+    return llm_data, total_logs_loaded, total_logs
+
+async def _prepare_analysis(query: str, conversation_id: Optional[str], log_path: Optional[str],
+                            mode: str = 'single', dataset_id: Optional[str] = None,
+                            timings: Optional[Dict[str, float]] = None) -> Dict[str, Any]:
+    """
+    Resolve the conversation and, on its first analysis, filter the logs
+    log_path is only read on the first analysis of a conversation; filter stage
+    seconds are added to timings
+    """
+    filter_stats = None
+    # Generate conversation ID if not provided (new conversation)
+    if not conversation_id:
+        conversation_id = str(uuid.uuid4())[:8]
+        logger.info(f"Generated new conversation ID: {conversation_id}")
+    
+    # Check if this conversation has already analyzed logs
+    cached_analysis = await run_in_threadpool(app_state.get_analysis, conversation_id)
+    is_first_analysis = cached_analysis is None
+    if is_first_analysis and not log_path:
+        raise HTTPException(status_code=400, detail="A log file is required for the first analysis")
+    
+    # Only process logs if this is the first analysis for this conversation
+    if is_first_analysis:
+        logger.info(f"First analysis for this conversation - processing logs ({mode} mode)")
         
-        conversations[conversation_id].extend([
-            {"role": "user", "content": query},
-            {"role": "assistant", "content": llm_result["response"]}
-        ])
+        limits = ANALYSIS_MODES[mode]
+        loop = asyncio.get_running_loop()
+        filter_stats = {'timings': timings if timings is not None else {}}
+        llm_data, total_logs_loaded, total_logs = await loop.run_in_executor(
+            filter_executor, _filter_logs, query, log_path, limits['max_windows'], limits['logs_per_window'],
+            dataset_id, filter_stats
+        )
         
-        # Keep conversation history reasonable (last 10 exchanges)
-        if len(conversations[conversation_id]) > 20:
-            conversations[conversation_id] = conversations[conversation_id][-20:]
+        # Calculate metrics
+        cost_reduction = (1 - total_logs / total_logs_loaded) * 100 if total_logs_loaded else 0
+        processing_summary = f"Filtered {total_logs_loaded} logs down to {total_logs} most relevant logs across {len(llm_data)} windows"
         
-        logger.info(f"LLM analysis complete: {llm_result['tokens_used']} tokens, ${llm_result['estimated_cost']:.4f}")
+        logger.info(f"Filtering complete: {cost_reduction:.1f}% cost reduction")
         
-        # Calculate total logs processed (different for first vs follow-up)
-        if is_first_analysis:
-            total_logs_processed = len(logs)
+    else:
+        logger.info("Follow-up question - using cached log analysis, skipping file processing")
+        # Use cached data
+        llm_data = cached_analysis['filtered_windows']
+        processing_summary = cached_analysis['log_summary']
+        # Set dummy metrics for follow-up questions
+        cost_reduction = 99.9
+        # For follow-up questions, use cached data
+        total_logs_loaded = cached_analysis.get('total_logs_processed', 10000)
+    
+    conversation_history = await run_in_threadpool(app_state.get_history, conversation_id)
+    return {
+        'conversation_id': conversation_id,
+        'is_first_analysis': is_first_analysis,
+        'mode': mode,
+        'llm_data': llm_data,
+        'processing_summary': processing_summary,
+        'cost_reduction': cost_reduction,
+        'total_logs_processed': total_logs_loaded,
+        'filter_stats': filter_stats,
+        'cached_analysis': cached_analysis,
+        'conversation_history': conversation_history
+    }
+
+def _llm_kwargs(analysis: Dict[str, Any], query: str) -> Dict[str, Any]:
+    """Arguments for LLMService.analyze_logs (first analysis) or chat_about_logs (follow-up)"""
+    if analysis['is_first_analysis']:
+        return {
+            'filtered_windows': analysis['llm_data'],
+            'user_query': query,
+            'conversation_history': analysis['conversation_history'],
+            'processing_summary': analysis['processing_summary']
+        }
+
+    cached = analysis['cached_analysis']
+    return {
+        'user_query': query,
+        'conversation_history': analysis['conversation_history'],
+        'initial_analysis': cached['initial_analysis'],
+        'log_summary': cached['log_summary']
+    }
+
+async def _record_analysis(analysis: Dict[str, Any], query: str, llm_result: Dict[str, Any],
+                           debug_info: Optional[Dict[str, Any]] = None) -> AnalysisResponse:
+    """Store the exchange in the conversation and build the response"""
+    conversation_id = analysis['conversation_id']
+    
+    cached_analysis = None
+    if analysis['is_first_analysis']:
+        # Store the analyzed log data for future reference
+        cached_analysis = {
+            'log_summary': analysis['processing_summary'],
+            'filtered_windows': analysis['llm_data'],
+            'initial_analysis': llm_result["response"],
+            'total_logs_processed': analysis['total_logs_processed']
+        }
+    
+    # Update conversation history (the store keeps the last 10 exchanges); the SQLite
+    # store may wait on another worker's write lock, so this runs off the event loop
+    await run_in_threadpool(app_state.record_exchange, conversation_id, query, llm_result["response"], cached_analysis)
+    
+    logger.info(f"LLM analysis complete: {llm_result['tokens_used']} tokens, ${llm_result['estimated_cost']:.4f}")
+    
+    return AnalysisResponse(
+        query=query,
+        response=llm_result["response"],
+        total_logs_processed=analysis['total_logs_processed'],
+        cost_reduction_percentage=round(analysis['cost_reduction'], 1),
+        processing_summary=analysis['processing_summary'],
+        llm_tokens_used=llm_result["tokens_used"],
+        llm_cost=round(llm_result["estimated_cost"], 4),
+        conversation_id=conversation_id,
+        cached=llm_result.get("cached", False),
+        llm_stages=llm_result.get("stages"),
+        context_budget=llm_result.get("context_budget"),
+        debug=debug_info
+    )
+
+def _finish_metrics(analysis: Dict[str, Any], llm_result: Dict[str, Any], timings: Dict[str, float],
+                    started: float, debug: bool) -> Optional[Dict[str, Any]]:
+    """Record the request's stage timings, counts and LLM usage; returns the debug breakdown if asked for"""
+    timings.update(llm_result.get("timings", {}))
+    timings['total'] = time.perf_counter() - started
+    breakdown = request_breakdown(timings, analysis['filter_stats'], llm_result)
+    kind = 'first' if analysis['is_first_analysis'] else 'follow_up'
+    pipeline_metrics.record_request(breakdown, analysis['mode'], kind)
+    return debug_view(breakdown) if debug else None
+
+async def _analysis_kind(conversation_id: Optional[str]) -> str:
+    return 'follow_up' if await run_in_threadpool(app_state.has_analysis, conversation_id) else 'first'
+
+async def _run_analysis(query: str, conversation_id: Optional[str], log_path: Optional[str],
+                        mode: str = 'single', dataset_id: Optional[str] = None,
+                        debug: bool = False) -> AnalysisResponse:
+    """Shared analysis flow for uploads and registered datasets"""
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+    kind = await _analysis_kind(conversation_id)
+    try:
+        analysis = await _prepare_analysis(query, conversation_id, log_path, mode, dataset_id, timings)
+        
+        if analysis['is_first_analysis'] and mode == 'map_reduce':
+            logger.info("First analysis for this conversation - map-reduce over log windows")
+            llm_result = await llm_service.map_reduce_analyze(**_llm_kwargs(analysis, query))
+        elif analysis['is_first_analysis']:
+            # First time - analyze logs with full context
+            logger.info("First analysis for this conversation - including log data")
+            llm_result = await llm_service.analyze_logs(**_llm_kwargs(analysis, query))
         else:
-            # For follow-up questions, use cached data
-            total_logs_processed = analyzed_conversations[conversation_id].get('total_logs_processed', 10000)
+            # Subsequent queries - just chat without re-analyzing logs
+            logger.info("Follow-up question - using cached log analysis")
+            llm_result = await llm_service.chat_about_logs(**_llm_kwargs(analysis, query))
         
-        return AnalysisResponse(
-            query=query,
-            response=llm_result["response"],
-            total_logs_processed=total_logs_processed,
-            cost_reduction_percentage=round(cost_reduction, 1),
-            processing_summary=processing_summary,
-            llm_tokens_used=llm_result["tokens_used"],
-            llm_cost=round(llm_result["estimated_cost"], 4),
-            conversation_id=conversation_id
-        )
+        debug_info = _finish_metrics(analysis, llm_result, timings, started, debug)
+        return await _record_analysis(analysis, query, llm_result, debug_info)
         
+    except HTTPException:
+        pipeline_metrics.record_error(mode, kind)
+        raise
     except Exception as e:
+        pipeline_metrics.record_error(mode, kind)
         logger.error(f"Error processing logs: {str(e)}")
-        # Clean up temp file if it exists
-        if 'temp_file_path' in locals():
-            try:
-                os.unlink(temp_file_path)
-            except:
-                pass
-        
         raise HTTPException(
             status_code=500,
             detail=f"Error processing logs: {str(e)}"
         )
 
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _stream_analysis(query: str, conversation_id: Optional[str], log_path: Optional[str],
+                           mode: str = 'single', dataset_id: Optional[str] = None, debug: bool = False,
+                           cleanup_path: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    SSE events for one analysis: 'progress' while filtering (and per map batch),
+    'delta' per response token chunk, then 'complete' with the AnalysisResponse fields (or 'error')
+    cleanup_path is deleted once the stream ends
+    """
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+    kind = await _analysis_kind(conversation_id)
+    try:
+        yield _sse_event("progress", {"stage": "filtering" if log_path else "preparing"})
+        analysis = await _prepare_analysis(query, conversation_id, log_path, mode, dataset_id, timings)
+        yield _sse_event("progress", {
+            "stage": "analyzing",
+            "conversation_id": analysis['conversation_id'],
+            "processing_summary": analysis['processing_summary'],
+            "total_logs_processed": analysis['total_logs_processed']
+        })
+        
+        if analysis['is_first_analysis'] and mode == 'map_reduce':
+            events = llm_service.stream_map_reduce_analyze(**_llm_kwargs(analysis, query))
+        elif analysis['is_first_analysis']:
+            events = llm_service.stream_analyze_logs(**_llm_kwargs(analysis, query))
+        else:
+            events = llm_service.stream_chat_about_logs(**_llm_kwargs(analysis, query))
+        
+        llm_result = None
+        async for event in events:
+            if event["type"] == "delta":
+                yield _sse_event("delta", {"content": event["content"]})
+            elif event["type"] == "progress":
+                yield _sse_event("progress", {k: v for k, v in event.items() if k != "type"})
+            else:
+                llm_result = event
+        
+        debug_info = _finish_metrics(analysis, llm_result, timings, started, debug)
+        response = await _record_analysis(analysis, query, llm_result, debug_info)
+        yield _sse_event("complete", response.model_dump())
+        
+    except HTTPException as e:
+        pipeline_metrics.record_error(mode, kind)
+        yield _sse_event("error", {"status_code": e.status_code, "detail": e.detail})
+    except Exception as e:
+        pipeline_metrics.record_error(mode, kind)
+        logger.error(f"Error streaming analysis: {str(e)}")
+        yield _sse_event("error", {"status_code": 500, "detail": f"Error processing logs: {str(e)}"})
+    finally:
+        if cleanup_path and os.path.exists(cleanup_path):
+            os.unlink(cleanup_path)
+
+def _sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        # Disable proxy buffering so the first event reaches the client immediately
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of stage latencies, LLM tokens/cost and request counts"""
+    # Gauges read the state store, which may be SQLite
+    text = await run_in_threadpool(pipeline_metrics.render)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health_check():
     """Detailed health check"""
     return {
         "status": "healthy",
         "filter_system": "initialized",
-        "endpoints": ["/", "/analyze-logs", "/health"]
+        "llm_cache": llm_service.cache.stats(),
+        "state": await run_in_threadpool(app_state.stats),
+        "live_streams": len(live_streams),
+        "endpoints": [
+            "/", "/analyze-logs", "/analyze-logs/stream", "/datasets", "/datasets/{dataset_id}/append",
+            "/datasets/{dataset_id}/analyze", "/datasets/{dataset_id}/analyze/stream", "/health", "/metrics",
+            "/streams/{stream_id}/ingest", "/streams/{stream_id}/windows"
+        ]
     }
 
 if __name__ == "__main__":
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Pipeline metrics
+Stage latency, token and cost histograms plus request and log counters, kept in
+process and rendered in the Prometheus text exposition format for GET /metrics.
+Stages record their durations into a plain dict (see timed()), so the same
+numbers also make up the per-request debug breakdown.
+"""
+
+import math
+import os
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows: peak RSS is not reported
+    resource = None
+
+# Seconds; covers cached follow-ups (ms) up to multi-minute map-reduce analyses
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+TOKEN_BUCKETS = (100, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+COST_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+
+# Pipeline stages in execution order. 'load' covers getting the indexed store
+# (and includes 'parse' and 'normalize' when the file is ingested); 'llm' is the
+# model round trip, split into 'llm_map' / 'llm_reduce' for map-reduce analyses
+STAGES = (
+    'load', 'parse', 'normalize', 'time_range', 'prefilter', 'windowing', 'dedup', 'scoring',
+    'summaries', 'context_build', 'llm', 'llm_first_token', 'llm_map', 'llm_reduce', 'total'
+)
+
+LabelValues = Tuple[str, ...]
+
+
+@contextmanager
+def timed(timings: Optional[Dict[str, float]], stage: str):
+    """Add the block's wall time to timings[stage]; no-op when timings is None"""
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+def timed_iter(items: Iterable[Any], timings: Dict[str, float], stage: str) -> Iterator[Any]:
+    """Yield from items, adding only the time spent producing them to timings[stage]"""
+    clock = time.perf_counter
+    iterator = iter(items)
+    elapsed = 0.0
+    try:
+        while True:
+            start = clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                elapsed += clock() - start
+                return
+            elapsed += clock() - start
+            yield item
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def resident_memory_bytes() -> Optional[int]:
+    """Current RSS (Linux /proc), else None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def peak_memory_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: LabelValues, extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Metric(ABC):
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return lines
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Exposition lines for this metric's values"""
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self.values.items())
+        return [f'{self.name}{_labels(self.labelnames, key)} {_format_value(value)}' for key, value in items]
+
+
+class Gauge(Metric):
+    """Value read from a callback at scrape time (kind='counter' for totals kept elsewhere)"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], Optional[float]], kind: str = 'gauge'):
+        super().__init__(name, documentation)
+        self.read = read
+        self.kind = kind
+
+    def _samples(self) -> List[str]:
+        value = self.read()
+        return [] if value is None else [f'{self.name} {_format_value(value)}']
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Per label set: [non-cumulative bucket counts, sum, count]
+        self.values: Dict[LabelValues, List[Any]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = next(i for i, bound in enumerate(self.buckets) if value <= bound)
+        with self._lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * len(self.buckets), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, [list(state[0]), state[1], state[2]]) for key, state in self.values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, key)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, key)} {count}')
+        return lines
+
+
+class PipelineMetrics:
+    """Process-wide analysis metrics; record_request() takes one request's breakdown"""
+
+    def __init__(self):
+        self.metrics: List[Metric] = []
+        self.stage_seconds = self._add(Histogram(
+            'log_analysis_stage_seconds', 'Wall time per analysis pipeline stage', ('stage', 'mode')
+        ))
+        self.requests = self._add(Counter(
+            'log_analysis_requests_total', 'Analysis requests by mode, kind and outcome', ('mode', 'kind', 'status')
+        ))
+        self.logs = self._add(Counter(
+            'log_analysis_logs_total', 'Logs seen per filtering step (loaded, hot, kept for the LLM)', ('step',)
+        ))
+        self.tokens = self._add(Histogram(
+            'log_analysis_llm_tokens', 'LLM tokens per analysis request', ('direction',), TOKEN_BUCKETS
+        ))
+        self.cost = self._add(Histogram(
+            'log_analysis_llm_cost_dollars', 'Estimated LLM cost per analysis request', (), COST_BUCKETS
+        ))
+        self.cache_hits = self._add(Counter(
+            'log_analysis_llm_cached_responses_total', 'Analyses answered from the LLM response cache'
+        ))
+        self._add(Gauge('process_resident_memory_bytes', 'Resident memory size in bytes', resident_memory_bytes))
+        self._add(Gauge('process_peak_resident_memory_bytes', 'Peak resident memory size in bytes', peak_memory_bytes))
+
+    def _add(self, metric: Metric) -> Any:
+        self.metrics.append(metric)
+        return metric
+
+    def add_gauge(self, name: str, documentation: str, read: Callable[[], Optional[float]], kind: str = 'gauge'):
+        self._add(Gauge(name, documentation, read, kind))
+
+    def record_request(self, breakdown: Dict[str, Any], mode: str, kind: str):
+        """Observe a successful request's breakdown (see request_breakdown())"""
+        for stage, seconds in breakdown['stages'].items():
+            self.stage_seconds.observe(seconds, stage=stage, mode=mode)
+        for step, count in breakdown['logs'].items():
+            self.logs.inc(count, step=step)
+        llm = breakdown['llm']
+        if llm:
+            self.tokens.observe(llm['input_tokens'], direction='input')
+            self.tokens.observe(llm['output_tokens'], direction='output')
+            self.cost.observe(llm['estimated_cost'])
+            if llm['cached']:
+                self.cache_hits.inc()
+        self.requests.inc(mode=mode, kind=kind, status='ok')
+
+    def record_error(self, mode: str, kind: str):
+        self.requests.inc(mode=mode, kind=kind, status='error')
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def request_breakdown(timings: Dict[str, float], filter_stats: Optional[Dict[str, Any]],
+                      llm_result: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    One request's stages (seconds, in pipeline order), log counts, LLM usage and
+    process memory; the debug response shows the same with stages in ms
+    """
+    stages = {stage: timings[stage] for stage in STAGES if stage in timings}
+    stages.update({stage: seconds for stage, seconds in timings.items() if stage not in stages})
+
+    logs = {}
+    if filter_stats:
+        if 'total_logs' in filter_stats:
+            logs['loaded'] = filter_stats['total_logs']
+        if 'time_range' in filter_stats:
+            logs['time_range'] = filter_stats['time_range']['logs']
+        for step in ('hot', 'kept'):
+            if f'{step}_logs' in filter_stats:
+                logs[step] = filter_stats[f'{step}_logs']
+
+    llm = {}
+    if llm_result:
+        llm = {
+            'input_tokens': llm_result.get('input_tokens', 0),
+            'output_tokens': llm_result.get('output_tokens', 0),
+            'estimated_cost': llm_result.get('estimated_cost', 0.0),
+            'cached': llm_result.get('cached', False)
+        }
+
+    return {
+        'stages': stages,
+        'logs': logs,
+        'windowing': (filter_stats or {}).get('windowing'),
+        'llm': llm,
+        'memory': {'rss_bytes': resident_memory_bytes(), 'peak_rss_bytes': peak_memory_bytes()}
+    }
+
+
+def debug_view(breakdown: Dict[str, Any]) -> Dict[str, Any]:
+    """Breakdown as attached to responses: stage durations in milliseconds"""
+    return {
+        **breakdown,
+        'stages': {stage: round(seconds * 1000, 3) for stage, seconds in breakdown['stages'].items()}
+    }
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Parallel log ingestion
+Splits large NDJSON files into newline-aligned byte ranges and parses/normalizes
+them in a process pool. Chunks are consumed in file order as they complete, with
+a bounded number in flight, so memory stays flat and the order matches a serial load.
+Workers also mask template variables and dedupe the masked bodies; the parent only
+mines each distinct masked body once per chunk, so template ids come from one miner
+and match a serial load.
+"""
+
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Dict, Optional, Iterator, Tuple
+
+from enhanced_log_filter import EnhancedLogFilter, LogEntry
+
+logger = logging.getLogger(__name__)
+
+# Compact per-entry row returned by workers (the raw dict is not sent back):
+# (timestamp_ns, timestamp_raw, severity_text, severity_number, trace_id,
+#  span_id, status, route, method, body, service_name, features, masked_index)
+CompactRow = Tuple
+
+# One worker result: (rows, distinct masked bodies, first body per masked body,
+# rows per masked body, seconds parsing, seconds normalizing)
+ChunkResult = Tuple[List[CompactRow], List[str], List[str], List[int], float, float]
+
+# Filter instance owned by each worker process
+_worker_filter: Optional[EnhancedLogFilter] = None
+
+
+def _init_worker():
+    global _worker_filter
+    _worker_filter = EnhancedLogFilter()
+
+
+def _normalize_range(file_path: str, start: int, end: int) -> ChunkResult:
+    """Parse and normalize the NDJSON lines in [start, end), in file order"""
+    log_filter = _worker_filter or EnhancedLogFilter()
+    log_filter.timestamp_parser.reset()
+    mask = log_filter.template_miner.mask
+    clock = time.perf_counter
+    parse_seconds = normalize_seconds = 0.0
+
+    started = clock()
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    parse_seconds += clock() - started
+
+    rows = []
+    masked_index: Dict[str, int] = {}
+    examples: List[str] = []
+    counts: List[int] = []
+    for line in data.splitlines():
+        started = clock()
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        parsed = clock()
+        parse_seconds += parsed - started
+
+        entry = log_filter.normalize_log_entry(record, assign_template=False)
+        masked_body = mask(entry.body)
+        index = masked_index.get(masked_body)
+        if index is None:
+            index = masked_index[masked_body] = len(examples)
+            examples.append(entry.body)
+            counts.append(0)
+        counts[index] += 1
+        rows.append((
+            entry.timestamp_ns, entry.timestamp_raw,
+            entry.severity_text, entry.severity_number, entry.trace_id, entry.span_id,
+            entry.status, entry.route, entry.method, entry.body, entry.service_name,
+            entry.features, index
+        ))
+        normalize_seconds += clock() - parsed
+
+    # Dicts keep insertion order, i.e. the first occurrence order within the chunk
+    return rows, list(masked_index), examples, counts, parse_seconds, normalize_seconds
+
+
+class ParallelLogLoader:
+    def __init__(self, log_filter: EnhancedLogFilter, workers: Optional[int] = None,
+                 min_parallel_bytes: int = 16 << 20, max_chunk_bytes: int = 16 << 20):
+        """
+        Args:
+            log_filter: Filter used for serial fallback and template mining
+            workers: Process count (default: INGEST_WORKERS env var, else CPU count)
+            min_parallel_bytes: Smaller files are loaded serially
+            max_chunk_bytes: Upper bound on the byte range handed to one task;
+                at most 2 * workers chunks are in flight at once
+        """
+        self.log_filter = log_filter
+        self.workers = workers or int(os.getenv('INGEST_WORKERS') or 0) or os.cpu_count() or 1
+        self.min_parallel_bytes = min_parallel_bytes
+        self.max_chunk_bytes = max_chunk_bytes
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def load_logs(self, file_path: str) -> List[LogEntry]:
+        return list(self.iter_logs(file_path))
+
+    def iter_logs(self, file_path: str, timings: Optional[Dict[str, float]] = None) -> Iterator[LogEntry]:
+        """
+        Normalized logs from a file, in parallel when it is worth it
+
+        Logs come back in file order either way. Small files, JSON arrays and
+        single-worker setups use the serial EnhancedLogFilter.iter_logs().
+        A timings dict receives 'parse' and 'normalize' seconds (wall time).
+        """
+        if not self._should_parallelize(file_path):
+            return self.log_filter.iter_logs(file_path, timings=timings)
+        return self._iter_parallel(file_path, timings)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _should_parallelize(self, file_path: str) -> bool:
+        if self.workers <= 1 or os.path.getsize(file_path) < self.min_parallel_bytes:
+            return False
+
+        # Only NDJSON splits on newlines; JSON arrays stay serial
+        with open(file_path, 'r') as f:
+            return self.log_filter._peek_first_char(f) != '['
+
+    def plan_byte_ranges(self, file_path: str) -> List[Tuple[int, int]]:
+        """Split a file into roughly equal byte ranges that start and end on line boundaries"""
+        size = os.path.getsize(file_path)
+        chunk_count = max(self.workers * 4, -(-size // self.max_chunk_bytes))
+        chunk_count = max(1, min(chunk_count, size))
+
+        boundaries = [0]
+        with open(file_path, 'rb') as f:
+            for i in range(1, chunk_count):
+                target = size * i // chunk_count
+                if target <= boundaries[-1]:
+                    continue
+                # Advance to just past the next newline at or after target - 1
+                f.seek(target - 1)
+                f.readline()
+                boundary = f.tell()
+                if boundaries[-1] < boundary < size:
+                    boundaries.append(boundary)
+        boundaries.append(size)
+
+        return list(zip(boundaries[:-1], boundaries[1:]))
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn: forking a threaded server process is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker
+                )
+            return self._pool
+
+    def _iter_parallel(self, file_path: str, timings: Optional[Dict[str, float]] = None) -> Iterator[LogEntry]:
+        start_time = time.time()
+        ranges = self.plan_byte_ranges(file_path)
+        total = 0
+        try:
+            for result in self._chunk_results(file_path, ranges, timings):
+                entries = self._chunk_entries(result, timings)
+                total += len(entries)
+                yield from entries
+        except BrokenProcessPool as e:
+            self._pool = None
+            if total:
+                raise
+            logger.warning(f"Ingest worker pool failed ({e}), falling back to serial load")
+            yield from self.log_filter.iter_logs(file_path, timings=timings)
+            return
+
+        logger.info(
+            f"Parallel ingest: {total} logs from {len(ranges)} chunks on {self.workers} workers "
+            f"in {time.time() - start_time:.2f}s"
+        )
+
+    def _chunk_results(self, file_path: str, ranges: List[Tuple[int, int]],
+                       timings: Optional[Dict[str, float]] = None) -> Iterator[ChunkResult]:
+        """Worker results in range order, keeping at most 2 * workers chunks in flight"""
+        pool = self._get_pool()
+        pending = deque()
+        remaining = iter(ranges)
+        for start, end in remaining:
+            pending.append(pool.submit(_normalize_range, file_path, start, end))
+            if len(pending) >= self.workers * 2:
+                break
+
+        try:
+            while pending:
+                started = time.perf_counter()
+                result = pending.popleft().result()
+                waited = time.perf_counter() - started
+                for start, end in remaining:
+                    pending.append(pool.submit(_normalize_range, file_path, start, end))
+                    break
+
+                if timings is not None:
+                    # Workers overlap, so time spent waiting on them is split by their parse/normalize shares
+                    worker_seconds = result[4] + result[5]
+                    parse_share = result[4] / worker_seconds if worker_seconds else 0.0
+                    timings['parse'] = timings.get('parse', 0.0) + waited * parse_share
+                    timings['normalize'] = timings.get('normalize', 0.0) + waited * (1 - parse_share)
+                yield result
+        finally:
+            # An abandoned iteration should not leave queued chunks running
+            for future in pending:
+                future.cancel()
+
+    def _chunk_entries(self, result: ChunkResult, timings: Optional[Dict[str, float]] = None) -> List[LogEntry]:
+        """Log entries for one chunk, with template ids from the parent's miner"""
+        started = time.perf_counter()
+        rows, masked_bodies, examples, counts = result[:4]
+        miner = self.log_filter.template_miner
+        # Chunks arrive in file order and each masked body is mined at its first
+        # occurrence, so the tree evolves exactly as in a serial load
+        template_ids = [
+            miner.add_masked(masked_body, example, count).cluster_id
+            for masked_body, example, count in zip(masked_bodies, examples, counts)
+        ]
+
+        entries = []
+        for row in rows:
+            (timestamp_ns, timestamp_raw, severity_text, severity_number, trace_id, span_id,
+             status, route, method, body, service_name, features, masked_index) = row
+            entry = LogEntry(
+                raw={},
+                timestamp_ns=timestamp_ns,
+                timestamp_raw=timestamp_raw,
+                severity_text=severity_text,
+                severity_number=severity_number,
+                trace_id=trace_id,
+                span_id=span_id,
+                status=status,
+                route=route,
+                method=method,
+                body=body,
+                service_name=service_name,
+                features=features
+            )
+            entry.is_hot = self.log_filter._is_hot_event(entry)
+            entry.template_id = template_ids[masked_index]
+            entry.template_hash = str(entry.template_id)
+            entries.append(entry)
+
+        if timings is not None:
+            timings['normalize'] = timings.get('normalize', 0.0) + time.perf_counter() - started
+        return entries
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+BM25 relevance ranking
+Scores windows (as documents) against the query's terms: each keyword plus the
+service, route, method and status criteria from parse_query_advanced. A term's
+weight is its inverse document frequency over the dataset's logs, so rare,
+discriminating words outrank ones that match almost every log.
+"""
+
+import math
+import os
+from typing import List, Dict, Any, Hashable, Iterable, Iterator, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # the object pipeline scores windows one by one
+    np = None
+
+from log_index import TOKEN_PATTERN, keyword_in_body
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Scale of the BM25 score next to importance_score (a window fully matching one
+# rare term gets about (K1 + 1) * idf * RELEVANCE_WEIGHT)
+RELEVANCE_WEIGHT = float(os.getenv('RELEVANCE_WEIGHT', '25'))
+
+# Bound on a TermStats cache; it is cleared when full
+MAX_CACHED_TERMS = 10000
+
+
+def query_terms(criteria: Dict[str, Any]) -> List[str]:
+    """Term names for parsed query criteria, as keyed by InvertedLogIndex.match_rows()"""
+    terms = [name for name in ('services', 'routes', 'methods', 'status_codes') if criteria[name]]
+    terms.extend(f'keyword:{keyword}' for keyword in dict.fromkeys(criteria['keywords']))
+    return terms
+
+
+def log_terms(log: Any, criteria: Dict[str, Any], terms: List[str]) -> Iterator[str]:
+    """The terms a LogEntry matches (substring matches for services and routes, keyword_in_body for keywords)"""
+    body = None
+    for term in terms:
+        if term == 'services':
+            matched = any(service in log.service_name for service in criteria['services'])
+        elif term == 'routes':
+            matched = bool(log.route) and any(route in log.route for route in criteria['routes'])
+        elif term == 'methods':
+            matched = log.method in criteria['methods']
+        elif term == 'status_codes':
+            matched = log.status in criteria['status_codes']
+        else:
+            if body is None:
+                body = log.body.lower()
+            matched = keyword_in_body(term[8:], body)
+        if matched:
+            yield term
+
+
+def token_count(body: str) -> int:
+    """Document length of one log: its \\w+ tokens, as indexed by InvertedLogIndex"""
+    return len(TOKEN_PATTERN.findall(body))
+
+
+def idf(documents: int, document_frequency: float) -> float:
+    """BM25 inverse document frequency (the +1 form, never negative)"""
+    return math.log(1.0 + (documents - document_frequency + 0.5) / (document_frequency + 0.5))
+
+
+def idf_array(documents: int, document_frequencies: 'np.ndarray') -> 'np.ndarray':
+    """idf() over an array of document frequencies"""
+    frequencies = np.asarray(document_frequencies, dtype=np.float64)
+    return np.log1p((documents - frequencies + 0.5) / (frequencies + 0.5))
+
+
+class TermStats:
+    """
+    Document frequencies of a query's terms over a stream of logs (for pipelines without an index)
+
+    cache maps terms to (documents, frequency) from earlier full passes over the
+    same logs (e.g. ColumnarLogStore.term_frequencies); only terms missing from
+    it are counted, and they are added once a pass completes.
+    """
+
+    def __init__(self, criteria: Dict[str, Any], cache: Optional[Dict[Hashable, Tuple[int, int]]] = None):
+        self.criteria = criteria
+        self.terms = query_terms(criteria)
+        self.cache = cache if cache is not None else {}
+        self.documents = 0
+        self.document_frequencies = {term: 0 for term in self.terms}
+
+    @property
+    def pending(self) -> List[str]:
+        """Terms the cache has no frequency for"""
+        return [term for term in self.terms if self._key(term) not in self.cache]
+
+    def count(self, logs: Iterable[Any]) -> Iterator[Any]:
+        """Pass logs through, counting the documents each pending term occurs in"""
+        pending = self.pending
+        if not pending:
+            yield from logs
+            return
+
+        frequencies = self.document_frequencies
+        for log in logs:
+            self.documents += 1
+            for term in log_terms(log, self.criteria, pending):
+                frequencies[term] += 1
+            yield log
+
+        if len(self.cache) >= MAX_CACHED_TERMS:
+            self.cache.clear()
+        for term in pending:
+            self.cache[self._key(term)] = (self.documents, frequencies[term])
+
+    def idf(self) -> Dict[str, float]:
+        term_idf = {}
+        for term in self.terms:
+            documents, frequency = self.cache.get(self._key(term), (self.documents, self.document_frequencies[term]))
+            term_idf[term] = idf(documents, frequency)
+        return term_idf
+
+    def _key(self, term: str) -> Hashable:
+        """Cache key: keyword terms name themselves, field terms depend on the query's values"""
+        if term.startswith('keyword:'):
+            return term
+        return term, tuple(sorted(map(str, self.criteria[term])))
+
+
+def bm25(term_counts: Dict[str, int], term_idf: Dict[str, float], length: float, average_length: float,
+         k1: float = BM25_K1, b: float = BM25_B) -> float:
+    """BM25 score of one document from its term counts"""
+    norm = k1 * (1 - b + b * length / average_length) if average_length > 0 else k1
+    score = 0.0
+    for term, count in term_counts.items():
+        score += term_idf[term] * count * (k1 + 1) / (count + norm)
+    return score
+
+
+def bm25_sparse(documents: 'np.ndarray', terms: 'np.ndarray', counts: 'np.ndarray', term_idf: 'np.ndarray',
+                lengths: 'np.ndarray', k1: float = BM25_K1, b: float = BM25_B) -> 'np.ndarray':
+    """
+    BM25 scores for every document from sparse (document, term, count) triples
+
+    lengths holds each document's length (one entry per document); the average
+    is taken over them
+    """
+    average_length = float(lengths.mean()) if len(lengths) else 0.0
+    if average_length > 0:
+        norm = k1 * (1 - b + b * lengths / average_length)
+    else:
+        norm = np.full(len(lengths), k1)
+    counts = counts.astype(np.float64)
+    contributions = term_idf[terms] * counts * (k1 + 1) / (counts + norm[documents])
+    return np.bincount(documents, weights=contributions, minlength=len(lengths))
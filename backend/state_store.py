@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Conversation and dataset state
+Keeps each conversation's message history and cached first analysis (filtered
+windows, summary, initial response) plus per-dataset metadata, with idle
+expiry and an entry-count and byte budget so long-running servers do not grow
+without bound. The in-memory store is per process; the SQLite store (WAL) is
+shared by every worker on the node, so a follow-up can land on any of them.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+STATE_BACKENDS = ('memory', 'sqlite')
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate resident bytes of a JSON-like value (containers plus their contents)"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += estimate_size(key) + estimate_size(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += estimate_size(item)
+    return size
+
+
+@dataclass
+class ConversationState:
+    history: List[Dict[str, str]] = field(default_factory=list)
+    analysis: Optional[Dict[str, Any]] = None
+    analysis_bytes: int = 0
+    history_bytes: int = 0
+    accessed_at: float = 0.0
+
+    @property
+    def size(self) -> int:
+        return self.analysis_bytes + self.history_bytes
+
+
+class StateStore(ABC):
+    """Conversation history, cached analyses and dataset metadata (see MemoryStateStore, SQLiteStateStore)"""
+    backend = 'none'
+
+    def __init__(self, max_bytes: Optional[int] = None, ttl_seconds: Optional[float] = None,
+                 max_conversations: Optional[int] = None, max_history_messages: int = 20):
+        """
+        Args:
+            max_bytes: Budget for the estimated size of all state (default: CONVERSATION_MAX_BYTES env var, else 256 MB)
+            ttl_seconds: Idle time after which a conversation is dropped (default: CONVERSATION_TTL env var, else 24h)
+            max_conversations: Entry cap (default: MAX_CONVERSATIONS env var, else 10000)
+            max_history_messages: Messages of history kept per conversation (the last 10 exchanges)
+        """
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv('CONVERSATION_MAX_BYTES', 256 << 20))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else float(os.getenv('CONVERSATION_TTL', 24 * 3600))
+        self.max_conversations = max_conversations or int(os.getenv('MAX_CONVERSATIONS', '10000'))
+        self.max_history_messages = max_history_messages
+        self._lock = threading.Lock()
+        # Per process, also for the shared SQLite store
+        self.counters = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0}
+
+    @abstractmethod
+    def get_analysis(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        """Cached first analysis of a conversation (None if there is none or it was evicted)"""
+
+    @abstractmethod
+    def has_analysis(self, conversation_id: Optional[str]) -> bool:
+        """True if the conversation has a cached first analysis"""
+
+    @abstractmethod
+    def get_history(self, conversation_id: str) -> List[Dict[str, str]]:
+        """Message history of a conversation, oldest first"""
+
+    @abstractmethod
+    def record_exchange(self, conversation_id: str, query: str, response: str,
+                        analysis: Optional[Dict[str, Any]] = None):
+        """Append a question/answer pair (keeping the last max_history_messages) and, on a first analysis, its cached state"""
+
+    @abstractmethod
+    def get_dataset(self, dataset_id: str) -> Optional[Dict[str, Any]]:
+        """Metadata recorded for a dataset by put_dataset(), or None"""
+
+    @abstractmethod
+    def put_dataset(self, dataset_id: str, metadata: Dict[str, Any]):
+        """Record metadata for a dataset"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Counters and sizes for /health"""
+
+    def close(self):
+        pass
+
+    def _append_exchange(self, history: List[Dict[str, str]], query: str, response: str) -> List[Dict[str, str]]:
+        history = history + [
+            {"role": "user", "content": query},
+            {"role": "assistant", "content": response}
+        ]
+        return history[-self.max_history_messages:]
+
+    def _stats(self, conversations: int, analyses: int, stored_bytes: int) -> Dict[str, Any]:
+        lookups = self.counters['hits'] + self.counters['misses']
+        return {
+            'backend': self.backend,
+            **self.counters,
+            'hit_rate': round(self.counters['hits'] / lookups, 3) if lookups else 0.0,
+            'conversations': conversations,
+            'analyses': analyses,
+            'resident_bytes': stored_bytes,
+            'max_bytes': self.max_bytes
+        }
+
+
+class MemoryStateStore(StateStore):
+    """Per-process LRU (the default); state is lost on restart and not shared between workers"""
+    backend = 'memory'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Least recently used first
+        self._entries: "OrderedDict[str, ConversationState]" = OrderedDict()
+        self._bytes = 0
+        self._datasets: Dict[str, Dict[str, Any]] = {}
+
+    def get_analysis(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            state = self._touch(conversation_id)
+            if state is None or state.analysis is None:
+                self.counters['misses'] += 1
+                return None
+            self.counters['hits'] += 1
+            return state.analysis
+
+    def has_analysis(self, conversation_id: Optional[str]) -> bool:
+        if not conversation_id:
+            return False
+        with self._lock:
+            state = self._live(conversation_id, time.time())
+            return state is not None and state.analysis is not None
+
+    def get_history(self, conversation_id: str) -> List[Dict[str, str]]:
+        with self._lock:
+            state = self._touch(conversation_id)
+            return list(state.history) if state is not None else []
+
+    def record_exchange(self, conversation_id: str, query: str, response: str,
+                        analysis: Optional[Dict[str, Any]] = None):
+        now = time.time()
+        with self._lock:
+            state = self._live(conversation_id, now)
+            if state is None:
+                state = self._entries[conversation_id] = ConversationState()
+            self._bytes -= state.size
+
+            if analysis is not None:
+                state.analysis = analysis
+                state.analysis_bytes = estimate_size(analysis)
+            state.history = self._append_exchange(state.history, query, response)
+            state.history_bytes = estimate_size(state.history)
+
+            state.accessed_at = now
+            self._entries.move_to_end(conversation_id)
+            self._bytes += state.size
+            self._evict(now)
+
+    def get_dataset(self, dataset_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._datasets.get(dataset_id)
+
+    def put_dataset(self, dataset_id: str, metadata: Dict[str, Any]):
+        with self._lock:
+            self._datasets[dataset_id] = metadata
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._evict(time.time())
+            analyses = sum(1 for state in self._entries.values() if state.analysis is not None)
+            return self._stats(len(self._entries), analyses, self._bytes)
+
+    def _live(self, conversation_id: str, now: float) -> Optional[ConversationState]:
+        state = self._entries.get(conversation_id)
+        if state is not None and now - state.accessed_at > self.ttl_seconds:
+            self._drop(conversation_id, 'expired')
+            return None
+        return state
+
+    def _touch(self, conversation_id: str) -> Optional[ConversationState]:
+        now = time.time()
+        state = self._live(conversation_id, now)
+        if state is not None:
+            state.accessed_at = now
+            self._entries.move_to_end(conversation_id)
+        return state
+
+    def _drop(self, conversation_id: str, reason: str):
+        state = self._entries.pop(conversation_id)
+        self._bytes -= state.size
+        self.counters[reason] += 1
+
+    def _evict(self, now: float):
+        """Drop idle conversations, then least recently used ones until under both caps (the newest is always kept)"""
+        expired_before = now - self.ttl_seconds
+        while self._entries:
+            conversation_id, state = next(iter(self._entries.items()))
+            if state.accessed_at >= expired_before:
+                break
+            self._drop(conversation_id, 'expired')
+
+        evicted = 0
+        while len(self._entries) > 1 and (self._bytes > self.max_bytes or len(self._entries) > self.max_conversations):
+            self._drop(next(iter(self._entries)), 'evicted')
+            evicted += 1
+        if evicted:
+            logger.info(f"Conversation store evicted {evicted} conversations ({self._bytes} bytes remain)")
+
+
+class SQLiteStateStore(StateStore):
+    """
+    State in one SQLite file (WAL mode) shared by all worker processes on a node
+    Sizes are the stored JSON lengths; read-modify-write updates run in
+    BEGIN IMMEDIATE transactions so concurrent workers never lose an exchange
+    """
+    backend = 'sqlite'
+
+    def __init__(self, db_path: Optional[str] = None, busy_timeout: float = 30.0,
+                 size_sync_seconds: float = 60.0, **kwargs):
+        """
+        Args:
+            db_path: SQLite file (default: STATE_DB_PATH env var, else a temp dir file)
+            busy_timeout: Seconds to wait for another worker's write lock
+            size_sync_seconds: The running conversation count and size are re-read from SQLite
+                (and idle conversations deleted) at least this often, since other workers share the file
+            **kwargs: Limits, as for StateStore
+        """
+        super().__init__(**kwargs)
+        self.size_sync_seconds = size_sync_seconds
+        self.db_path = db_path or os.getenv('STATE_DB_PATH') or str(Path(tempfile.gettempdir()) / 'log_analysis_state.sqlite3')
+
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        # Autocommit; transactions are explicit
+        self._db = sqlite3.connect(self.db_path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS conversations ("
+            "id TEXT PRIMARY KEY, history TEXT NOT NULL, analysis TEXT, "
+            "history_size INTEGER NOT NULL, analysis_size INTEGER NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS conversations_accessed ON conversations (accessed_at)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS datasets (id TEXT PRIMARY KEY, metadata TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._sync_totals(time.time())
+
+    def get_analysis(self, conversation_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._touch(conversation_id, 'analysis')
+            if row is None or row[0] is None:
+                self.counters['misses'] += 1
+                return None
+            self.counters['hits'] += 1
+        return json.loads(row[0])
+
+    def has_analysis(self, conversation_id: Optional[str]) -> bool:
+        if not conversation_id:
+            return False
+        with self._lock:
+            row = self._db.execute(
+                "SELECT analysis IS NOT NULL FROM conversations WHERE id = ? AND accessed_at >= ?",
+                (conversation_id, time.time() - self.ttl_seconds)
+            ).fetchone()
+            return bool(row and row[0])
+
+    def get_history(self, conversation_id: str) -> List[Dict[str, str]]:
+        with self._lock:
+            row = self._touch(conversation_id, 'history')
+        return json.loads(row[0]) if row is not None else []
+
+    def record_exchange(self, conversation_id: str, query: str, response: str,
+                        analysis: Optional[Dict[str, Any]] = None):
+        now = time.time()
+        encoded_analysis = json.dumps(analysis) if analysis is not None else None
+        with self._lock, self._transaction():
+            row = self._db.execute(
+                "SELECT history, analysis, analysis_size, accessed_at, history_size FROM conversations WHERE id = ?",
+                (conversation_id,)
+            ).fetchone()
+            history, stored_analysis, analysis_size = [], None, 0
+            if row is not None and now - row[3] <= self.ttl_seconds:
+                history, stored_analysis, analysis_size = json.loads(row[0]), row[1], row[2]
+            elif row is not None:
+                self.counters['expired'] += 1
+            if row is not None:
+                self._total -= row[2] + row[4]
+            else:
+                self._count += 1
+
+            if encoded_analysis is not None:
+                stored_analysis, analysis_size = encoded_analysis, len(encoded_analysis)
+            encoded_history = json.dumps(self._append_exchange(history, query, response))
+            self._db.execute(
+                "INSERT OR REPLACE INTO conversations (id, history, analysis, history_size, analysis_size, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (conversation_id, encoded_history, stored_analysis, len(encoded_history), analysis_size, now)
+            )
+            self._total += len(encoded_history) + analysis_size
+            self._evict(now, conversation_id)
+
+    def get_dataset(self, dataset_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT metadata FROM datasets WHERE id = ?", (dataset_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put_dataset(self, dataset_id: str, metadata: Dict[str, Any]):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO datasets (id, metadata, updated_at) VALUES (?, ?, ?)",
+                (dataset_id, json.dumps(metadata), time.time())
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            conversations, analyses, size = self._db.execute(
+                "SELECT COUNT(*), COUNT(analysis), COALESCE(SUM(history_size + analysis_size), 0) "
+                "FROM conversations WHERE accessed_at >= ?", (time.time() - self.ttl_seconds,)
+            ).fetchone()
+            return self._stats(conversations, analyses, size)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    @contextmanager
+    def _transaction(self):
+        """Write transaction that takes the database lock up front (waits up to busy_timeout)"""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+
+    def _touch(self, conversation_id: str, column: str) -> Optional[tuple]:
+        """The column's value for a live conversation, marking it used"""
+        now = time.time()
+        row = self._db.execute(
+            f"SELECT {column} FROM conversations WHERE id = ? AND accessed_at >= ?",
+            (conversation_id, now - self.ttl_seconds)
+        ).fetchone()
+        if row is not None:
+            self._db.execute("UPDATE conversations SET accessed_at = ? WHERE id = ?", (now, conversation_id))
+        return row
+
+    def _sync_totals(self, now: float):
+        """Delete idle conversations and re-read the conversation count and size"""
+        expired = self._db.execute(
+            "DELETE FROM conversations WHERE accessed_at < ?", (now - self.ttl_seconds,)
+        ).rowcount
+        self.counters['expired'] += expired
+        self._count, self._total = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(history_size + analysis_size), 0) FROM conversations"
+        ).fetchone()
+        self._synced_at = now
+
+    def _evict(self, now: float, keep_id: str):
+        """Delete idle conversations, then least recently used ones until under both caps (keep_id is always kept)"""
+        # The running totals are exact for this worker's writes; recount when they would trigger eviction or are stale
+        over = self._total > self.max_bytes or self._count > self.max_conversations
+        if over or now - self._synced_at > self.size_sync_seconds:
+            self._sync_totals(now)
+        count, total = self._count, self._total
+        evicted = 0
+        if total > self.max_bytes or count > self.max_conversations:
+            rows = self._db.execute(
+                "SELECT id, history_size + analysis_size FROM conversations WHERE id != ? ORDER BY accessed_at",
+                (keep_id,)
+            ).fetchall()
+            for conversation_id, size in rows:
+                if total <= self.max_bytes and count <= self.max_conversations:
+                    break
+                self._db.execute("DELETE FROM conversations WHERE id = ?", (conversation_id,))
+                total -= size
+                count -= 1
+                evicted += 1
+            self._count, self._total = count, total
+        if evicted:
+            self.counters['evicted'] += evicted
+            logger.info(f"State store evicted {evicted} conversations ({total} bytes remain)")
+
+
+def create_state_store(backend: Optional[str] = None, **kwargs) -> StateStore:
+    """Store for the configured backend (STATE_BACKEND env var: 'memory' (default) or 'sqlite')"""
+    backend = backend or os.getenv('STATE_BACKEND', 'memory')
+    if backend == 'memory':
+        return MemoryStateStore(**kwargs)
+    if backend == 'sqlite':
+        return SQLiteStateStore(**kwargs)
+    raise ValueError(f"Unknown state backend {backend!r}, expected one of {STATE_BACKENDS}")
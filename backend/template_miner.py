@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Online log template mining (Drain-style)
+Groups log bodies into templates with a fixed-depth prefix tree keyed on token count,
+merging similar messages and assigning stable integer template ids
+"""
+
+import logging
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+WILDCARD = '<*>'
+
+
+@dataclass
+class LogCluster:
+    """One mined template"""
+    cluster_id: int
+    template_tokens: List[str]
+    path: Tuple[str, ...]
+    size: int = 0
+    example_params: List[List[str]] = field(default_factory=list)
+
+    @property
+    def template(self) -> str:
+        return ' '.join(self.template_tokens)
+
+
+class _Node:
+    __slots__ = ('children', 'cluster_ids')
+
+    def __init__(self):
+        self.children: Dict[str, '_Node'] = {}
+        self.cluster_ids: List[int] = []
+
+
+class TemplateMiner:
+    def __init__(self, depth: int = 4, similarity_threshold: float = 0.5, max_children: int = 100,
+                 max_clusters: int = 50000, max_examples: int = 3):
+        """
+        Args:
+            depth: Tree depth including the root and token-count levels (>= 3)
+            similarity_threshold: Fraction of the log's constant tokens a template must match
+            max_children: Max distinct tokens per tree node before falling back to <*>
+            max_clusters: Least recently seen templates are evicted beyond this
+            max_examples: Example parameter lists kept per template
+        """
+        self.depth = max(depth, 3)
+        self.similarity_threshold = similarity_threshold
+        self.max_children = max_children
+        self.max_clusters = max_clusters
+        self.max_examples = max_examples
+
+        # Tokens containing digits (ids, counts, timestamps, hex) are variables
+        self.mask_pattern = re.compile(r'\S*\d\S*')
+
+        self.root: Dict[int, _Node] = {}
+        self.clusters: "OrderedDict[int, LogCluster]" = OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+        # masked body -> template id, for bodies that differ only in variables
+        self._masked_cache: Dict[str, int] = {}
+        self.max_cached_bodies = 100000
+
+    def mask(self, body: str) -> str:
+        """Body with its variable tokens replaced by <*>"""
+        return self.mask_pattern.sub(WILDCARD, body)
+
+    def add_log(self, body: str) -> LogCluster:
+        """Assign a body to its template, creating or generalizing one as needed"""
+        return self.add_masked(self.mask(body), body)
+
+    def add_masked(self, masked_body: str, body: str, count: int = 1) -> LogCluster:
+        """
+        add_log() for an already masked body, counting it count times
+
+        Repeats of a masked body never change the tree, so callers that mask
+        elsewhere (e.g. ingest workers) can mine each distinct body once.
+        """
+        with self._lock:
+            # Fast path: an identical masked body already merged into a template
+            # needs no tree search, and merging it again would change nothing
+            cluster = self.clusters.get(self._masked_cache.get(masked_body, 0))
+            if cluster is not None:
+                self.clusters.move_to_end(cluster.cluster_id)
+                self._record(cluster, body, count)
+                return cluster
+
+            masked = masked_body.split()
+            path = self._tree_path(masked)
+            leaf = self._descend(len(masked), path, create=True)
+            cluster = self._best_match(leaf, masked)
+
+            if cluster is None:
+                cluster = LogCluster(cluster_id=self._next_id, template_tokens=list(masked), path=path)
+                self._next_id += 1
+                self.clusters[cluster.cluster_id] = cluster
+                leaf.cluster_ids.append(cluster.cluster_id)
+                self._evict()
+            else:
+                template = cluster.template_tokens
+                for i, token in enumerate(masked):
+                    if template[i] != token:
+                        template[i] = WILDCARD
+                self.clusters.move_to_end(cluster.cluster_id)
+
+            if len(self._masked_cache) >= self.max_cached_bodies:
+                self._masked_cache.clear()
+            self._masked_cache[masked_body] = cluster.cluster_id
+            self._record(cluster, body, count)
+
+        return cluster
+
+    def _record(self, cluster: LogCluster, body: str, count: int = 1):
+        """Count a log against its template and keep a few example parameters"""
+        cluster.size += count
+        if len(cluster.example_params) < self.max_examples:
+            tokens = body.split()
+            params = [tokens[i] for i, token in enumerate(cluster.template_tokens) if token == WILDCARD]
+            if params:
+                cluster.example_params.append(params)
+
+    def match(self, body: str) -> Optional[LogCluster]:
+        """Find the template for a body without updating the miner"""
+        masked = self.mask(body).split()
+        with self._lock:
+            leaf = self._descend(len(masked), self._tree_path(masked), create=False)
+            return self._best_match(leaf, masked) if leaf else None
+
+    def get(self, cluster_id: int) -> Optional[LogCluster]:
+        return self.clusters.get(cluster_id)
+
+    def __len__(self) -> int:
+        return len(self.clusters)
+
+    def _tree_path(self, tokens: List[str]) -> Tuple[str, ...]:
+        """Tokens used to descend the tree (token-count level excluded)"""
+        return tuple(tokens[:self.depth - 2])
+
+    def _descend(self, token_count: int, path: Tuple[str, ...], create: bool) -> Optional[_Node]:
+        node = self.root.get(token_count)
+        if node is None:
+            if not create:
+                return None
+            node = self.root[token_count] = _Node()
+
+        for token in path:
+            child = node.children.get(token)
+            if child is None:
+                if create and token != WILDCARD and len(node.children) < self.max_children:
+                    child = node.children[token] = _Node()
+                else:
+                    # Unseen or variable token, or node full: share the wildcard branch
+                    child = node.children.get(WILDCARD)
+                    if child is None:
+                        if not create:
+                            return None
+                        child = node.children[WILDCARD] = _Node()
+            node = child
+        return node
+
+    def _best_match(self, leaf: _Node, tokens: List[str]) -> Optional[LogCluster]:
+        """Most similar template in a leaf, if it clears the similarity threshold"""
+        best = None
+        best_key = (-1.0, -1)
+        for cluster_id in leaf.cluster_ids:
+            cluster = self.clusters[cluster_id]
+            similar = params = concrete = 0
+            for template_token, token in zip(cluster.template_tokens, tokens):
+                if template_token == WILDCARD:
+                    params += 1
+                if token != WILDCARD:
+                    # Only the log's constant tokens count; masked variables
+                    # would otherwise make unrelated messages look alike
+                    concrete += 1
+                    if template_token == token:
+                        similar += 1
+            similarity = similar / concrete if concrete else 1.0
+            if (similarity, params) > best_key:
+                best, best_key = cluster, (similarity, params)
+
+        if best is not None and best_key[0] >= self.similarity_threshold:
+            return best
+        return None
+
+    def _evict(self):
+        """Drop least recently seen templates beyond max_clusters (ids are never reused)"""
+        while len(self.clusters) > self.max_clusters:
+            cluster_id, cluster = self.clusters.popitem(last=False)
+            leaf = self._descend(len(cluster.template_tokens), cluster.path, create=False)
+            if leaf and cluster_id in leaf.cluster_ids:
+                leaf.cluster_ids.remove(cluster_id)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializable snapshot, restorable with from_dict()"""
+        with self._lock:
+            return {
+                'depth': self.depth,
+                'similarity_threshold': self.similarity_threshold,
+                'max_children': self.max_children,
+                'max_clusters': self.max_clusters,
+                'max_examples': self.max_examples,
+                'next_id': self._next_id,
+                'clusters': [
+                    {
+                        'id': cluster.cluster_id,
+                        'template': cluster.template_tokens,
+                        'path': list(cluster.path),
+                        'size': cluster.size,
+                        'examples': cluster.example_params
+                    }
+                    for cluster in self.clusters.values()
+                ]
+            }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TemplateMiner":
+        miner = cls(
+            depth=data['depth'],
+            similarity_threshold=data['similarity_threshold'],
+            max_children=data['max_children'],
+            max_clusters=data['max_clusters'],
+            max_examples=data['max_examples']
+        )
+        for item in data['clusters']:
+            cluster = LogCluster(
+                cluster_id=item['id'],
+                template_tokens=list(item['template']),
+                path=tuple(item['path']),
+                size=item['size'],
+                example_params=item['examples']
+            )
+            miner.clusters[cluster.cluster_id] = cluster
+            miner._descend(len(cluster.template_tokens), cluster.path, create=True).cluster_ids.append(cluster.cluster_id)
+        miner._next_id = data['next_id']
+        return miner
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Template-frequency spike detection
+Bins every log's (template, service) pair into time buckets and flags buckets
+whose count jumps well above that pair's typical rate, so a burst of an
+ordinary INFO message counts as an anomaly even though no severity, status or
+error keyword marks it. The baseline is each pair's median count over the
+buckets where it occurs, so templates that are only logged now and then (or only
+for a moment, e.g. at startup) are not measured against a baseline of zero; the
+whole count matrix is compared at once with NumPy.
+"""
+
+import math
+import os
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Dict, Hashable, Iterable, Iterator, Optional, Tuple, TYPE_CHECKING
+
+try:
+    import numpy as np
+except ImportError:  # detection needs NumPy; without it no spikes are reported
+    np = None
+
+from timestamp_parser import MISSING_TIMESTAMP
+
+if TYPE_CHECKING:
+    from columnar_store import ColumnarLogStore
+    from enhanced_log_filter import LogEntry
+
+# Finest bucket width; datasets spanning more than SPIKE_MAX_BUCKETS buckets use wider ones
+SPIKE_BUCKET_SECONDS = float(os.getenv('SPIKE_BUCKET_SECONDS', '10'))
+SPIKE_MAX_BUCKETS = int(os.getenv('SPIKE_MAX_BUCKETS', '360'))
+# Upper bound on the (pair x bucket) count matrix; buckets widen further beyond it
+SPIKE_MAX_CELLS = int(os.getenv('SPIKE_MAX_CELLS', str(4_000_000)))
+# A bucket is a spike when all three hold: enough logs, (count + 1) / (baseline + 1)
+# at least SPIKE_RATIO, and at least SPIKE_Z Poisson deviations above the baseline
+SPIKE_MIN_COUNT = int(os.getenv('SPIKE_MIN_COUNT', '10'))
+SPIKE_RATIO = float(os.getenv('SPIKE_RATIO', '4'))
+SPIKE_Z = float(os.getenv('SPIKE_Z', '4'))
+# Importance added per doubling of the rate, for each spiking template in a window
+SPIKE_WEIGHT = float(os.getenv('SPIKE_WEIGHT', '100'))
+# Logs kept per spiking bucket as windowing candidates (windows keep one log per template anyway)
+SPIKE_SAMPLE_LOGS = int(os.getenv('SPIKE_SAMPLE_LOGS', '2'))
+
+# Fewer buckets than this give no baseline to compare against; pairs that
+# occur in fewer buckets are never flagged
+MIN_BUCKETS = 4
+
+
+@dataclass
+class Spike:
+    """One anomalous (template, service, interval) bucket"""
+    template: Optional[str]
+    service: str
+    start_ns: int
+    end_ns: int
+    count: int
+    baseline: float
+
+    @property
+    def ratio(self) -> float:
+        return (self.count + 1) / (self.baseline + 1)
+
+    @property
+    def score(self) -> float:
+        return SPIKE_WEIGHT * math.log2(self.ratio)
+
+    def describe(self) -> str:
+        seconds = (self.end_ns - self.start_ns) / 1e9
+        return f"{self.service} template spike: {self.count} in {seconds:g}s ({self.ratio:.0f}x baseline {self.baseline:g})"
+
+
+class TemplateSpikes:
+    """
+    Spikes found in one dataset, looked up by a log's template, service and time
+
+    sample_rows (columnar) or sample_logs (object pipeline, as (position, log)
+    pairs) hold the first SPIKE_SAMPLE_LOGS logs of each spiking bucket, in
+    dataset order
+    """
+
+    def __init__(self, spikes: Optional[List[Spike]] = None, origin_ns: int = 0, interval_ns: int = 1,
+                 num_buckets: int = 0):
+        self.spikes = sorted(spikes or [], key=lambda spike: spike.ratio, reverse=True)
+        self.origin_ns = origin_ns
+        self.interval_ns = interval_ns
+        self.num_buckets = num_buckets
+        self._cells = {
+            (spike.template, spike.service, (spike.start_ns - origin_ns) // interval_ns): spike for spike in self.spikes
+        }
+        self.sample_rows: Optional['np.ndarray'] = None
+        self.sample_logs: List[Tuple[int, 'LogEntry']] = []
+        # Columnar lookup: sorted cell keys ((template_id + 1) * key_stride + service_id + 1) * num_buckets + bucket
+        self.key_stride = 0
+        self._cell_keys: Optional['np.ndarray'] = None
+        self._cell_scores: Optional['np.ndarray'] = None
+
+    def __len__(self) -> int:
+        return len(self.spikes)
+
+    def lookup(self, log: 'LogEntry') -> Optional[Spike]:
+        if not self._cells or log.timestamp_ns == MISSING_TIMESTAMP:
+            return None
+        bucket = (log.timestamp_ns - self.origin_ns) // self.interval_ns
+        return self._cells.get((log.template_hash, log.service_name, bucket))
+
+    def strongest(self, logs: Iterable['LogEntry']) -> Optional[Spike]:
+        """The spike with the highest ratio among the logs' buckets"""
+        spikes = [spike for spike in map(self.lookup, logs) if spike is not None]
+        return max(spikes, key=lambda spike: spike.ratio) if spikes else None
+
+    def row_scores(self, store: 'ColumnarLogStore', rows: 'np.ndarray') -> 'np.ndarray':
+        """Spike.score of each row's bucket (0 outside spikes), for the store these spikes came from"""
+        scores = np.zeros(len(rows), dtype=np.float64)
+        if not self.spikes or self._cell_keys is None:
+            return scores
+        keys = self._row_keys(store, rows)
+        positions = np.minimum(np.searchsorted(self._cell_keys, keys), len(self._cell_keys) - 1)
+        hit = self._cell_keys[positions] == keys
+        scores[hit] = self._cell_scores[positions[hit]]
+        return scores
+
+    def _row_keys(self, store: 'ColumnarLogStore', rows: 'np.ndarray') -> 'np.ndarray':
+        columns = store.columns
+        timestamps = np.asarray(columns['timestamp_ns'][rows])
+        pair_keys = (columns['template_id'][rows].astype(np.int64) + 1) * self.key_stride + columns['service_id'][rows] + 1
+        buckets = (timestamps - self.origin_ns) // self.interval_ns
+        return np.where(timestamps == MISSING_TIMESTAMP, -1, pair_keys * self.num_buckets + buckets)
+
+
+def detect_spikes(pairs: 'np.ndarray', fine_buckets: 'np.ndarray', num_pairs: int,
+                  counts: Optional['np.ndarray'] = None) -> Optional[Tuple['np.ndarray', ...]]:
+    """
+    Spiking cells from per-log (or, with counts, aggregated) pair ids and
+    SPIKE_BUCKET_SECONDS bucket numbers
+
+    Returns (pairs, buckets, counts, baselines, first_fine_bucket, factor) with
+    buckets of factor fine buckets counted from first_fine_bucket, or None when
+    the data spans too few buckets to have a baseline
+    """
+    if not len(pairs):
+        return None
+    first = int(fine_buckets.min())
+    span = int(fine_buckets.max()) - first + 1
+
+    # Only pairs with SPIKE_MIN_COUNT logs overall can reach it in one bucket
+    totals = np.bincount(pairs, weights=counts, minlength=num_pairs)
+    active = np.flatnonzero(totals >= SPIKE_MIN_COUNT)
+    if not len(active):
+        return None
+    remap = np.full(num_pairs, -1, dtype=np.int64)
+    remap[active] = np.arange(len(active))
+    keep = remap[pairs] >= 0
+    active_pairs = remap[pairs[keep]]
+
+    factor = -(-span // SPIKE_MAX_BUCKETS)
+    num_buckets = (span - 1) // factor + 1
+    while len(active) * num_buckets > SPIKE_MAX_CELLS:
+        factor *= 2
+        num_buckets = (span - 1) // factor + 1
+    if num_buckets < MIN_BUCKETS:
+        return None
+
+    buckets = (fine_buckets[keep] - first) // factor
+    matrix = np.bincount(
+        active_pairs * num_buckets + buckets,
+        weights=None if counts is None else counts[keep],
+        minlength=len(active) * num_buckets
+    ).reshape(len(active), num_buckets)
+
+    present = matrix > 0
+    established = present.sum(axis=1, keepdims=True) >= MIN_BUCKETS
+    baseline = np.nanmedian(np.where(present, matrix, np.nan), axis=1, keepdims=True)
+    baseline = np.where(established, baseline, 0.0)
+    ratio = (matrix + 1) / (baseline + 1)
+    deviation = (matrix - baseline) / np.sqrt(baseline + 1)
+    flagged = established & (matrix >= SPIKE_MIN_COUNT) & (ratio >= SPIKE_RATIO) & (deviation >= SPIKE_Z)
+    spike_pairs, spike_buckets = np.nonzero(flagged)
+    return (
+        active[spike_pairs], spike_buckets, matrix[spike_pairs, spike_buckets].astype(np.int64),
+        baseline[spike_pairs, 0], first, factor
+    )
+
+
+def spikes_from_store(store: 'ColumnarLogStore', sample_logs: int = SPIKE_SAMPLE_LOGS) -> TemplateSpikes:
+    """Spikes over a frozen, vectorized store, with the first sample_logs rows of each as sample_rows"""
+    bucket_ns = int(SPIKE_BUCKET_SECONDS * 1_000_000_000)
+    columns = store.columns
+    timestamps = np.asarray(columns['timestamp_ns'])
+    rows = np.flatnonzero(timestamps != MISSING_TIMESTAMP)
+
+    stride = len(store.services) + 1
+    pair_keys = (columns['template_id'][rows].astype(np.int64) + 1) * stride + columns['service_id'][rows] + 1
+    unique_keys, pairs = np.unique(pair_keys, return_inverse=True)
+    fine_buckets = timestamps[rows] // bucket_ns
+    detected = detect_spikes(pairs.reshape(-1), fine_buckets, len(unique_keys))
+    if detected is None:
+        return TemplateSpikes()
+
+    spike_pairs, spike_buckets, spike_counts, baselines, first, factor = detected
+    origin_ns, interval_ns = first * bucket_ns, factor * bucket_ns
+    num_buckets = (int(fine_buckets.max()) - first) // factor + 1
+    spike_keys = unique_keys[spike_pairs]
+    found = [
+        Spike(
+            template=store.templates.decode(key // stride - 1),
+            service=store.services.decode(key % stride - 1),
+            start_ns=origin_ns + bucket * interval_ns,
+            end_ns=origin_ns + (bucket + 1) * interval_ns,
+            count=count,
+            baseline=baseline
+        )
+        for key, bucket, count, baseline in zip(
+            spike_keys.tolist(), spike_buckets.tolist(), spike_counts.tolist(), baselines.tolist()
+        )
+    ]
+    spikes = TemplateSpikes(found, origin_ns, interval_ns, num_buckets)
+
+    spikes.key_stride = stride
+    cell_keys = spike_keys * num_buckets + spike_buckets
+    order = np.argsort(cell_keys)
+    spikes._cell_keys = cell_keys[order]
+    spikes._cell_scores = np.array([spike.score for spike in found], dtype=np.float64)[order]
+
+    # First rows of each spiking cell (rows are ascending and the sort is stable)
+    row_cells = pair_keys * num_buckets + (fine_buckets - first) // factor
+    in_spike = np.isin(row_cells, spikes._cell_keys)
+    spike_rows, spike_cells = rows[in_spike], row_cells[in_spike]
+    order = np.argsort(spike_cells, kind='stable')
+    spike_rows, spike_cells = spike_rows[order], spike_cells[order]
+    _, starts, sizes = np.unique(spike_cells, return_index=True, return_counts=True)
+    rank = np.arange(len(spike_cells)) - np.repeat(starts, sizes)
+    spikes.sample_rows = np.sort(spike_rows[rank < sample_logs])
+    return spikes
+
+
+class SpikeCounter:
+    """
+    Bucket counts for the object pipeline, taken while logs stream past
+
+    count() passes logs through, counting them per (template, service,
+    SPIKE_BUCKET_SECONDS bucket) and keeping each bucket's first sample_logs
+    logs; detect() then runs the same vectorized detection as spikes_from_store
+    """
+
+    def __init__(self, sample_logs: int = SPIKE_SAMPLE_LOGS):
+        self.sample_logs = sample_logs
+        self.bucket_ns = int(SPIKE_BUCKET_SECONDS * 1_000_000_000)
+        self.counts: Counter = Counter()
+        self.samples: Dict[Tuple[Hashable, str, int], List[Tuple[int, 'LogEntry']]] = {}
+        # Stream position of each hot log, so sampled logs can be merged back in order
+        self.hot_positions: Dict[int, int] = {}
+
+    def count(self, logs: Iterable['LogEntry']) -> Iterator['LogEntry']:
+        counts, samples, bucket_ns = self.counts, self.samples, self.bucket_ns
+        for position, log in enumerate(logs):
+            if log.is_hot:
+                self.hot_positions[id(log)] = position
+            if log.timestamp_ns != MISSING_TIMESTAMP:
+                cell = (log.template_hash, log.service_name, log.timestamp_ns // bucket_ns)
+                seen = counts[cell]
+                counts[cell] = seen + 1
+                if seen < self.sample_logs:
+                    samples.setdefault(cell, []).append((position, log))
+            yield log
+
+    def detect(self) -> TemplateSpikes:
+        """Spikes over everything counted; sample_logs holds (position, log) pairs of their first logs"""
+        if np is None or not self.counts:
+            return TemplateSpikes()
+        pair_ids: Dict[Tuple[Hashable, str], int] = {}
+        cells = list(self.counts.items())
+        pairs = np.array([pair_ids.setdefault((template, service), len(pair_ids)) for (template, service, _), _ in cells],
+                         dtype=np.int64)
+        fine_buckets = np.array([bucket for (_, _, bucket), _ in cells], dtype=np.int64)
+        counts = np.array([count for _, count in cells], dtype=np.float64)
+        detected = detect_spikes(pairs, fine_buckets, len(pair_ids), counts)
+        if detected is None:
+            return TemplateSpikes()
+
+        spike_pairs, spike_buckets, spike_counts, baselines, first, factor = detected
+        origin_ns, interval_ns = first * self.bucket_ns, factor * self.bucket_ns
+        labels = list(pair_ids)
+        spikes = TemplateSpikes([
+            Spike(
+                template=labels[pair][0],
+                service=labels[pair][1],
+                start_ns=origin_ns + bucket * interval_ns,
+                end_ns=origin_ns + (bucket + 1) * interval_ns,
+                count=count,
+                baseline=baseline
+            )
+            for pair, bucket, count, baseline in zip(
+                spike_pairs.tolist(), spike_buckets.tolist(), spike_counts.tolist(), baselines.tolist()
+            )
+        ], origin_ns, interval_ns, (int(fine_buckets.max()) - first) // factor + 1)
+
+        # The first sample_logs logs of a spiking bucket are among the first
+        # sample_logs of the fine buckets it is made of
+        by_cell: Dict[Tuple[Hashable, str, int], List[Tuple[int, 'LogEntry']]] = {}
+        for (template, service, fine_bucket), logs in self.samples.items():
+            cell = (template, service, (fine_bucket - first) // factor)
+            if cell in spikes._cells:
+                by_cell.setdefault(cell, []).extend(logs)
+        spikes.sample_logs = sorted(
+            (sample for logs in by_cell.values() for sample in sorted(logs, key=lambda item: item[0])[:self.sample_logs]),
+            key=lambda item: item[0]
+        )
+        return spikes
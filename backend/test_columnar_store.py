@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Tests for the columnar log store: the columnar filter pipeline must return the
+same windows as the object pipeline over the same logs
+"""
+
+import pytest
+
+from columnar_store import ColumnarLogStore
+from enhanced_log_filter import EnhancedLogFilter
+from log_generator import GeneratorConfig, OtelDemoLogGenerator
+
+np = pytest.importorskip('numpy')
+
+QUERIES = [
+    'cart service is crashing with 500 errors',
+    'GET /api/checkout timeouts',
+    'POST /api/cart 503',
+    'payment declined for order',
+    'what happened in the last 2 minutes',
+    'nothing',
+]
+
+
+def window_signature(windows):
+    return [
+        (
+            round(window.importance_score, 3), round(window.prompt_match_score, 6), window.trace_id,
+            window.start_time, window.end_time, window.summary, dict(window.template_counts),
+            [(log.body, log.service_name, log.status, log.route, log.severity_number, log.timestamp_ns,
+              log.trace_id, log.template_hash) for log in window.logs]
+        )
+        for window in windows
+    ]
+
+
+@pytest.fixture(scope='module')
+def dataset():
+    log_filter = EnhancedLogFilter()
+    records = OtelDemoLogGenerator(GeneratorConfig(lines=6000, lines_per_second=50)).records()
+    logs = [log_filter.normalize_log_entry(record) for record in records]
+    return log_filter, logs, ColumnarLogStore.from_entries(logs)
+
+
+def test_store_round_trips_entries(dataset):
+    _, logs, store = dataset
+    assert len(store) == len(logs)
+    for row in (0, len(logs) // 2, len(logs) - 1):
+        entry, original = store.entry(row), logs[row]
+        assert (entry.body, entry.timestamp_ns, entry.service_name, entry.trace_id, entry.status, entry.is_hot) == (
+            original.body, original.timestamp_ns, original.service_name, original.trace_id, original.status, original.is_hot
+        )
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_columnar_windows_match_object_pipeline(dataset, query):
+    log_filter, logs, store = dataset
+    expected = log_filter.filter_logs_enhanced(logs, query, max_windows=10)
+    assert expected
+    assert window_signature(log_filter.filter_store(store, query, max_windows=10)) == window_signature(expected)
+
+
+def test_saved_store_filters_the_same(dataset, tmp_path):
+    log_filter, _, store = dataset
+    store.save(tmp_path / 'index')
+    loaded = ColumnarLogStore.load(tmp_path / 'index')
+    query = QUERIES[0]
+    assert window_signature(log_filter.filter_store(loaded, query, max_windows=10)) == window_signature(
+        log_filter.filter_store(store, query, max_windows=10)
+    )
+
+
+@pytest.mark.parametrize('query', ['what happened in the last 2 minutes', 'cart errors in the last 5 minutes'])
+def test_streamed_logs_filter_time_ranges_like_a_list(dataset, query):
+    log_filter, logs, _ = dataset
+    streamed, listed = {}, {}
+    windows = log_filter.filter_logs_enhanced(iter(logs), query, max_windows=10, stats=streamed)
+    assert window_signature(windows) == window_signature(
+        log_filter.filter_logs_enhanced(logs, query, max_windows=10, stats=listed)
+    )
+    assert streamed['time_range'] == listed['time_range']
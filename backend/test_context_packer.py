@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Tests for the token-budget context packer
+"""
+
+import pytest
+
+from context_packer import ContextPacker, estimate_tokens
+
+TRACE = '4bf92f3577b34da6a3ce929d0e0e4736'
+
+
+def make_windows():
+    windows = []
+    for w in range(4):
+        logs = [
+            {'service': 'cart', 'severity': 'ERROR', 'message': f'Failed to add item {TRACE}: connection refused',
+             'template': 'Failed to add item <*>: connection refused', 'trace_id': TRACE, 'status': 500,
+             'method': 'POST', 'route': '/api/cart'}
+        ]
+        logs += [
+            {'service': 'cart', 'severity': 'INFO', 'message': f'GetCart called with userId={i}',
+             'template': 'GetCart called with <*>'}
+            for i in range(6)
+        ]
+        windows.append({'summary': f'cart window {w}', 'logs': logs, 'trace_id': TRACE,
+                        'importance_score': 1.0 + w, 'prompt_match_score': 0.5})
+    return windows
+
+
+@pytest.fixture
+def packer():
+    return ContextPacker(count_tokens=estimate_tokens)
+
+
+def test_everything_fits_is_rendered_in_full(packer):
+    text, report = packer.pack(make_windows(), '28 logs in 4 windows', token_budget=100_000)
+    assert report['logs_packed'] == report['logs_available'] == 28
+    assert not report['shortened']
+    assert f'Trace: {TRACE[:16]}...' in text
+    assert report['tokens_used'] == estimate_tokens(text)
+
+
+@pytest.mark.parametrize('token_budget', [80, 200, 400])
+def test_packing_stays_within_the_budget(packer, token_budget):
+    text, report = packer.pack(make_windows(), '28 logs in 4 windows', token_budget=token_budget)
+    assert report['shortened']
+    assert 0 < report['logs_packed'] < report['logs_available']
+    assert report['tokens_used'] <= token_budget
+    assert estimate_tokens(text) <= token_budget
+
+
+def test_errors_and_new_templates_are_packed_first(packer):
+    text, report = packer.pack(make_windows(), '28 logs in 4 windows', token_budget=200)
+    # Long ids are shortened, and a window's own trace id is stated once in its header
+    assert TRACE not in text and f'(trace {TRACE[:8]})' in text
+    assert text.count('Severity: ERROR') >= text.count('GetCart called') > 0
+    # The highest-importance window is never the one dropped
+    assert '**Window 4: cart window 3**' in text
+
+
+def test_first_window_offsets_numbering(packer):
+    text, _ = packer.pack(make_windows()[:1], 'one window', token_budget=100_000, first_window=5)
+    assert '**Window 5: cart window 0**' in text
+    assert '  Log 1: Service: cart' in text
@@ -5,19 +5,61 @@ Focused test of enhanced log filtering with concise output for LLM processing
 
 import logging
 import json
+import os
+import sys
+import tempfile
 from enhanced_log_filter import EnhancedLogFilter
+from log_generator import GeneratorConfig, OtelDemoLogGenerator
 
-# Configure logging for developer info
-logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 logger = logging.getLogger(__name__)
 
+# Real oteldemo export, if checked out next to the repo; otherwise a generated sample is used
+SAMPLE_LOGS = os.getenv('SAMPLE_LOGS', os.path.join(os.path.dirname(__file__), '..', '..', 'sample_logs.ndjson'))
+
+
+def load_sample_logs(filter_system, path=SAMPLE_LOGS):
+    """Logs from path, or from a generated oteldemo-style file when it does not exist"""
+    if os.path.exists(path):
+        logs = filter_system.load_logs(path)
+        logger.info(f"Loaded {len(logs)} logs from {path}")
+        return logs
+    with tempfile.TemporaryDirectory() as tmp:
+        generated = os.path.join(tmp, 'sample_logs.ndjson')
+        OtelDemoLogGenerator(GeneratorConfig(lines=5000)).write(generated)
+        logs = filter_system.load_logs(generated)
+    logger.info(f"{path} not found; generated {len(logs)} sample logs")
+    return logs
+
+
+def test_filter_returns_ranked_windows():
+    filter_system = EnhancedLogFilter()
+    logs = load_sample_logs(filter_system)
+    windows = filter_system.filter_logs_enhanced(logs, "cart service errors and timeouts", max_windows=5)
+    assert 0 < len(windows) <= 5
+    scores = [window.importance_score + window.prompt_match_score for window in windows]
+    assert scores == sorted(scores, reverse=True)
+    assert all(window.logs and window.summary for window in windows)
+
+
+def test_iter_logs_reads_appended_lines_from_a_byte_offset(tmp_path):
+    filter_system = EnhancedLogFilter()
+    path = tmp_path / 'logs.ndjson'
+    first = json.dumps({'body': 'café naïve größe ✓', 'severity_text': 'INFO'}, ensure_ascii=False) + '\n'
+    path.write_text(first, encoding='utf-8')
+    offset = path.stat().st_size
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'body': 'appended 503 ✓', 'severity_text': 'ERROR'}, ensure_ascii=False) + '\n')
+    assert [log.body for log in filter_system.iter_logs(str(path), offset=offset)] == ['appended 503 ✓']
+
+
 def main():
     """Test with single query and only print LLM output"""
+    # Configure logging for developer info
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
     filter_system = EnhancedLogFilter()
     
     # Load logs
-    logs = filter_system.load_logs('../../sample_logs.ndjson')
-    logger.info(f"Loaded {len(logs)} logs from sample_logs.ndjson")
+    logs = load_sample_logs(filter_system, sys.argv[1] if len(sys.argv) > 1 else SAMPLE_LOGS)
     
     # Single focused query
     query = "cart service errors and timeouts"
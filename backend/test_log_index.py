@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Tests for the inverted log index: keyword lookups must agree with keyword_in_body
+"""
+
+import pytest
+
+from columnar_store import ColumnarLogStore
+from enhanced_log_filter import EnhancedLogFilter
+from log_index import keyword_in_body
+
+np = pytest.importorskip('numpy')
+
+BODIES = [
+    'retry after 50',
+    '4 items ok',
+    'connect redis6379 refused',
+    'x 5',
+    '0505 y',
+    'Redis down',
+    'GET /api/cart 504 in 12ms',
+    'trace 4bf92f3577b34da6a3ce929d0e0e4736 done',
+]
+
+
+@pytest.fixture(scope='module')
+def store():
+    log_filter = EnhancedLogFilter()
+    return ColumnarLogStore.from_entries(log_filter.normalize_log_entry({'body': body}) for body in BODIES)
+
+
+@pytest.mark.parametrize('keyword', ['504', '505', 'redis', 'edis', 'items', 'cart', '4bf92f', 'a3ce', 'nothing'])
+def test_keyword_rows_match_keyword_in_body(store, keyword):
+    expected = [row for row, body in enumerate(BODIES) if keyword_in_body(keyword, body.lower())]
+    assert store.index.keyword_rows(keyword, store.bodies).tolist() == expected
+
+
+def test_body_scan_does_not_match_across_bodies(store):
+    # "retry after 50" + "4 items ok" would read "...504 items..." if joined
+    assert store.index.keyword_rows('504', store.bodies).tolist() == [6]
+    # Overlapping candidates: "x 5" + "0505 y" joined hides the real "505" behind a cross-body one
+    assert store.index.keyword_rows('505', store.bodies).tolist() == [4]
+
+
+def test_names_glued_to_numbers_are_found(store):
+    assert store.index.keyword_rows('redis', store.bodies).tolist() == [2, 5]
+
+
+def test_saved_index_answers_the_same(store, tmp_path):
+    store.save(tmp_path / 'index')
+    loaded = ColumnarLogStore.load(tmp_path / 'index')
+    for keyword in ['redis', '504', 'items']:
+        assert loaded.index.keyword_rows(keyword, loaded.bodies).tolist() == store.index.keyword_rows(keyword, store.bodies).tolist()
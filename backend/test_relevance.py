@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Tests for BM25 relevance ranking
+"""
+
+import math
+
+import pytest
+
+from enhanced_log_filter import EnhancedLogFilter, LogWindow
+from relevance import TermStats, bm25, idf, log_terms, query_terms
+
+
+def entry(log_filter, body, service='frontend'):
+    return log_filter.normalize_log_entry({'body': body, 'resource_attributes': {'service': {'name': service}}})
+
+
+def test_idf_favours_rare_terms_and_is_never_negative():
+    assert idf(1000, 1) > idf(1000, 100) > idf(1000, 900) > 0
+    assert idf(10, 10) > 0
+
+
+def test_bm25_saturates_and_normalizes_length():
+    term_idf = {'keyword:timeout': 2.0}
+    one, many = bm25({'keyword:timeout': 1}, term_idf, 10, 10), bm25({'keyword:timeout': 50}, term_idf, 10, 10)
+    assert one < many < 2.0 * (1.2 + 1)
+    # The same count weighs less in a longer document
+    assert bm25({'keyword:timeout': 3}, term_idf, 40, 10) < bm25({'keyword:timeout': 3}, term_idf, 5, 10)
+
+
+def test_bm25_sparse_matches_bm25():
+    np = pytest.importorskip('numpy')
+    from relevance import bm25_sparse
+
+    term_idf = np.array([1.5, 0.2])
+    lengths = np.array([10.0, 30.0, 5.0])
+    scores = bm25_sparse(np.array([0, 0, 1, 2]), np.array([0, 1, 1, 0]), np.array([2, 1, 4, 1]), term_idf, lengths)
+    average = lengths.mean()
+    expected = [
+        bm25({'a': 2, 'b': 1}, {'a': 1.5, 'b': 0.2}, 10, average),
+        bm25({'b': 4}, {'b': 0.2}, 30, average),
+        bm25({'a': 1}, {'a': 1.5}, 5, average),
+    ]
+    assert scores.tolist() == pytest.approx(expected)
+
+
+def test_term_stats_counts_documents_and_reuses_its_cache():
+    log_filter = EnhancedLogFilter()
+    criteria = log_filter.parse_query_advanced('cart timeout')
+    logs = [entry(log_filter, body) for body in ['cart timeout', 'cart ok', 'cart ok', 'checkout ok']]
+
+    cache = {}
+    stats = TermStats(criteria, cache)
+    assert list(stats.count(logs)) == logs
+    assert stats.idf()['keyword:timeout'] == pytest.approx(idf(4, 1))
+    assert stats.idf()['keyword:cart'] == pytest.approx(idf(4, 3))
+
+    # A second pass over the same logs takes the cached frequencies without counting
+    again = TermStats(criteria, cache)
+    assert again.pending == []
+    list(again.count(logs))
+    assert again.documents == 0 and again.idf() == stats.idf()
+
+
+def test_rare_term_window_outranks_common_term_window():
+    log_filter = EnhancedLogFilter()
+    query = 'NullPointerException in service'
+    criteria = log_filter.parse_query_advanced(query)
+    common = [entry(log_filter, f'service heartbeat {i}') for i in range(50)]
+    rare = entry(log_filter, 'NullPointerException thrown while handling request')
+
+    stats = TermStats(criteria)
+    list(stats.count(common + [rare]))
+    term_idf = stats.idf()
+    assert set(log_terms(rare, criteria, query_terms(criteria))) == {'keyword:nullpointerexception'}
+
+    rare_window = LogWindow(logs=[rare])
+    common_window = LogWindow(logs=common[:3])
+    for window in (rare_window, common_window):
+        window.template_counts = {log.template_hash: 1 for log in window.logs}
+    rare_score = log_filter.calculate_prompt_match_score(rare_window, criteria, term_idf, 5.0)
+    common_score = log_filter.calculate_prompt_match_score(common_window, criteria, term_idf, 5.0)
+    assert rare_score > common_score > 0
+    assert math.isfinite(rare_score)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Tests for conversation state: both backends evict by idle time, size and count
+"""
+
+import time
+
+import pytest
+
+from state_store import MemoryStateStore, SQLiteStateStore
+
+ANALYSIS = {'log_summary': 's', 'filtered_windows': [{'logs': ['x' * 400]}], 'initial_analysis': 'a'}
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_store(request, tmp_path):
+    def make(**limits):
+        if request.param == 'memory':
+            return MemoryStateStore(**limits)
+        return SQLiteStateStore(db_path=str(tmp_path / 'state.sqlite3'), **limits)
+    return make
+
+
+def test_history_and_analysis_round_trip(make_store):
+    store = make_store(max_history_messages=4)
+    store.record_exchange('c1', 'first', 'answer', ANALYSIS)
+    for i in range(3):
+        store.record_exchange('c1', f'q{i}', f'r{i}')
+    assert store.has_analysis('c1') and not store.has_analysis('c2')
+    assert store.get_analysis('c1') == ANALYSIS
+    assert [message['content'] for message in store.get_history('c1')] == ['q1', 'r1', 'q2', 'r2']
+
+
+def test_least_recently_used_conversations_are_evicted(make_store):
+    store = make_store(max_conversations=3)
+    for i in range(5):
+        store.record_exchange(f'c{i}', 'q', 'r', ANALYSIS)
+        store.get_analysis('c0')  # keep c0 recently used
+    assert [store.has_analysis(f'c{i}') for i in range(5)] == [True, False, False, True, True]
+    assert store.stats()['conversations'] == 3
+
+
+def test_size_budget_is_kept(make_store):
+    store = make_store(max_bytes=3000)
+    for i in range(10):
+        store.record_exchange(f'c{i}', 'q', 'r', ANALYSIS)
+    assert store.stats()['resident_bytes'] <= 3000
+    assert store.has_analysis('c9')
+
+
+def test_idle_conversations_expire(make_store):
+    store = make_store(ttl_seconds=0.05)
+    store.record_exchange('old', 'q', 'r', ANALYSIS)
+    time.sleep(0.1)
+    store.record_exchange('new', 'q', 'r')
+    assert not store.has_analysis('old') and store.get_history('old') == []
+    assert store.stats()['conversations'] == 1
+
+
+def test_sqlite_workers_share_state_and_caps(tmp_path):
+    path = str(tmp_path / 'state.sqlite3')
+    first, second = SQLiteStateStore(db_path=path, max_conversations=4), SQLiteStateStore(db_path=path, max_conversations=4)
+    for i in range(3):
+        first.record_exchange(f'a{i}', 'q', 'r', ANALYSIS)
+        second.record_exchange(f'b{i}', 'q', 'r', ANALYSIS)
+    assert second.get_analysis('a2') == ANALYSIS
+    # Each worker's running totals only count its own writes until the periodic recount
+    assert first.stats()['conversations'] == 6
+    second._synced_at = 0  # force the recount on the next write
+    second.record_exchange('b3', 'q', 'r')
+    assert second.stats()['conversations'] == 4
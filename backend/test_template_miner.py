@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tests for the Drain-style template miner
+"""
+
+from template_miner import TemplateMiner, WILDCARD
+
+
+def templates(miner):
+    return sorted((cluster.cluster_id, cluster.template, cluster.size) for cluster in miner.clusters.values())
+
+
+def test_variables_are_masked_into_one_template():
+    miner = TemplateMiner()
+    first = miner.add_log('Consumed record with orderId: 1600a35a-6f03-11f0-9338-11e26b0d549b')
+    second = miner.add_log('Consumed record with orderId: 1e27a1c0-9227-11f0-9338-8f6d4ef8aa38')
+    assert first.cluster_id == second.cluster_id
+    assert first.template == f'Consumed record with orderId: {WILDCARD}'
+    assert first.size == 2
+    assert first.example_params[0] == ['1600a35a-6f03-11f0-9338-11e26b0d549b']
+
+
+def test_similar_messages_generalize_and_keep_their_id():
+    miner = TemplateMiner()
+    # The leading tokens pick the tree leaf; later tokens generalize
+    cart = miner.add_log('cart item added for user alice')
+    other = miner.add_log('cart item added for user bob')
+    assert other.cluster_id == cart.cluster_id
+    assert cart.template == f'cart item added for user {WILDCARD}'
+
+
+def test_different_messages_get_different_templates():
+    miner = TemplateMiner()
+    ids = {
+        miner.add_log(body).cluster_id
+        for body in ['payment declined for card', 'cart checkout completed ok', 'payment declined for card']
+    }
+    assert len(ids) == 2
+    # Token count is the first tree level, so lengths never share a template
+    assert miner.add_log('payment declined').cluster_id not in ids
+
+
+def test_match_does_not_change_the_miner():
+    miner = TemplateMiner()
+    cluster = miner.add_log('request 42 took 120ms')
+    assert miner.match('request 7 took 3ms').cluster_id == cluster.cluster_id
+    assert miner.match('something else entirely') is None
+    assert len(miner) == 1 and cluster.size == 1
+
+
+def test_add_masked_counts_repeats_like_add_log():
+    bodies = ['GET /api/cart 200 in 12ms', 'GET /api/cart 500 in 3ms', 'shipping quote for 3 items', 'GET /api/cart 200 in 9ms']
+    one_by_one, batched = TemplateMiner(), TemplateMiner()
+    ids = [one_by_one.add_log(body).cluster_id for body in bodies]
+
+    distinct = {}
+    for body in bodies:
+        distinct.setdefault(batched.mask(body), []).append(body)
+    batched_ids = {masked: batched.add_masked(masked, group[0], len(group)).cluster_id for masked, group in distinct.items()}
+
+    assert [batched_ids[batched.mask(body)] for body in bodies] == ids
+    assert templates(batched) == templates(one_by_one)
+
+
+def test_eviction_and_snapshot_round_trip():
+    miner = TemplateMiner(max_clusters=2)
+    for body in ['alpha beta', 'gamma delta epsilon', 'zeta eta theta iota']:
+        miner.add_log(body)
+    assert len(miner) == 2 and miner.get(1) is None
+
+    restored = TemplateMiner.from_dict(miner.to_dict())
+    assert restored.match('gamma delta epsilon').cluster_id == 2
+    assert restored.add_log('kappa lambda').cluster_id == 4
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Tests for template-frequency spike detection: a burst of an ordinary INFO
+message is flagged, steady and short-lived templates are not
+"""
+
+import pytest
+
+from enhanced_log_filter import EnhancedLogFilter
+from template_spikes import SPIKE_BUCKET_SECONDS, SpikeCounter
+from timestamp_parser import NS_PER_SECOND, parse_iso_ns
+
+np = pytest.importorskip('numpy')
+
+START_NS = parse_iso_ns('2025-09-02T23:00:00Z')
+BUCKET_NS = int(SPIKE_BUCKET_SECONDS * NS_PER_SECOND)
+BUCKETS = 60
+BURST_BUCKET = 30
+PER_BUCKET = 3
+
+
+def record(timestamp_ns, service, body):
+    return {
+        'timestamp': str(timestamp_ns),
+        'severity_text': 'INFO',
+        'body': body,
+        'resource_attributes': {'service': {'name': service}},
+    }
+
+
+def synthetic_records():
+    """A steady cart template, a checkout template with one 10x burst, and a startup-only template"""
+    records = []
+    for bucket in range(BUCKETS):
+        base = START_NS + bucket * BUCKET_NS
+        for i in range(PER_BUCKET):
+            offset = base + i * BUCKET_NS // PER_BUCKET
+            records.append(record(offset, 'cartservice', f'GetCart called with userId={bucket * 10 + i}'))
+            records.append(record(offset + 1, 'checkoutservice', f'Sent order {bucket * 10 + i} to the queue'))
+        if bucket == BURST_BUCKET:
+            records += [
+                record(base + 1000 + i, 'checkoutservice', f'Sent order {9000 + i} to the queue')
+                for i in range(PER_BUCKET * 9)
+            ]
+        if bucket < 2:
+            records += [
+                record(base + 2000 + i, 'adservice', f'Loading ad catalog shard {i}') for i in range(15)
+            ]
+    records.sort(key=lambda item: int(item['timestamp']))
+    return records
+
+
+@pytest.fixture(scope='module')
+def logs():
+    log_filter = EnhancedLogFilter()
+    return [log_filter.normalize_log_entry(item) for item in synthetic_records()]
+
+
+def spike_signature(spikes):
+    return sorted((spike.service, spike.start_ns, spike.count, spike.baseline) for spike in spikes.spikes)
+
+
+def test_info_burst_is_flagged_and_steady_templates_are_not(logs):
+    counter = SpikeCounter()
+    assert list(counter.count(logs)) == logs
+    spikes = counter.detect()
+
+    assert [(spike.service, spike.count, spike.baseline) for spike in spikes.spikes] == [
+        ('checkoutservice', PER_BUCKET * 10, PER_BUCKET)
+    ]
+    spike = spikes.spikes[0]
+    assert spike.start_ns == START_NS + BURST_BUCKET * BUCKET_NS
+    assert spike.ratio >= 4 and spike.score > 0
+    assert 'checkoutservice template spike: 30 in 10s' in spike.describe()
+
+    burst_log = next(log for log in logs if log.body == 'Sent order 9000 to the queue')
+    steady_log = next(log for log in logs if log.service_name == 'cartservice')
+    assert spikes.lookup(burst_log) is spike
+    assert spikes.lookup(steady_log) is None
+    # Samples are the first logs of the burst bucket, in stream order
+    assert [log.service_name for _, log in spikes.sample_logs] == ['checkoutservice'] * 2
+
+
+def test_store_detection_matches_the_object_pipeline(logs):
+    from columnar_store import ColumnarLogStore
+
+    counter = SpikeCounter()
+    list(counter.count(logs))
+    expected = counter.detect()
+
+    store = ColumnarLogStore.from_entries(logs)
+    spikes = store.template_spikes()
+    assert spike_signature(spikes) == spike_signature(expected)
+    assert [store.entry(row).body for row in spikes.sample_rows.tolist()] == [
+        log.body for _, log in expected.sample_logs
+    ]
+
+    scores = spikes.row_scores(store, np.arange(len(store)))
+    flagged = {store.entry(row).service_name for row in np.flatnonzero(scores > 0).tolist()}
+    assert flagged == {'checkoutservice'}
+    assert np.count_nonzero(scores) == PER_BUCKET * 10
+
+
+def test_too_few_buckets_give_no_baseline(logs):
+    counter = SpikeCounter()
+    list(counter.count(logs[:len(logs) // 30]))
+    assert len(counter.detect()) == 0
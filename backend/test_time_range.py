@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Tests for time-range parsing, resolution and the sorted-timestamp pushdown
+"""
+
+import pytest
+
+from time_range import parse_time_range, resolve_time_range
+from timestamp_parser import NS_PER_SECOND, parse_iso_ns
+
+MINUTE = 60 * NS_PER_SECOND
+DATASET_START = parse_iso_ns('2025-09-02T23:00:00Z')
+DATASET_END = parse_iso_ns('2025-09-02T23:30:00Z')
+CRASH = parse_iso_ns('2025-09-02T23:20:00Z')
+
+
+def resolve(query, event_time=lambda word: CRASH if word == 'crash' else None):
+    time_range = parse_time_range(query)
+    assert time_range is not None, query
+    return resolve_time_range(time_range, DATASET_START, DATASET_END, event_time)
+
+
+def test_between_clock_times_covers_the_whole_last_minute():
+    assert resolve('what happened between 23:10 and 23:15') == (
+        parse_iso_ns('2025-09-02T23:10:00Z'), parse_iso_ns('2025-09-02T23:15:59.999999999Z')
+    )
+
+
+def test_seconds_narrow_the_precision():
+    start, end = resolve('errors from 23:10:05 to 23:10:06')
+    assert (start, end) == (parse_iso_ns('2025-09-02T23:10:05Z'), parse_iso_ns('2025-09-02T23:10:06.999999999Z'))
+
+
+def test_last_duration_counts_back_from_the_dataset_end():
+    assert resolve('payment errors in the last 5 minutes') == (DATASET_END - 5 * MINUTE, DATASET_END)
+
+
+def test_relative_to_an_event():
+    assert resolve('10 minutes before the crash') == (CRASH - 10 * MINUTE, CRASH)
+    assert resolve('2 minutes around the crash') == (CRASH - 2 * MINUTE, CRASH + 2 * MINUTE)
+
+
+def test_ranges_are_clamped_to_the_dataset():
+    assert resolve('after 22:00') == (DATASET_START, DATASET_END)
+    assert resolve('last 2 hours') == (DATASET_START, DATASET_END)
+
+
+def test_pm_clock_times():
+    start, _ = resolve('since 11:25 pm')
+    assert start == parse_iso_ns('2025-09-02T23:25:00Z')
+
+
+def test_unresolvable_event_and_no_phrase():
+    assert resolve('5 minutes before the outage') is None
+    assert parse_time_range('why is the cart service failing') is None
+
+
+def test_rows_between_matches_a_scan():
+    np = pytest.importorskip('numpy')
+    from columnar_store import ColumnarLogStore
+    from enhanced_log_filter import EnhancedLogFilter
+    from log_generator import GeneratorConfig, OtelDemoLogGenerator
+
+    log_filter = EnhancedLogFilter()
+    records = OtelDemoLogGenerator(GeneratorConfig(lines=3000, lines_per_second=100)).records()
+    store = ColumnarLogStore.from_entries(log_filter.normalize_log_entry(record) for record in records)
+    timestamps = np.asarray(store.columns['timestamp_ns'])
+    low, high = store.time_bounds()
+    start, end = low + (high - low) // 3, low + 2 * (high - low) // 3
+
+    expected = np.flatnonzero((timestamps >= start) & (timestamps <= end))
+    assert 0 < len(expected) < len(store)
+    assert store.rows_between(start, end).tolist() == expected.tolist()
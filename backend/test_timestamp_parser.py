@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for the format-detecting timestamp parser
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+
+from timestamp_parser import MISSING_TIMESTAMP, TimestampParser, days_from_civil, parse_iso_ns
+
+# 2025-09-02T23:12:41.249251966Z
+KNOWN_NS = 1756854761249251966
+
+
+def test_days_from_civil_matches_datetime():
+    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
+    for year, month, day in [(1970, 1, 1), (2000, 2, 29), (2000, 3, 1), (1969, 12, 31), (2025, 9, 2)]:
+        expected = (datetime(year, month, day, tzinfo=timezone.utc) - epoch).days
+        assert days_from_civil(year, month, day) == expected
+
+
+@pytest.mark.parametrize('value', [
+    '2025-09-02T23:12:41.249251966Z',
+    '2025-09-02 23:12:41.249251966',
+    '2025-09-03T01:12:41.249251966+02:00',
+    '2025-09-02T18:12:41.249251966-0500',
+])
+def test_iso_strings_to_epoch_ns(value):
+    assert parse_iso_ns(value) == KNOWN_NS
+
+
+def test_iso_fraction_precision():
+    base = KNOWN_NS - 249251966
+    assert parse_iso_ns('2025-09-02T23:12:41Z') == base
+    assert parse_iso_ns('2025-09-02T23:12:41.5Z') == base + 500_000_000
+    # Digits past nanoseconds are truncated
+    assert parse_iso_ns('2025-09-02T23:12:41.2492519669Z') == KNOWN_NS
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('1756854761249251966', KNOWN_NS),
+    (1756854761249251, KNOWN_NS - 966),
+    (1756854761249, KNOWN_NS - 251966),
+    ('1756854761', KNOWN_NS - 249251966),
+    (1756854761.5, KNOWN_NS - 249251966 + 500_000_000),
+])
+def test_epoch_units_detected_by_magnitude(value, expected):
+    assert TimestampParser().parse(value) == expected
+
+
+@pytest.mark.parametrize('value', [None, True, '', 'not a timestamp', '2025-13-02T00:00:00Z', {'ts': 1}])
+def test_unparseable_values_are_missing(value):
+    assert TimestampParser().parse(value) == MISSING_TIMESTAMP
+
+
+def test_format_is_remembered_per_field():
+    parser = TimestampParser()
+    parser.parse('2025-09-02T23:12:41Z', 'timestamp')
+    parser.parse(1756854761249, 'time_ms')
+    assert parser.formats == {'timestamp': 'iso', 'time_ms': 'epoch_ms'}
+
+
+def test_mixed_values_in_one_field_still_parse():
+    parser = TimestampParser()
+    assert parser.parse('2025-09-02T23:12:41.249251966Z', 'ts') == KNOWN_NS
+    # A value outside the remembered format falls back to detection
+    assert parser.parse('1756854761249251966', 'ts') == KNOWN_NS
+    assert parser.parse('2025-09-02T23:12:41.249251966Z', 'ts') == KNOWN_NS
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Tests for incremental windows: retention evicts by last update, not by opening order
+"""
+
+from enhanced_log_filter import EnhancedLogFilter
+from window_accumulator import WindowAccumulator
+
+SECOND_NS = 1_000_000_000
+BASE_NS = 1_700_000_000 * SECOND_NS
+TRACES = [f'{n:032x}' for n in range(5)]
+
+
+def hot_log(log_filter, seconds, service, trace_id=''):
+    return log_filter.normalize_log_entry({
+        'timestamp': BASE_NS + seconds * SECOND_NS,
+        'severity_text': 'ERROR',
+        'body': f'{service} request failed with 503',
+        'trace_id': trace_id,
+        'resource_attributes': {'service': {'name': service}},
+    })
+
+
+def test_live_head_window_does_not_shield_older_ones():
+    log_filter = EnhancedLogFilter()
+    accumulator = WindowAccumulator(log_filter, window_seconds=30, retention_seconds=60)
+    # The trace window opens first and keeps getting logs; the service windows go quiet
+    accumulator.add([hot_log(log_filter, 0, 'cartservice', trace_id=TRACES[1])])
+    accumulator.add([hot_log(log_filter, 1, 'adservice'), hot_log(log_filter, 2, 'emailservice')])
+    for seconds in range(10, 200, 10):
+        accumulator.add([hot_log(log_filter, seconds, 'cartservice', trace_id=TRACES[1])])
+
+    assert [window.trace_id for window in accumulator.top(10)] == [TRACES[1]]
+    assert accumulator.stats()['evicted_windows'] == 2
+
+
+def test_refreshed_windows_survive_and_max_windows_drops_oldest_opened():
+    log_filter = EnhancedLogFilter()
+    accumulator = WindowAccumulator(log_filter, retention_seconds=60, max_windows=2)
+    accumulator.add([hot_log(log_filter, 0, 'a', TRACES[1]), hot_log(log_filter, 1, 'b', TRACES[2]), hot_log(log_filter, 2, 'c', TRACES[3])])
+    assert sorted(window.trace_id for window in accumulator.top(10)) == TRACES[2:4]
+
+    accumulator.add([hot_log(log_filter, 50, 'b', TRACES[2])])
+    accumulator.add([hot_log(log_filter, 100, 'd', TRACES[4])])
+    # Trace 3 last logged at 2s is past the 60s horizon; trace 2 was refreshed at 50s
+    assert sorted(window.trace_id for window in accumulator.top(10)) == [TRACES[2], TRACES[4]]
+    stats = accumulator.stats()
+    assert (stats['windows'], stats['open_windows'], stats['evicted_windows']) == (2, 2, 2)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Tests for the sweep-based windowing (pure-Python and NumPy sweeps)
+"""
+
+import random
+
+import pytest
+
+from timestamp_parser import MISSING_TIMESTAMP
+from windowing import pack_spans, sweep_windows, time_chunks
+
+SECOND = 1_000_000_000
+MAX_SIZE = 40
+WINDOW_NS = 30 * SECOND
+
+
+def synthetic_logs(count=2000, seed=3):
+    """(traces, spans, services, timestamps) with a few oversized traces and untimestamped logs"""
+    rng = random.Random(seed)
+    traces, spans, services, timestamps = [], [], [], []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.15:
+            trace = f'wide-{rng.randrange(3)}'
+            span = f'{trace}-span-{rng.randrange(6)}'
+        elif roll < 0.5:
+            trace = f'trace-{rng.randrange(150)}'
+            span = f'{trace}-span-{rng.randrange(3)}'
+        else:
+            trace = span = None
+        traces.append(trace)
+        spans.append(span)
+        services.append(rng.choice(['cart', 'checkout', 'frontend', 'payment']))
+        timestamps.append(MISSING_TIMESTAMP if rng.random() < 0.02 else i * SECOND // 10 + rng.randrange(SECOND))
+    return traces, spans, services, timestamps
+
+
+def windows_of(members, sizes):
+    windows, offset = [], 0
+    for size in sizes:
+        windows.append(list(members[offset:offset + size]))
+        offset += size
+    return windows
+
+
+def test_time_chunks_respect_span_and_size():
+    timestamps = [0, SECOND, 2 * SECOND, 40 * SECOND, 41 * SECOND] + [80 * SECOND] * 5
+    assert time_chunks(timestamps, WINDOW_NS, 4) == [3, 2, 4, 1]
+
+
+def test_pack_spans_splits_oversized_spans_by_their_chunks():
+    assert pack_spans([10, 25, 50, 5], [None, None, [40, 10], None], MAX_SIZE) == [35, 40, 10, 5]
+
+
+def test_sweep_keeps_every_log_and_bounds_windows():
+    traces, spans, services, timestamps = synthetic_logs()
+    members, sizes, window_traces, coverage = sweep_windows(traces, spans, services, timestamps, WINDOW_NS, MAX_SIZE)
+
+    assert sorted(members) == list(range(len(traces)))
+    assert all(0 < size <= MAX_SIZE for size in sizes)
+    assert coverage['split_traces'] == 3
+    assert coverage['trace_logs'] + coverage['split_trace_logs'] + coverage['service_time_logs'] == len(traces)
+
+    for window, trace in zip(windows_of(members, sizes), window_traces):
+        assert {traces[i] for i in window} == {trace}
+        if trace is None:
+            assert len({services[i] for i in window}) == 1
+            stamped = [timestamps[i] for i in window if timestamps[i] != MISSING_TIMESTAMP]
+            assert not stamped or max(stamped) - min(stamped) <= WINDOW_NS
+
+
+def test_split_traces_keep_small_spans_whole():
+    traces, spans, services, timestamps = synthetic_logs()
+    members, sizes, window_traces, _ = sweep_windows(traces, spans, services, timestamps, WINDOW_NS, MAX_SIZE)
+    span_sizes = {}
+    for span in spans:
+        span_sizes[span] = span_sizes.get(span, 0) + 1
+
+    span_windows = {}
+    for index, (window, trace) in enumerate(zip(windows_of(members, sizes), window_traces)):
+        if trace is not None and trace.startswith('wide-'):
+            for i in window:
+                span_windows.setdefault(spans[i], set()).add(index)
+    for span, indices in span_windows.items():
+        if span_sizes[span] <= MAX_SIZE:
+            assert len(indices) == 1, span
+
+
+def test_columnar_sweep_matches_python_sweep():
+    np = pytest.importorskip('numpy')
+    from windowing import sweep_windows_columnar
+
+    traces, spans, services, timestamps = synthetic_logs()
+    trace_ids = {trace: i for i, trace in enumerate(dict.fromkeys(t for t in traces if t is not None))}
+    span_ids = {span: i for i, span in enumerate(dict.fromkeys(s for s in spans if s is not None))}
+    service_keys = {service: i for i, service in enumerate(sorted(set(services)))}
+
+    expected = sweep_windows(traces, spans, services, timestamps, WINDOW_NS, MAX_SIZE)
+    members, sizes, window_traces, coverage = sweep_windows_columnar(
+        np.array([trace_ids.get(t, -1) for t in traces]),
+        np.array([span_ids.get(s, -1) for s in spans]),
+        np.array([service_keys[s] for s in services]),
+        np.array(timestamps, dtype=np.int64),
+        WINDOW_NS, MAX_SIZE
+    )
+
+    assert members.tolist() == expected[0]
+    assert sizes.tolist() == expected[1]
+    assert [trace_ids.get(t, -1) for t in expected[2]] == window_traces.tolist()
+    assert coverage == expected[3]
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Time ranges in natural-language queries
+Parses phrases such as "between 23:10 and 23:15", "last 5 minutes" or
+"10 minutes before the crash" into bounds that are resolved against a
+dataset's own time span (a log dump's "now" is its last timestamp)
+"""
+
+import re
+from typing import Callable, NamedTuple, Optional, Tuple
+
+from timestamp_parser import NS_PER_DAY, NS_PER_SECOND, days_from_civil
+
+UNIT_NS = {
+    's': NS_PER_SECOND, 'sec': NS_PER_SECOND, 'second': NS_PER_SECOND,
+    'm': 60 * NS_PER_SECOND, 'min': 60 * NS_PER_SECOND, 'minute': 60 * NS_PER_SECOND,
+    'h': 3600 * NS_PER_SECOND, 'hr': 3600 * NS_PER_SECOND, 'hour': 3600 * NS_PER_SECOND,
+    'd': NS_PER_DAY, 'day': NS_PER_DAY,
+}
+
+# Words that anchor a range to the first log mentioning them ("before the crash")
+EVENT_WORDS = ('crash', 'error', 'failure', 'outage', 'restart', 'exception', 'timeout', 'panic', 'oom', 'incident')
+
+_UNIT = r'(?P<{name}>s|secs?|seconds?|m|mins?|minutes?|h|hrs?|hours?|d|days?)\b'
+_AMOUNT = r'(?:(?P<{name}>\d+(?:\.\d+)?)\s*|an?\s+|one\s+)'
+_CLOCK = (
+    r'(?P<{name}_date>\d{{4}}-\d{{2}}-\d{{2}}[T ])?'
+    r'(?P<{name}_h>\d{{1,2}}):(?P<{name}_m>\d{{2}})(?::(?P<{name}_s>\d{{2}})(?:\.(?P<{name}_f>\d{{1,9}}))?)?'
+    r'(?:\s*(?P<{name}_ampm>am|pm))?(?:\s*(?:utc|z)\b)?'
+)
+_EVENT = r'(?:the\s+)?(?:first\s+)?(?P<{name}_event>' + '|'.join(EVENT_WORDS) + r')\w*'
+
+
+def _point(name: str) -> str:
+    return rf'(?:{_CLOCK.format(name=name)}|{_EVENT.format(name=name)})'
+
+
+PATTERNS = [
+    # last/past 5 minutes [before 23:15 | before the crash]
+    ('last', re.compile(
+        r'\b(?:last|past|previous|final)\s+' + _AMOUNT.format(name='amount') + '?' + _UNIT.format(name='unit')
+        + r'(?:\s+(?:before|until|leading up to|prior to)\s+' + _point('end') + r')?', re.IGNORECASE)),
+    # 5 minutes before/after/around 23:12 | the crash
+    ('relative', re.compile(
+        r'\b' + _AMOUNT.format(name='amount') + _UNIT.format(name='unit')
+        + r'\s+(?P<direction>before|after|around|prior to)\s+' + _point('anchor'), re.IGNORECASE)),
+    # between/from 23:10 and/to 23:15
+    ('between', re.compile(
+        r'\b(?:between|from)\s+' + _point('start') + r'\s*(?:and|to|until|till|-)\s*' + _point('end'), re.IGNORECASE)),
+    ('after', re.compile(r'\b(?:after|since)\s+' + _point('start'), re.IGNORECASE)),
+    ('before', re.compile(r'\b(?:before|until|prior to)\s+' + _point('end'), re.IGNORECASE)),
+    ('at', re.compile(r'\b(?:at|around)\s+' + _CLOCK.format(name='start'), re.IGNORECASE)),
+]
+
+
+class TimePoint(NamedTuple):
+    """One end of a range before resolution"""
+    kind: str                   # 'datetime' (epoch ns), 'clock' (ns since midnight), 'event' (word) or 'dataset_end'
+    value: object = None
+    precision_ns: int = 1       # width of the written value, e.g. one minute for "23:15"
+
+
+class TimeRangeQuery(NamedTuple):
+    """Time range parsed from a query; None bounds are open"""
+    start: Optional[TimePoint]
+    end: Optional[TimePoint]
+    start_offset_ns: int = 0
+    end_offset_ns: int = 0
+    text: str = ''              # the matched phrase
+
+
+def parse_time_range(query: str) -> Optional[TimeRangeQuery]:
+    """First time-range phrase in query, or None"""
+    for kind, pattern in PATTERNS:
+        match = pattern.search(query)
+        if match is None:
+            continue
+        groups = match.groupdict()
+
+        # Durations count from the exact anchor, not from the end of its written precision
+        if kind == 'last':
+            span = _duration(groups['amount'], groups['unit'])
+            end = (_time_point(groups, 'end') or TimePoint('dataset_end'))._replace(precision_ns=1)
+            return TimeRangeQuery(end, end, start_offset_ns=-span, text=match.group(0))
+
+        if kind == 'relative':
+            span = _duration(groups['amount'], groups['unit'])
+            anchor = _time_point(groups, 'anchor')._replace(precision_ns=1)
+            direction = groups['direction'].lower()
+            if direction in ('before', 'prior to'):
+                return TimeRangeQuery(anchor, anchor, start_offset_ns=-span, text=match.group(0))
+            if direction == 'after':
+                return TimeRangeQuery(anchor, anchor, end_offset_ns=span, text=match.group(0))
+            return TimeRangeQuery(anchor, anchor, start_offset_ns=-span, end_offset_ns=span, text=match.group(0))
+
+        start = _time_point(groups, 'start') if 'start_h' in groups else None
+        end = _time_point(groups, 'end') if 'end_h' in groups else None
+        if kind == 'at':
+            return TimeRangeQuery(start, start, text=match.group(0))
+        return TimeRangeQuery(start, end, text=match.group(0))
+    return None
+
+
+def resolve_time_range(time_range: TimeRangeQuery, min_ns: int, max_ns: int,
+                       event_time: Callable[[str], Optional[int]]) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start_ns, end_ns) for a parsed range within a dataset spanning
+    [min_ns, max_ns]; event_time(word) gives the first time a word is logged.
+    Clock times take the dataset's date (the latest day they fall within).
+    Returns None if an anchor cannot be resolved.
+    """
+    start = min_ns
+    if time_range.start is not None:
+        point = _resolve_point(time_range.start, min_ns, max_ns, event_time)
+        if point is None:
+            return None
+        start = point
+
+    end = max_ns
+    if time_range.end is not None:
+        point = _resolve_point(time_range.end, min_ns, max_ns, event_time)
+        if point is None:
+            return None
+        end = point + time_range.end.precision_ns - 1
+        if time_range.start is not None and time_range.end.kind == 'clock' and end < start:
+            end += NS_PER_DAY  # "between 23:50 and 00:10" crosses midnight
+
+    # Clamped to the dataset; an empty range comes back with start > end
+    return max(start + time_range.start_offset_ns, min_ns), min(end + time_range.end_offset_ns, max_ns)
+
+
+def _resolve_point(point: TimePoint, min_ns: int, max_ns: int,
+                   event_time: Callable[[str], Optional[int]]) -> Optional[int]:
+    if point.kind == 'datetime':
+        return point.value
+    if point.kind == 'dataset_end':
+        return max_ns
+    if point.kind == 'event':
+        return event_time(point.value)
+
+    # Clock time: latest dataset day on which it is not after the dataset's end
+    day_start = max_ns - max_ns % NS_PER_DAY
+    value = day_start + point.value
+    if value > max_ns and value - NS_PER_DAY >= min_ns - min_ns % NS_PER_DAY:
+        value -= NS_PER_DAY
+    return value
+
+
+def _duration(amount: Optional[str], unit: str) -> int:
+    unit = unit.lower().rstrip('s') or 's'
+    return int(float(amount or 1) * UNIT_NS[unit])
+
+
+def _time_point(groups: dict, name: str) -> Optional[TimePoint]:
+    if groups.get(f'{name}_event'):
+        return TimePoint('event', groups[f'{name}_event'].lower())
+    if groups.get(f'{name}_h') is None:
+        return None
+
+    hour, minute = int(groups[f'{name}_h']), int(groups[f'{name}_m'])
+    ampm = (groups.get(f'{name}_ampm') or '').lower()
+    if ampm == 'pm' and hour < 12:
+        hour += 12
+    elif ampm == 'am' and hour == 12:
+        hour = 0
+
+    ns = (hour * 3600 + minute * 60) * NS_PER_SECOND
+    precision = 60 * NS_PER_SECOND
+    if groups.get(f'{name}_s') is not None:
+        ns += int(groups[f'{name}_s']) * NS_PER_SECOND
+        precision = NS_PER_SECOND
+        fraction = groups.get(f'{name}_f')
+        if fraction:
+            ns += int(fraction.ljust(9, '0'))
+            precision = 10 ** (9 - len(fraction))
+
+    date = groups.get(f'{name}_date')
+    if date:
+        year, month, day = int(date[:4]), int(date[5:7]), int(date[8:10])
+        return TimePoint('datetime', days_from_civil(year, month, day) * NS_PER_DAY + ns, precision)
+    return TimePoint('clock', ns, precision)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Format-detecting timestamp parser
+Converts raw timestamp values to integer epoch nanoseconds. The format of each
+timestamp field is detected from its first value and reused, so steady-state
+parsing is one fast path per log instead of a cascade of strptime attempts
+"""
+
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+# int64 epoch nanoseconds; int64 min means missing
+MISSING_TIMESTAMP = -(1 << 63)
+MAX_TIMESTAMP = (1 << 63) - 1
+
+NS_PER_SECOND = 1_000_000_000
+NS_PER_DAY = 86_400 * NS_PER_SECOND
+
+# Nanoseconds per unit for numeric epochs, picked by magnitude:
+# > 1e17 nanoseconds, > 1e14 microseconds, > 1e11 milliseconds, else seconds
+# (each unit covers dates from the 1970s to well past 2100)
+EPOCH_UNITS = (
+    (1e17, 'epoch_ns', 1),
+    (1e14, 'epoch_us', 1_000),
+    (1e11, 'epoch_ms', 1_000_000),
+    (float('-inf'), 'epoch_s', NS_PER_SECOND),
+)
+EPOCH_SCALES = {name: scale for _, name, scale in EPOCH_UNITS}
+# (exclusive low, inclusive high) raw magnitude per unit; a remembered unit is
+# only reused for values in its own range
+EPOCH_RANGES = {
+    'epoch_ns': (1e17, float('inf')),
+    'epoch_us': (1e14, 1e17),
+    'epoch_ms': (1e11, 1e14),
+    'epoch_s': (float('-inf'), 1e11),
+}
+
+# Date, time, optional fraction (any precision, truncated to ns), optional Z/offset;
+# naive values are UTC, as with the previous strptime formats
+ISO_PATTERN = re.compile(
+    r'(\d{4})-(\d{2})-(\d{2})[T ](\d{2}):(\d{2}):(\d{2})'
+    r'(?:[.,](\d{1,9})\d*)?'
+    r'\s*(Z|z|[+-]\d{2}:?\d{2})?$'
+)
+NUMERIC_PATTERN = re.compile(r'-?\d+(?:\.\d*)?$')
+
+
+def days_from_civil(year: int, month: int, day: int) -> int:
+    """Days since 1970-01-01 for a proleptic Gregorian date (integer arithmetic only)"""
+    year -= month <= 2
+    era = (year if year >= 0 else year - 399) // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def parse_iso_ns(value: str) -> int:
+    """ISO-8601 date-time string to epoch ns, or MISSING_TIMESTAMP"""
+    match = ISO_PATTERN.match(value)
+    if match is None:
+        return MISSING_TIMESTAMP
+    year, month, day, hour, minute, second, fraction, offset = match.groups()
+    month, day, hour, minute, second = int(month), int(day), int(hour), int(minute), int(second)
+    if not (1 <= month <= 12 and 1 <= day <= 31 and hour <= 23 and minute <= 59 and second <= 60):
+        return MISSING_TIMESTAMP
+
+    seconds = hour * 3600 + minute * 60 + second
+    if offset and offset not in ('Z', 'z'):
+        sign = -1 if offset[0] == '-' else 1
+        digits = offset[1:].replace(':', '')
+        seconds -= sign * (int(digits[:2]) * 3600 + int(digits[2:]) * 60)
+
+    ns = days_from_civil(int(year), month, day) * NS_PER_DAY + seconds * NS_PER_SECOND
+    if fraction:
+        ns += int(fraction.ljust(9, '0'))
+    return ns
+
+
+def parse_epoch_ns(value: Any, scale: int) -> int:
+    """Numeric epoch (int, float or numeric string) in a known unit to epoch ns"""
+    if isinstance(value, str):
+        if '.' in value:
+            value = float(value)
+        else:
+            return int(value) * scale
+    if isinstance(value, float):
+        return int(round(value * scale))
+    return int(value) * scale
+
+
+def _epoch_format(value: float) -> str:
+    for threshold, name, _ in EPOCH_UNITS:
+        if value > threshold:
+            return name
+    return 'epoch_s'
+
+
+class TimestampParser:
+    """
+    Parses timestamp values to epoch nanoseconds, remembering the detected
+    format per field (e.g. per JSON path). A value that does not fit its
+    field's remembered format triggers detection again, so mixed inputs still
+    parse; call reset() at the start of each file.
+    """
+
+    def __init__(self):
+        self.formats: Dict[Any, str] = {}
+
+    def reset(self):
+        self.formats.clear()
+
+    def parse(self, value: Any, field: Any = None) -> int:
+        """Epoch ns for value, or MISSING_TIMESTAMP if it is not a recognizable timestamp"""
+        if value is None or isinstance(value, bool):
+            return MISSING_TIMESTAMP
+        if isinstance(value, str):
+            value = value.strip()
+
+        fmt = self.formats.get(field)
+        if fmt is not None:
+            ns = self._parse_as(value, fmt)
+            if ns != MISSING_TIMESTAMP:
+                return ns
+
+        fmt = self.detect_format(value)
+        if fmt is None:
+            return MISSING_TIMESTAMP
+        ns = self._parse_as(value, fmt)
+        if ns != MISSING_TIMESTAMP:
+            self.formats[field] = fmt
+        return ns
+
+    def detect_format(self, value: Any) -> Optional[str]:
+        """Format name for a single value: 'epoch_<unit>', 'iso', 'isoformat' or None"""
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return _epoch_format(value)
+        if not isinstance(value, str):
+            return None
+
+        if NUMERIC_PATTERN.match(value):
+            return _epoch_format(float(value))
+        if ISO_PATTERN.match(value):
+            return 'iso'
+        try:
+            datetime.fromisoformat(value)
+            return 'isoformat'
+        except ValueError:
+            return None
+
+    def _parse_as(self, value: Any, fmt: str) -> int:
+        try:
+            scale = EPOCH_SCALES.get(fmt)
+            if scale is not None:
+                if isinstance(value, str) and not NUMERIC_PATTERN.match(value):
+                    return MISSING_TIMESTAMP
+                ns = parse_epoch_ns(value, scale)
+                low, high = EPOCH_RANGES[fmt]
+                if not low * scale < ns <= high * scale:
+                    return MISSING_TIMESTAMP
+            elif not isinstance(value, str):
+                return MISSING_TIMESTAMP
+            elif fmt == 'iso':
+                ns = parse_iso_ns(value)
+            else:
+                ns = self._parse_isoformat(value)
+        except (ValueError, OverflowError):
+            return MISSING_TIMESTAMP
+
+        if not MISSING_TIMESTAMP < ns <= MAX_TIMESTAMP:
+            return MISSING_TIMESTAMP
+        return ns
+
+    def _parse_isoformat(self, value: str) -> int:
+        """Slow path for ISO variants the fast pattern does not cover (e.g. date only)"""
+        dt = datetime.fromisoformat(value)
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        delta = dt - datetime(1970, 1, 1, tzinfo=timezone.utc)
+        return (delta.days * 86_400 + delta.seconds) * NS_PER_SECOND + delta.microseconds * 1000
+
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Incremental trace/time windows
+Keeps the hot-event windows of a growing log set open so new logs are merged
+into them as they arrive. Template counts and the deduplicated logs are updated
+in place and only windows that changed are rescored, so refreshing the top
+windows costs time proportional to the new logs, not to everything seen.
+"""
+
+import heapq
+import logging
+import sys
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import List, Dict, Any, Hashable, Iterable, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # add_store() falls back to iterating the store's entries
+    np = None
+
+from enhanced_log_filter import EnhancedLogFilter, LogEntry, LogWindow, HOT_FEATURES, ns_to_datetime
+from state_store import estimate_size
+from timestamp_parser import MISSING_TIMESTAMP
+
+logger = logging.getLogger(__name__)
+
+# Rough per-object costs behind nbytes(): a window with its summary and counters,
+# and one entry in a template counter
+WINDOW_OVERHEAD_BYTES = 2048
+TEMPLATE_COUNT_BYTES = 128
+
+
+def entry_nbytes(entry: LogEntry) -> int:
+    """Approximate resident bytes of a kept log entry, including its raw record"""
+    return sys.getsizeof(entry) + estimate_size(entry.__dict__)
+
+
+@dataclass
+class OpenWindow:
+    """A window still accepting logs; window.logs holds the first log per template"""
+    window: LogWindow
+    key: Hashable
+    size: int = 0
+    first_ns: int = MISSING_TIMESTAMP
+    start_ns: int = MISSING_TIMESTAMP
+    end_ns: int = MISSING_TIMESTAMP
+    dirty: bool = False
+    nbytes: int = WINDOW_OVERHEAD_BYTES
+    # Newest timestamp seen across all logs when this window last got one
+    seen_ns: int = MISSING_TIMESTAMP
+    seq: int = 0
+    # This window's live entry in the accumulator's age heap (others are stale)
+    age_entry: Optional[Tuple[int, int, "OpenWindow"]] = None
+
+
+class WindowAccumulator:
+    """
+    Hot logs grouped as they arrive: a trace fills windows of up to
+    max_window_size logs (continuing in a new window when full), traceless logs
+    fill per-service windows spanning at most window_seconds from their first
+    log. Unlike the sweep in windowing.py, a window only sees logs that arrived
+    after it opened, so an oversized trace splits by arrival rather than by span.
+
+    For rolling use, retention_seconds evicts windows whose last log is that
+    much older than the newest log seen, whatever order they opened in, and
+    max_windows caps how many are kept (oldest opened dropped first). Windows of
+    untimestamped logs age by arrival instead.
+    """
+
+    def __init__(self, log_filter: EnhancedLogFilter, window_seconds: int = 30, max_window_size: int = 40,
+                 retention_seconds: Optional[float] = None, max_windows: Optional[int] = None):
+        self.filter = log_filter
+        self.window_ns = window_seconds * 1_000_000_000
+        self.max_window_size = max_window_size
+        self.retention_ns = int(retention_seconds * 1_000_000_000) if retention_seconds else None
+        self.max_windows = max_windows
+
+        # Sequence number -> window, oldest opened first
+        self.windows: "OrderedDict[int, OpenWindow]" = OrderedDict()
+        # (age, seq, window) min-heap for retention; entries whose window moved on are stale
+        self._by_age: List[Tuple[int, int, OpenWindow]] = []
+        self._next_seq = 0
+        self._open: Dict[Hashable, OpenWindow] = {}
+        self._dirty: List[OpenWindow] = []
+        # Template id -> logs seen (hot or not)
+        self.template_counts: Counter = Counter()
+        self.total_logs = 0
+        self.hot_logs = 0
+        self.evicted_windows = 0
+        self.latest_ns = MISSING_TIMESTAMP
+        self.first_ns = MISSING_TIMESTAMP
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, entries: Iterable[LogEntry]) -> int:
+        """Merge normalized logs into the windows; returns how many were hot"""
+        hot = 0
+        with self._lock:
+            templates = len(self.template_counts)
+            for entry in entries:
+                self.total_logs += 1
+                self.template_counts[entry.template_hash] += 1
+                if entry.is_hot:
+                    self._place(entry)
+                    hot += 1
+            self.hot_logs += hot
+            self._bytes += (len(self.template_counts) - templates) * TEMPLATE_COUNT_BYTES
+            self._evict()
+        return hot
+
+    def add_store(self, store: Any) -> int:
+        """
+        Seed from a ColumnarLogStore: only its hot rows are materialized
+
+        Rows of stores loaded from disk take template ids from
+        EnhancedLogFilter.store_template_ids(), like every other reader of the store
+        """
+        if store.vectorized:
+            hot_rows = np.flatnonzero(store.columns['features'] & HOT_FEATURES).tolist()
+            entries = self.filter.store_entries(store, hot_rows)
+        else:
+            entries = (entry for entry in store.iter_entries() if entry.is_hot)
+
+        hot = self.add(entries)
+        with self._lock:
+            self.total_logs += len(store) - hot
+        return hot
+
+    def refresh(self) -> int:
+        """Rescore windows changed since the last refresh; returns how many were rescored"""
+        with self._lock:
+            return self._refresh()
+
+    def top(self, k: int) -> List[LogWindow]:
+        """The k windows with the highest importance score (refreshing first)"""
+        with self._lock:
+            self._refresh()
+            ranked = heapq.nlargest(
+                k, enumerate(self.windows.values()), key=lambda item: (item[1].window.importance_score, -item[0])
+            )
+            return [open_window.window for _, open_window in ranked]
+
+    def nbytes(self) -> int:
+        """Approximate resident size of the open windows and template counts"""
+        with self._lock:
+            return self._bytes
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'total_logs': self.total_logs,
+                'hot_logs': self.hot_logs,
+                'windows': len(self.windows),
+                'open_windows': len(self._open),
+                'evicted_windows': self.evicted_windows,
+                'templates': len(self.template_counts),
+                'nbytes': self._bytes,
+                'latest_timestamp_ns': self.latest_ns if self.latest_ns != MISSING_TIMESTAMP else None
+            }
+
+    def _place(self, entry: LogEntry):
+        timestamp = entry.timestamp_ns
+        if entry.trace_id:
+            key = ('trace', entry.trace_id)
+            current = self._open.get(key)
+            fits = current is not None and current.size < self.max_window_size
+        else:
+            key = ('service', entry.service_name or '')
+            current = self._open.get(key)
+            fits = current is not None and current.size < self.max_window_size and (
+                timestamp == current.first_ns == MISSING_TIMESTAMP
+                or (current.first_ns != MISSING_TIMESTAMP
+                    and current.first_ns <= timestamp <= current.first_ns + self.window_ns)
+            )
+
+        if not fits:
+            current = OpenWindow(window=LogWindow(trace_id=entry.trace_id or None), key=key, first_ns=timestamp,
+                                 seq=self._next_seq)
+            self._next_seq += 1
+            self._open[key] = current
+            self.windows[current.seq] = current
+            self._bytes += current.nbytes
+
+        window = current.window
+        current.size += 1
+        count = window.template_counts.get(entry.template_hash, 0)
+        if not count:
+            window.logs.append(entry)
+            added = entry_nbytes(entry) + TEMPLATE_COUNT_BYTES
+            current.nbytes += added
+            self._bytes += added
+        window.template_counts[entry.template_hash] = count + 1
+        if timestamp != MISSING_TIMESTAMP:
+            if current.start_ns == MISSING_TIMESTAMP or timestamp < current.start_ns:
+                current.start_ns = timestamp
+            current.end_ns = max(current.end_ns, timestamp)
+            self.latest_ns = max(self.latest_ns, timestamp)
+            if self.first_ns == MISSING_TIMESTAMP:
+                self.first_ns = timestamp
+        current.seen_ns = self.latest_ns
+        if self.retention_ns:
+            # Ages mostly grow, which eviction discovers when it pops the entry;
+            # only a new or younger age needs an entry of its own
+            age = self._age_ns(current)
+            if current.age_entry is None or age < current.age_entry[0]:
+                self._push_age(current, age)
+        if not current.dirty:
+            current.dirty = True
+            self._dirty.append(current)
+
+    def _refresh(self) -> int:
+        rescored = 0
+        for open_window in self._dirty:
+            if not open_window.dirty:
+                continue  # evicted since it changed
+            window = open_window.window
+            window.start_time = ns_to_datetime(open_window.start_ns)
+            window.end_time = ns_to_datetime(open_window.end_ns)
+            window.importance_score = self.filter.calculate_importance_score(window)
+            window.summary = self.filter.generate_window_summary(window)
+            open_window.dirty = False
+            rescored += 1
+        self._dirty = []
+        if rescored:
+            logger.info(f"Rescored {rescored} of {len(self.windows)} windows")
+        return rescored
+
+    def _evict(self):
+        """Drop windows past the retention horizon, then the oldest opened over max_windows"""
+        windows = self.windows
+        if self.retention_ns and self.latest_ns != MISSING_TIMESTAMP:
+            cutoff = self.latest_ns - self.retention_ns
+            heap = self._by_age
+            while heap and heap[0][0] < cutoff:
+                entry = heapq.heappop(heap)
+                open_window = entry[2]
+                if open_window.age_entry is not entry:
+                    continue  # superseded, or its window was already evicted
+                age = self._age_ns(open_window)
+                if age < cutoff:
+                    del windows[open_window.seq]
+                    self._drop(open_window)
+                else:
+                    self._push_age(open_window, age)  # got newer logs since its entry
+        while self.max_windows is not None and len(windows) > self.max_windows:
+            self._drop(windows.popitem(last=False)[1])
+
+    def _drop(self, open_window: OpenWindow):
+        open_window.dirty = False
+        open_window.age_entry = None
+        if self._open.get(open_window.key) is open_window:
+            del self._open[open_window.key]
+        self._bytes -= open_window.nbytes
+        self.evicted_windows += 1
+
+    def _push_age(self, open_window: OpenWindow, age: int):
+        open_window.age_entry = (age, open_window.seq, open_window)
+        heapq.heappush(self._by_age, open_window.age_entry)
+
+    def _age_ns(self, open_window: OpenWindow) -> int:
+        """
+        Log time a window ages from: its last timestamp, else (no timestamped logs)
+        the newest timestamp seen when it last got a log, else the first one seen
+        """
+        if open_window.end_ns != MISSING_TIMESTAMP:
+            return open_window.end_ns
+        if open_window.seen_ns != MISSING_TIMESTAMP:
+            return open_window.seen_ns
+        return self.first_ns
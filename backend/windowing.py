@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Sweep-based log windowing
+Groups hot logs into LLM windows in O(n log n) without dropping any log:
+- traces of up to max_size logs form one window
+- larger traces are split into sub-windows of whole spans (ordered by span
+  start), and spans that are themselves too large are split by time
+- traceless logs are swept in time order per service, a window closing when
+  it reaches max_size logs or spans more than window_ns
+Both implementations return members as positions into the inputs, window
+sizes, each window's trace and coverage counts per strategy.
+"""
+
+from bisect import bisect_right
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # the columnar sweep needs NumPy; sweep_windows does not
+    np = None
+
+from timestamp_parser import MISSING_TIMESTAMP, MAX_TIMESTAMP
+
+
+def empty_coverage() -> Dict[str, int]:
+    return {
+        'trace_logs': 0, 'trace_windows': 0,
+        'split_trace_logs': 0, 'split_traces': 0, 'split_windows': 0,
+        'service_time_logs': 0, 'service_time_windows': 0
+    }
+
+
+def time_chunks(timestamps: Sequence[int], window_ns: int, max_size: int, start: int = 0,
+                end: Optional[int] = None) -> List[int]:
+    """
+    Greedy window sizes over ascending timestamps[start:end]: a window takes
+    logs within window_ns of its first log, up to max_size; logs without a
+    timestamp (sorted first) are chunked by size only
+    """
+    end = len(timestamps) if end is None else end
+    search = _searchsorted if np is not None and isinstance(timestamps, np.ndarray) else bisect_right
+    sizes = []
+    i = start
+    while i < end:
+        base = int(timestamps[i])
+        limit = MISSING_TIMESTAMP if base == MISSING_TIMESTAMP else base + window_ns
+        stop = min(search(timestamps, limit, i, end), i + max_size)
+        sizes.append(stop - i)
+        i = stop
+    return sizes
+
+
+def _searchsorted(timestamps: 'np.ndarray', value: int, lo: int, hi: int) -> int:
+    return lo + int(np.searchsorted(timestamps[lo:hi], value, side='right'))
+
+
+def pack_spans(unit_sizes: Sequence[int], unit_chunks: Sequence[Optional[List[int]]], max_size: int) -> List[int]:
+    """
+    Sub-window sizes for one oversized trace from its span units in order:
+    consecutive spans share a window up to max_size logs; a span larger than
+    max_size contributes its own time chunks (unit_chunks[u])
+    """
+    sizes = []
+    current = 0
+    for size, chunks in zip(unit_sizes, unit_chunks):
+        if size > max_size:
+            if current:
+                sizes.append(current)
+                current = 0
+            sizes.extend(chunks)
+        elif current + size > max_size:
+            sizes.append(current)
+            current = size
+        else:
+            current += size
+    if current:
+        sizes.append(current)
+    return sizes
+
+
+def sweep_windows(traces: Sequence[Optional[Hashable]], spans: Sequence[Optional[Hashable]],
+                  services: Sequence[str], timestamps: Sequence[int], window_ns: int,
+                  max_size: int) -> Tuple[List[int], List[int], List[Optional[Hashable]], Dict[str, int]]:
+    """Pure-Python sweep; returns (members, sizes, window_traces, coverage)"""
+    coverage = empty_coverage()
+    groups: Dict[Hashable, List[int]] = {}
+    untraced = []
+    for i, trace in enumerate(traces):
+        if trace is None:
+            untraced.append(i)
+        else:
+            groups.setdefault(trace, []).append(i)
+
+    members: List[int] = []
+    sizes: List[int] = []
+    window_traces: List[Optional[Hashable]] = []
+
+    for trace, positions in groups.items():
+        if len(positions) <= max_size:
+            members.extend(positions)
+            sizes.append(len(positions))
+            window_traces.append(trace)
+            coverage['trace_logs'] += len(positions)
+            coverage['trace_windows'] += 1
+            continue
+
+        # Spans ordered by start time (then first appearance); logs by time within a span
+        span_start: Dict[Any, int] = {}
+        span_first: Dict[Any, int] = {}
+        for rank, i in enumerate(positions):
+            span = spans[i]
+            if span not in span_first:
+                span_first[span] = rank
+                span_start[span] = timestamps[i]
+            elif timestamps[i] < span_start[span]:
+                span_start[span] = timestamps[i]
+        ordered = sorted(positions, key=lambda i: (span_start[spans[i]], span_first[spans[i]], timestamps[i], i))
+
+        unit_sizes, unit_chunks = [], []
+        u = 0
+        while u < len(ordered):
+            v = u + 1
+            while v < len(ordered) and spans[ordered[v]] == spans[ordered[u]]:
+                v += 1
+            unit_sizes.append(v - u)
+            unit_chunks.append(
+                time_chunks([timestamps[i] for i in ordered[u:v]], window_ns, max_size) if v - u > max_size else None
+            )
+            u = v
+
+        chunk_sizes = pack_spans(unit_sizes, unit_chunks, max_size)
+        members.extend(ordered)
+        sizes.extend(chunk_sizes)
+        window_traces.extend([trace] * len(chunk_sizes))
+        coverage['split_trace_logs'] += len(positions)
+        coverage['split_traces'] += 1
+        coverage['split_windows'] += len(chunk_sizes)
+
+    # Per-service sweep, then windows in order of (first timestamp, service)
+    untraced.sort(key=lambda i: (services[i], timestamps[i]))
+    service_windows = []
+    start = 0
+    while start < len(untraced):
+        service = services[untraced[start]]
+        end = start + 1
+        while end < len(untraced) and services[untraced[end]] == service:
+            end += 1
+        segment = untraced[start:end]
+        offset = 0
+        for size in time_chunks([timestamps[i] for i in segment], window_ns, max_size):
+            service_windows.append((timestamps[segment[offset]], service, segment[offset:offset + size]))
+            offset += size
+        start = end
+
+    service_windows.sort(key=lambda window: (window[0], window[1]))
+    for _, _, positions in service_windows:
+        members.extend(positions)
+        sizes.append(len(positions))
+        window_traces.append(None)
+    coverage['service_time_logs'] = len(untraced)
+    coverage['service_time_windows'] = len(service_windows)
+
+    return members, sizes, window_traces, coverage
+
+
+def sweep_windows_columnar(trace_ids: 'np.ndarray', span_ids: 'np.ndarray', service_keys: 'np.ndarray',
+                           timestamps: 'np.ndarray', window_ns: int,
+                           max_size: int) -> Tuple['np.ndarray', 'np.ndarray', 'np.ndarray', Dict[str, int]]:
+    """
+    NumPy sweep with the same windows as sweep_windows
+
+    trace_ids/span_ids are dictionary ids (-1 for none); service_keys must
+    sort like the service names. Returns (members, sizes, window_traces, coverage).
+    """
+    coverage = empty_coverage()
+    n = len(trace_ids)
+    positions = np.arange(n, dtype=np.int64)
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+
+    # Traces, ranked by first appearance
+    traced = positions[trace_ids >= 0]
+    unique_traces, first_index, inverse, counts = np.unique(
+        trace_ids[traced], return_index=True, return_inverse=True, return_counts=True
+    )
+    group_rank = np.empty(len(unique_traces), dtype=np.int64)
+    group_rank[np.argsort(first_index, kind='stable')] = np.arange(len(unique_traces))
+    ranked_traces = np.empty_like(unique_traces)
+    ranked_traces[group_rank] = unique_traces
+    log_rank = group_rank[inverse]
+    oversized = counts[inverse] > max_size
+
+    # Whole-trace windows: members grouped by rank, in input order
+    small = traced[~oversized]
+    small = small[np.argsort(log_rank[~oversized], kind='stable')]
+    small_ranks, small_sizes = np.unique(log_rank[~oversized], return_counts=True)
+    coverage['trace_logs'] = len(small)
+    coverage['trace_windows'] = len(small_sizes)
+
+    # Oversized traces: order by (trace, span start, span first appearance, time, position)
+    big = traced[oversized]
+    big_rank = log_rank[oversized]
+    big_ts = timestamps[big]
+    span_keys = big_rank * (int(span_ids.max(initial=-1)) + 2) + (span_ids[big].astype(np.int64) + 1)
+    _, span_inverse = np.unique(span_keys, return_inverse=True)
+    span_start = np.full(span_inverse.max(initial=-1) + 1, MAX_TIMESTAMP, dtype=np.int64)
+    np.minimum.at(span_start, span_inverse, big_ts)
+    span_first = np.full(len(span_start), n, dtype=np.int64)
+    np.minimum.at(span_first, span_inverse, big)
+    order = np.lexsort((big, big_ts, span_first[span_inverse], span_start[span_inverse], big_rank))
+    big, big_rank, big_ts, span_inverse = big[order], big_rank[order], big_ts[order], span_inverse[order]
+
+    big_sizes, big_ranks = [], []
+    if len(big):
+        unit_starts = np.flatnonzero(np.diff(span_inverse, prepend=-1))
+        unit_sizes = np.diff(np.append(unit_starts, len(big)))
+        unit_ranks = big_rank[unit_starts]
+        trace_starts = np.flatnonzero(np.diff(unit_ranks, prepend=-1))
+        trace_bounds = np.append(trace_starts, len(unit_starts)).tolist()
+        unit_sizes_list, unit_starts_list = unit_sizes.tolist(), unit_starts.tolist()
+        for t in range(len(trace_starts)):
+            first_unit, last_unit = trace_bounds[t], trace_bounds[t + 1]
+            sizes = unit_sizes_list[first_unit:last_unit]
+            chunks = [
+                time_chunks(big_ts, window_ns, max_size, unit_starts_list[u], unit_starts_list[u] + unit_sizes_list[u])
+                if unit_sizes_list[u] > max_size else None
+                for u in range(first_unit, last_unit)
+            ]
+            chunk_sizes = pack_spans(sizes, chunks, max_size)
+            big_sizes.extend(chunk_sizes)
+            big_ranks.extend([int(unit_ranks[first_unit])] * len(chunk_sizes))
+        coverage['split_trace_logs'] = len(big)
+        coverage['split_traces'] = len(trace_starts)
+        coverage['split_windows'] = len(big_sizes)
+
+    # Interleave whole and split trace windows by trace rank
+    trace_members = np.concatenate([small, big])
+    trace_sizes = np.concatenate([small_sizes, np.asarray(big_sizes, dtype=np.int64)]).astype(np.int64)
+    trace_window_ranks = np.concatenate([small_ranks, np.asarray(big_ranks, dtype=np.int64)])
+    window_order = np.argsort(trace_window_ranks, kind='stable')
+    trace_members = _gather_segments(trace_members, trace_sizes, window_order)
+    trace_sizes = trace_sizes[window_order]
+    trace_windows = ranked_traces[trace_window_ranks[window_order]]
+
+    # Traceless: per-service sweep, then windows by (first timestamp, service)
+    untraced = positions[trace_ids < 0]
+    services = service_keys[untraced]
+    untraced_ts = timestamps[untraced]
+    order = np.lexsort((untraced, untraced_ts, services))
+    untraced, services, untraced_ts = untraced[order], services[order], untraced_ts[order]
+
+    service_sizes = []
+    segment_starts = np.flatnonzero(np.diff(services, prepend=services[:1] - 1)).tolist() + [len(untraced)]
+    for start, end in zip(segment_starts[:-1], segment_starts[1:]):
+        service_sizes.extend(time_chunks(untraced_ts, window_ns, max_size, start, end))
+    service_sizes = np.asarray(service_sizes, dtype=np.int64)
+    window_starts = np.cumsum(service_sizes) - service_sizes
+    window_order = np.lexsort((services[window_starts], untraced_ts[window_starts]))
+    service_members = _gather_segments(untraced, service_sizes, window_order)
+    coverage['service_time_logs'] = len(untraced)
+    coverage['service_time_windows'] = len(service_sizes)
+
+    members = np.concatenate([trace_members, service_members])
+    sizes = np.concatenate([trace_sizes, service_sizes[window_order]])
+    window_traces = np.concatenate([trace_windows, np.full(len(service_sizes), -1, dtype=trace_windows.dtype)])
+    return members, sizes, window_traces, coverage
+
+
+def _gather_segments(values: 'np.ndarray', sizes: 'np.ndarray', order: 'np.ndarray') -> 'np.ndarray':
+    """Concatenate consecutive segments of values (given by sizes) in a new segment order"""
+    if not len(sizes):
+        return values[:0]
+    starts = np.cumsum(sizes) - sizes
+    new_sizes = sizes[order]
+    new_starts = np.cumsum(new_sizes) - new_sizes
+    index = np.repeat(starts[order] - new_starts, new_sizes) + np.arange(int(new_sizes.sum()))
+    return values[index]
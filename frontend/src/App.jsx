@@ -4,26 +4,86 @@ import FileUpload from './components/FileUpload'
 import ChatMessage from './components/ChatMessage'
 import ChatInput from './components/ChatInput'
 
+// Parse a server-sent event stream from a fetch response, calling onEvent(event, data)
+const readEventStream = async (response, onEvent) => {
+  const reader = response.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+
+  while (true) {
+    const { done, value } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+
+    let boundary
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, boundary)
+      buffer = buffer.slice(boundary + 2)
+
+      let event = 'message'
+      let data = ''
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7)
+        else if (line.startsWith('data: ')) data += line.slice(6)
+      }
+      if (data) onEvent(event, JSON.parse(data))
+    }
+  }
+}
+
 function App() {
   const [messages, setMessages] = useState([])
   const [uploadedFile, setUploadedFile] = useState(null)
   const [isAnalyzing, setIsAnalyzing] = useState(false)
   const [conversationId, setConversationId] = useState(null)
+  const [datasetId, setDatasetId] = useState(null)
+  const [isUploading, setIsUploading] = useState(false)
   const fileInputRef = useRef(null)
 
-  const handleFileUpload = (file) => {
+  const handleFileUpload = async (file) => {
     setUploadedFile(file)
     // Clear any existing messages and conversation when a new file is uploaded
     setMessages([])
     setConversationId(null)
+    setDatasetId(null)
+
+    // Register the file once; follow-up questions only reference the dataset id
+    setIsUploading(true)
+    try {
+      const formData = new FormData()
+      formData.append('file', file)
+
+      const response = await fetch('http://localhost:8000/datasets', {
+        method: 'POST',
+        body: formData
+      })
+
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`)
+      }
+
+      const data = await response.json()
+      setDatasetId(data.dataset_id)
+    } catch (error) {
+      setMessages(prev => [...prev, {
+        id: Date.now(),
+        type: 'assistant',
+        content: `Sorry, there was an error uploading your logs: ${error.message}. Please try again.`,
+        timestamp: new Date()
+      }])
+    } finally {
+      setIsUploading(false)
+    }
   }
 
   const handleSendMessage = async (messageText) => {
-    if (!uploadedFile) {
+    if (!uploadedFile || !datasetId) {
       setMessages(prev => [...prev, {
         id: Date.now(),
         type: 'assistant',
-        content: 'Please upload a log file first before asking questions.',
+        content: isUploading
+          ? 'Your log file is still uploading, please wait a moment.'
+          : 'Please upload a log file first before asking questions.',
         timestamp: new Date()
       }])
       return
@@ -51,18 +111,17 @@ function App() {
     setIsAnalyzing(true)
 
     try {
-      // Create FormData for file upload
+      // The file was registered on upload, so only the query is sent
       const formData = new FormData()
       formData.append('query', messageText)
-      formData.append('file', uploadedFile)
       
       // Add conversation ID if we have one
       if (conversationId) {
         formData.append('conversation_id', conversationId)
       }
 
-      // Call backend API
-      const response = await fetch('http://localhost:8000/analyze-logs', {
+      // Stream the analysis: progress events, then response tokens as they arrive
+      const response = await fetch(`http://localhost:8000/datasets/${datasetId}/analyze/stream`, {
         method: 'POST',
         body: formData
       })
@@ -71,7 +130,33 @@ function App() {
         throw new Error(`HTTP error! status: ${response.status}`)
       }
 
-      const data = await response.json()
+      const updateLoadingMessage = (content) => {
+        setMessages(prev => prev.map(msg => msg.isLoading ? { ...msg, content } : msg))
+      }
+
+      let streamedText = ''
+      let data = null
+      await readEventStream(response, (event, payload) => {
+        if (event === 'progress') {
+          if (payload.conversation_id && !conversationId) {
+            setConversationId(payload.conversation_id)
+          }
+          if (payload.processing_summary) {
+            updateLoadingMessage(`${payload.processing_summary}. Analyzing...`)
+          }
+        } else if (event === 'delta') {
+          streamedText += payload.content
+          updateLoadingMessage(streamedText)
+        } else if (event === 'complete') {
+          data = payload
+        } else if (event === 'error') {
+          throw new Error(payload.detail)
+        }
+      })
+
+      if (!data) {
+        throw new Error('Analysis stream ended unexpectedly')
+      }
       
       // Store conversation ID for future messages
       if (data.conversation_id && !conversationId) {
@@ -88,7 +173,7 @@ function App() {
         content: `${data.response}
 
 ---
-*Analysis: ${data.processing_summary} | Cost reduction: ${data.cost_reduction_percentage}% | LLM tokens: ${data.llm_tokens_used} | Cost: $${data.llm_cost}*`,
+*Analysis: ${data.processing_summary} | Cost reduction: ${data.cost_reduction_percentage}% | LLM tokens: ${data.llm_tokens_used} | Cost: $${data.llm_cost}${data.cached ? ' (cached)' : ''}*`,
         timestamp: new Date()
       }
       setMessages(prev => [...prev, responseMessage])
@@ -128,12 +213,13 @@ function App() {
           <p>Upload your logs and ask questions about incidents</p>
         ) : (
           <div style={{ display: 'flex', alignItems: 'center', justifyContent: 'center', gap: '12px', flexWrap: 'wrap' }}>
-            <p>📁 {uploadedFile.name} ({(uploadedFile.size / 1024 / 1024).toFixed(2)} MB)</p>
+            <p>📁 {uploadedFile.name} ({(uploadedFile.size / 1024 / 1024).toFixed(2)} MB){isUploading ? ' - uploading...' : ''}</p>
             <button
               onClick={() => {
                 setUploadedFile(null)
                 setMessages([])
                 setConversationId(null)
+                setDatasetId(null)
                 if (fileInputRef.current) {
                   fileInputRef.current.value = ''
                 }
@@ -197,7 +283,7 @@ function App() {
       </div>
 
       <div className="chat-input">
-        <ChatInput onSendMessage={handleSendMessage} disabled={isAnalyzing} />
+        <ChatInput onSendMessage={handleSendMessage} disabled={isAnalyzing || isUploading} />
       </div>
     </div>
   )